@@ -1,15 +1,27 @@
 from flask import Flask
 from flask_jwt_extended import JWTManager
-from flask_smorest import Api
-from flask_migrate import Migrate
 
 import os
-from dotenv import load_dotenv
 
-from db import db
+from db import db, configure_engine, init_engine_hooks
+from replicas import replica_router
+from archive import configure_archive
+from terms import DEFAULT_TERM
 from models import BlocklistModel
+from revocation import revocation_cache
+from cache import response_cache
+from hashing import password_hasher
+from profiler import query_profiler
+from metrics import metrics
+from transcripts import transcript_refresher
+from grade_history import grade_history
+from exports import export_runner
+from search import include_object
+from startup import Api, init_migrations
 from resources.student import blp as StudentBlueprint
 from resources.subject import blp as SubjectBlueprint
+from resources.export import blp as ExportBlueprint
+from commands import students_cli, transcripts_cli, subjects_cli, replicas_cli, terms_cli, exports_cli
 
 from flask_cors import CORS
 
@@ -18,8 +30,13 @@ def create_app():
     app = Flask(__name__)
     CORS(app)
 
+    # Startup-optimized mode for autoscaled workers and short-lived containers, see startup.py
+    app.config["FAST_STARTUP"] = os.getenv("FAST_STARTUP", "").lower() in ("1", "true", "yes")
+
     # Load all of the variables from .env
-    load_dotenv()
+    if not app.config["FAST_STARTUP"]:
+        from dotenv import load_dotenv
+        load_dotenv()
 
     # Setup the configs
     app.config["PROPAGATE_EXCEPTIONS"] = True
@@ -32,19 +49,95 @@ def create_app():
     app.config["OPENAPI_SWAGGER_UI_PATH"] = "/docs"
     app.config["OPENAPI_SWAGGER_UI_URL"] = "https://cdn.jsdelivr.net/npm/swagger-ui-dist/"
 
+    # Served as is instead of generating the spec on every start, written by `flask openapi write`
+    if app.config["FAST_STARTUP"]:
+        app.config["OPENAPI_SPEC_FILE"] = os.getenv("OPENAPI_SPEC_FILE", os.path.join(app.instance_path, "openapi.json"))
+
     # Setup what database we are going to use.
     app.config["SQLALCHEMY_DATABASE_URI"] = os.getenv("DATABASE_URL")
 
+    # Subject averages below this are counted as failing
+    app.config["PASSING_GRADE"] = float(os.getenv("PASSING_GRADE", 75))
+
+
+    # Pool and SQLite tuning, "development", "production" or "default" (library defaults)
+    app.config["DB_PROFILE"] = os.getenv("DB_PROFILE", "development")
+    configure_engine(app)
+
+    # Read replicas for GET requests, comma separated SQLAlchemy URLs, see replicas.py.
+    # Students read their own writes from the primary for REPLICA_STICKY_SECONDS.
+    app.config["DATABASE_REPLICA_URLS"] = [url for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url]
+    app.config["REPLICA_STICKY_SECONDS"] = float(os.getenv("REPLICA_STICKY_SECONDS", 5))
+    app.config["REPLICA_STICKY_BACKEND"] = os.getenv("REPLICA_STICKY_BACKEND", "local")
+    app.config["REPLICA_STICKY_REDIS_URL"] = os.getenv("REPLICA_STICKY_REDIS_URL", os.getenv("CACHE_REDIS_URL"))
+    replica_router.init_app(app)
+
+    # The academic term being taught, closed terms are moved to the archive database, see terms.py and archive.py
+    app.config["CURRENT_TERM"] = os.getenv("CURRENT_TERM", DEFAULT_TERM)
+    app.config["ARCHIVE_DATABASE_URL"] = os.getenv("ARCHIVE_DATABASE_URL", "sqlite:///archive.db")
+    configure_archive(app)
 
     # Connect our flask_sqlalchemy to flask
     db.init_app(app)
-    migrate = Migrate(app, db)
+    init_engine_hooks(app)
+
+    # Cache for the read-heavy endpoints, "redis" (shared by every worker), "lru" (per process) or "null".
+    # Off unless CACHE_REDIS_URL is set: an "lru" cache only sees its own worker's invalidations, see cache.py.
+    app.config["CACHE_REDIS_URL"] = os.getenv("CACHE_REDIS_URL")
+    app.config["CACHE_BACKEND"] = os.getenv("CACHE_BACKEND", "redis" if app.config["CACHE_REDIS_URL"] else "null")
+    if os.getenv("CACHE_TTL"):
+        app.config["CACHE_TTL"] = int(os.getenv("CACHE_TTL"))
+    response_cache.init_app(app)
+
+    # Password hashing runs on a bounded process pool, see hashing.py
+    app.config["PASSWORD_HASH_ROUNDS"] = int(os.getenv("PASSWORD_HASH_ROUNDS", 29000))
+    app.config["PASSWORD_HASH_WORKERS"] = int(os.getenv("PASSWORD_HASH_WORKERS", os.cpu_count() or 1))
+    app.config["PASSWORD_HASH_QUEUE"] = int(os.getenv("PASSWORD_HASH_QUEUE", 4 * app.config["PASSWORD_HASH_WORKERS"]))
+    password_hasher.init_app(app)
+
+    # Transcripts touched by bulk writes are refreshed in the background, see transcripts.py
+    app.config["TRANSCRIPT_REFRESH_ASYNC"] = os.getenv("TRANSCRIPT_REFRESH_ASYNC", "true").lower() in ("1", "true", "yes")
+    transcript_refresher.init_app(app)
+
+    # Grade changes are recorded in grade_history by a batched background writer, see grade_history.py
+    app.config["GRADE_HISTORY_ASYNC"] = os.getenv("GRADE_HISTORY_ASYNC", "true").lower() in ("1", "true", "yes")
+    app.config["GRADE_HISTORY_BATCH_SIZE"] = int(os.getenv("GRADE_HISTORY_BATCH_SIZE", 500))
+    app.config["GRADE_HISTORY_FLUSH_INTERVAL"] = float(os.getenv("GRADE_HISTORY_FLUSH_INTERVAL", 1.0))
+    grade_history.init_app(app)
+
+    # Grade sheet exports run on a thread pool and are written under EXPORT_DIR
+    app.config["EXPORT_DIR"] = os.getenv("EXPORT_DIR", os.path.join(app.instance_path, "exports"))
+    app.config["EXPORT_WORKERS"] = int(os.getenv("EXPORT_WORKERS", 2))
+    # Unfinished exports are failed after EXPORT_TIMEOUT seconds without a heartbeat, finished ones deleted after EXPORT_RETENTION
+    app.config["EXPORT_TIMEOUT"] = int(os.getenv("EXPORT_TIMEOUT", 3600))
+    app.config["EXPORT_RETENTION"] = int(os.getenv("EXPORT_RETENTION", 7 * 24 * 3600))
+    export_runner.init_app(app)
+    # The FTS search tables are managed by hand, see search.py
+    migrate = init_migrations(app, db, include_object=include_object)
 
     # Register the blueprints to API Documentation
     api = Api(app) 
 
     api.register_blueprint(StudentBlueprint)
     api.register_blueprint(SubjectBlueprint)
+    api.register_blueprint(ExportBlueprint)
+
+    # Opt-in query counts and timings per request, see profiler.py
+    app.config["QUERY_PROFILER"] = os.getenv("QUERY_PROFILER", "").lower() in ("1", "true", "yes")
+    app.config["QUERY_BUDGET"] = int(os.getenv("QUERY_BUDGET", 10))
+    query_profiler.init_app(app)
+
+    # Prometheus metrics on /metrics, see metrics.py for multi-process servers
+    app.config["METRICS_ENABLED"] = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+    metrics.init_app(app)
+
+    # Register the flask CLI commands
+    app.cli.add_command(students_cli)
+    app.cli.add_command(transcripts_cli)
+    app.cli.add_command(subjects_cli)
+    app.cli.add_command(replicas_cli)
+    app.cli.add_command(terms_cli)
+    app.cli.add_command(exports_cli)
     
 
     # SETUP A SECRET KEY FOR JWT
@@ -53,6 +146,13 @@ def create_app():
     # Create a JWT Manager Object
     jwt = JWTManager(app)
 
+    # Revoked tokens are checked against an in-memory copy of the blocklist
+    revocation_cache.init_app(app)
+
+    @jwt.token_in_blocklist_loader
+    def check_if_token_in_blocklist(jwt_header, jwt_payload):
+        return revocation_cache.is_revoked(jwt_payload["jti"])
+
     @jwt.additional_claims_loader
     def add_claim_to_jwt(identity):
         if identity == 1:
@@ -0,0 +1,141 @@
+from flask import current_app
+from sqlalchemy import delete, func, insert, inspect, select
+
+from db import db
+from models import ArchivedEnrolmentModel, ArchivedGradeHistoryModel, GradeHistoryModel, SubjectModel, SubjectStudent, WaitlistModel
+from terms import current_term
+
+'''
+Archive of closed terms.
+
+`flask terms archive <term>` moves a closed term's enrolments, and the grade
+history that goes with them, out of the main database into the archive bind
+(ARCHIVE_DATABASE_URL, a separate SQLite file by default), so subject_student
+and grade_history only hold the terms still in use. Archived enrolments keep
+their id and carry a copy of their subject's name, description and units:
+transcripts and /student/subject/<id>/grades/history?term= read them without
+joining back into the main database.
+
+The job runs in chunks of CHUNK_SIZE enrolments. Each chunk is first written
+to the archive (replacing any copy of the same rows) and then deleted from
+the main database, so an interrupted run is resumed by running it again:
+whatever is still in the main database is copied, a chunk copied but not
+yet deleted is copied again. What is left of the term's waitlist is dropped,
+nobody can be promoted out of it any more. The archive is compacted (VACUUM)
+at the end.
+
+Nothing but this job writes to the archive, the routes only read it.
+Deleting a student does not reach into the archive: it is the record of
+closed terms and is kept, like the grade history, independently of the
+students table.
+'''
+
+CHUNK_SIZE = 500
+
+ENROLMENT_COLUMNS = [
+    SubjectStudent.id, SubjectStudent.student_id, SubjectStudent.subject_id, SubjectStudent.term,
+    SubjectModel.name.label("subject_name"), SubjectModel.description.label("subject_description"), SubjectModel.units,
+    SubjectStudent.prelims_grade, SubjectStudent.midterms_grade, SubjectStudent.finals_grade, SubjectStudent.average_grade,
+]
+
+
+
+def configure_archive(app):
+    # Must run before db.init_app, the binds are read when the engines are created
+    app.config.setdefault("SQLALCHEMY_BINDS", {})["archive"] = app.config.setdefault("ARCHIVE_DATABASE_URL", "sqlite:///archive.db")
+    # Per app, another app may point at another archive
+    app.extensions["archive"] = {"ready": False}
+
+
+def archive_ready():
+    # Nothing has been archived before the first run creates the tables, remembered once they exist
+    state = current_app.extensions["archive"]
+    if not state["ready"]:
+        state["ready"] = inspect(db.engines["archive"]).has_table(ArchivedEnrolmentModel.__tablename__)
+    return state["ready"]
+
+
+def archived_enrolments(student_ids):
+    if not archive_ready():
+        return []
+    return ArchivedEnrolmentModel.query.filter(
+        ArchivedEnrolmentModel.student_id.in_(student_ids)
+    ).order_by(ArchivedEnrolmentModel.id).all()
+
+
+def find_archived_enrolment(student_id, subject_id, term):
+    if not archive_ready():
+        return None
+    return ArchivedEnrolmentModel.query.filter(
+        ArchivedEnrolmentModel.student_id == student_id,
+        ArchivedEnrolmentModel.term == term,
+        ArchivedEnrolmentModel.subject_id == subject_id
+    ).first()
+
+
+def term_counts():
+    # term -> {"enrolments": in the main database, "archived": in the archive}
+    counts = {}
+    for term, count in db.session.query(SubjectStudent.term, func.count()).group_by(SubjectStudent.term):
+        counts.setdefault(term, {"enrolments": 0, "archived": 0})["enrolments"] = count
+    if archive_ready():
+        for term, count in db.session.query(ArchivedEnrolmentModel.term, func.count()).group_by(ArchivedEnrolmentModel.term):
+            counts.setdefault(term, {"enrolments": 0, "archived": 0})["archived"] = count
+    return counts
+
+
+def archive_chunk(connection, term, chunk_size):
+    enrolments = db.session.execute(
+        select(*ENROLMENT_COLUMNS).join(
+            SubjectModel, SubjectModel.id == SubjectStudent.subject_id
+        ).where(
+            SubjectStudent.term == term
+        ).order_by(SubjectStudent.id).limit(chunk_size)
+    ).mappings().all()
+    if not enrolments:
+        return 0, 0
+
+    ids = [enrolment["id"] for enrolment in enrolments]
+    history = db.session.execute(
+        select(*GradeHistoryModel.__table__.columns).where(GradeHistoryModel.subject_student_id.in_(ids))
+    ).mappings().all()
+
+    with connection.begin():
+        connection.execute(delete(ArchivedGradeHistoryModel).where(ArchivedGradeHistoryModel.subject_student_id.in_(ids)))
+        connection.execute(delete(ArchivedEnrolmentModel).where(ArchivedEnrolmentModel.id.in_(ids)))
+        connection.execute(insert(ArchivedEnrolmentModel), [dict(enrolment) for enrolment in enrolments])
+        if history:
+            connection.execute(insert(ArchivedGradeHistoryModel), [dict(row) for row in history])
+
+    db.session.execute(delete(GradeHistoryModel).where(GradeHistoryModel.subject_student_id.in_(ids)))
+    db.session.execute(delete(SubjectStudent).where(SubjectStudent.id.in_(ids)))
+    db.session.commit()
+    return len(enrolments), len(history)
+
+
+def archive_term(term, chunk_size=CHUNK_SIZE, compact=True, progress=None):
+    if term == current_term():
+        raise ValueError(f"{term} is the current term, only closed terms can be archived.")
+
+    engine = db.engines["archive"]
+    db.create_all(bind_key="archive")
+
+    archived = {"enrolments": 0, "history": 0}
+    with engine.connect() as connection:
+        while True:
+            enrolments, history = archive_chunk(connection, term, chunk_size)
+            if not enrolments:
+                break
+            archived["enrolments"] += enrolments
+            archived["history"] += history
+            if progress is not None:
+                progress(archived)
+
+    db.session.execute(delete(WaitlistModel).where(WaitlistModel.term == term))
+    db.session.commit()
+
+    if compact and engine.dialect.name == "sqlite":
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+            connection.exec_driver_sql("VACUUM")
+
+    return archived
@@ -0,0 +1,266 @@
+'''
+ASGI serving mode.
+
+    uvicorn asgi:application --workers 2
+
+The read side of the enrolment and grade routes runs natively on asyncio
+against an async SQLAlchemy engine (aiosqlite locally, asyncpg for
+PostgreSQL), so one process can hold thousands of concurrent connections
+while they wait on the database. Every other route, including all writes,
+is handed to the regular Flask app through a WSGI adapter, which keeps a
+single implementation of the write paths and their side effects. The WSGI
+entry point (app.create_app) is unchanged.
+
+Only the view itself is native. A native route is dispatched inside a Flask
+request context, the same way Flask dispatches it: the JWT check and its
+errors, the response cache with its ETag and 304 answers, the metrics, the
+query profiler, read-replica routing and CURRENT_TERM all behave as they do
+behind the WSGI entry point, and so do the headers, status and body.
+'''
+import asyncio
+import contextvars
+import io
+import sys
+
+from asgiref.wsgi import WsgiToAsgi
+from flask import request
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+from flask_smorest import abort
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import joinedload
+from werkzeug.exceptions import HTTPException
+
+from app import create_app
+from db import db, apply_sqlite_pragmas
+from cache import response_cache
+from metrics import watch_pool
+from models import SubjectModel, SubjectStudent
+from profiler import listen, query_profiler
+from replicas import replica_router
+from resources.student import grades_serializer
+from schemas import GradeSchema, PlainSubjectSchema
+
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "mysql": "mysql+aiomysql",
+}
+
+
+def async_database_url(url):
+    return url.set(drivername=ASYNC_DRIVERS.get(url.drivername, url.drivername))
+
+
+def create_engine(url, pragmas):
+    engine = create_async_engine(async_database_url(url), **flask_app.config.get("SQLALCHEMY_ENGINE_OPTIONS", {}))
+
+    # Same pragmas and instrumentation as the sync engines, aiosqlite connections go through the same events
+    apply_sqlite_pragmas(engine.sync_engine, pragmas)
+    if query_profiler.enabled:
+        listen(engine.sync_engine)
+    if "metrics" in flask_app.extensions:
+        watch_pool(engine.sync_engine)
+    return engine
+
+
+flask_app = create_app()
+wrapped_wsgi_application = WsgiToAsgi(flask_app)
+
+
+async def wsgi_application(scope, receive, send):
+    # asgiref copies the context variables its worker thread set back into the calling task, and uvicorn
+    # starts the next request of a keep-alive connection from that task: the copied executor is gone by
+    # then and every other request failed. Each request gets an empty context instead.
+    await asyncio.create_task(wrapped_wsgi_application(scope, receive, send), context=contextvars.Context())
+
+with flask_app.app_context():
+    # Same databases the Flask side uses, relative SQLite paths already resolved
+    engines = {None: create_engine(db.engine.url, flask_app.config["SQLITE_PRAGMAS"])}
+    for key in flask_app.config["REPLICA_BINDS"]:
+        engines[key] = create_engine(db.engines[key].url, {**flask_app.config["SQLITE_PRAGMAS"], "query_only": "ON"})
+
+# One session factory per bind, picked like db.session picks its bind, see replicas.py
+Sessions = {key: async_sessionmaker(engine, expire_on_commit=False) for key, engine in engines.items()}
+
+
+async def find_enrolment(session, student_id, subject_id, message, *options):
+    enrolment = await session.scalar(
+        select(SubjectStudent).options(*options).where(
+            SubjectStudent.student_id == student_id,
+            SubjectStudent.in_term(),
+            SubjectStudent.subject_id == subject_id
+        )
+    )
+
+    if enrolment is None:
+        # Same errors as enrolments.get_enrolment_or_abort
+        if await session.get(SubjectModel, subject_id) is None:
+            abort(404)
+        abort(400, message=message)
+
+    return enrolment
+
+
+async def all_subjects_grades(session, student_id):
+    enrolments = await session.scalars(
+        select(SubjectStudent).options(
+            joinedload(SubjectStudent.subject), joinedload(SubjectStudent.student)
+        ).where(SubjectStudent.student_id == student_id, SubjectStudent.in_term()).order_by(SubjectStudent.id)
+    )
+    return grades_serializer.response(enrolments.all())
+
+
+async def subject_grades(session, student_id, subject_id):
+    enrolment = await find_enrolment(
+        session, student_id, subject_id, "Student not enrolled in that subject",
+        joinedload(SubjectStudent.subject), joinedload(SubjectStudent.student)
+    )
+    return flask_app.json.response(GradeSchema().dump(enrolment))
+
+
+async def enrolled_subjects(session, student_id):
+    subjects = await session.scalars(
+        select(SubjectModel).join(
+            SubjectStudent, SubjectStudent.subject_id == SubjectModel.id
+        ).where(SubjectStudent.student_id == student_id, SubjectStudent.in_term()).order_by(SubjectStudent.id)
+    )
+    return flask_app.json.response(PlainSubjectSchema(many=True).dump(subjects.all()))
+
+
+async def enrolled_subject(session, student_id, subject_id):
+    enrolment = await find_enrolment(
+        session, student_id, subject_id, "Student not enrolled in the subject.",
+        joinedload(SubjectStudent.subject)
+    )
+    return flask_app.json.response(PlainSubjectSchema().dump(enrolment.subject))
+
+
+# Flask endpoint -> native view and whether the Flask view is wrapped in response_cache.cached([], per_student=True)
+NATIVE_VIEWS = {
+    "students.AllSubjectsGrades": (all_subjects_grades, True),
+    "students.SubjectGrades": (subject_grades, False),
+    "students.EnrolledSubjects": (enrolled_subjects, True),
+    "students.EnrolledSubject": (enrolled_subject, False),
+}
+
+
+def wsgi_environ(scope):
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode().decode("latin-1"),
+        "PATH_INFO": scope["path"].encode().decode("latin-1"),
+        "QUERY_STRING": scope["query_string"].decode("latin-1"),
+        "SERVER_NAME": scope["server"][0] if scope.get("server") else "localhost",
+        "SERVER_PORT": str(scope["server"][1]) if scope.get("server") else "80",
+        "SERVER_PROTOCOL": f"HTTP/{scope['http_version']}",
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    if scope.get("client"):
+        environ["REMOTE_ADDR"] = scope["client"][0]
+    for name, value in scope["headers"]:
+        name = name.decode("latin-1").upper().replace("-", "_")
+        if name not in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            name = "HTTP_" + name
+        environ[name] = environ[name] + "," + value.decode("latin-1") if name in environ else value.decode("latin-1")
+    return environ
+
+
+def native_view_for(environ):
+    if environ["REQUEST_METHOD"] != "GET":
+        return None, None
+    try:
+        endpoint, view_args = flask_app.url_map.bind_to_environ(environ).match()
+    except HTTPException:
+        return None, None
+    return NATIVE_VIEWS.get(endpoint), view_args
+
+
+def before_view(cached):
+    # Token check, cache lookup and replica choice, run in a thread as they may block on the sync session or Redis
+    verify_jwt_in_request()
+
+    key = response = None
+    if cached and response_cache.backend is not None:
+        key = response_cache.key([], per_student=True)
+        response = response_cache.lookup(key)
+        if response is None:
+            replica_router.use_primary()
+    return key, response, replica_router.read_bind()
+
+
+async def dispatch_view(view, cached, view_args):
+    key, response, bind = await asyncio.to_thread(before_view, cached)
+    if response is None:
+        async with Sessions[bind]() as session:
+            response = await view(session, get_jwt_identity(), **view_args)
+        if key is None or not await asyncio.to_thread(response_cache.store, key, response):
+            return response
+
+    # Turns a matching If-None-Match into an empty 304, like the cached Flask view
+    return response.make_conditional(request)
+
+
+async def full_dispatch(view, cached, view_args):
+    # Flask.full_dispatch_request with an awaited view: before/after request hooks and error handlers all run
+    response = flask_app.preprocess_request()
+    if response is None:
+        try:
+            response = await dispatch_view(view, cached, view_args)
+        except Exception as err:
+            response = flask_app.handle_user_exception(err)
+    return flask_app.finalize_request(response)
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            for engine in engines.values():
+                await engine.dispose()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await lifespan(receive, send)
+    if scope["type"] != "http":
+        return await wsgi_application(scope, receive, send)
+
+    environ = wsgi_environ(scope)
+    native, view_args = native_view_for(environ)
+    if native is None:
+        return await wsgi_application(scope, receive, send)
+
+    # Flask.wsgi_app, the request context lives in this task's context so it follows the awaits
+    context = flask_app.request_context(environ)
+    error = None
+    try:
+        context.push()
+        try:
+            response = await full_dispatch(*native, view_args)
+        except Exception as err:
+            error = err
+            response = flask_app.handle_exception(err)
+
+        body, status, headers = response.get_wsgi_response(environ)
+        body = b"".join(body)
+    finally:
+        context.pop(error)
+
+    await send({
+        "type": "http.response.start",
+        "status": int(status.split(" ", 1)[0]),
+        "headers": [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers],
+    })
+    await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,21 @@
+'''
+Benchmarks, run from the repository root with `python -m benchmarks.<name>`.
+
+campus                  seeded synthetic data (1k / 100k / 1M enrolments)
+micro                   grade averages, schema dumps, password hashing
+scenarios               login storm, grade release and enrolment rush through
+                        the test client and a real WSGI server
+loadtest                WSGI against ASGI on the read routes
+bench_enrolment         capacity limits under an enrolment rush
+bench_search            search latency
+bench_serialization     marshmallow against the compiled serializers
+bench_sqlite_writes     concurrent SQLite writes per DB_PROFILE
+bench_metrics           cost of the metrics hooks
+bench_revocation        cost of the blocklist check
+bench_startup           import time and time to first request, with and
+                        without FAST_STARTUP
+bench_replicas          mixed read/write load with and without read replicas
+
+The scripts that take --output write JSON (see results.py), two of those
+files are compared with `python -m benchmarks.compare old.json new.json`.
+'''
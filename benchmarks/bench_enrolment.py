@@ -0,0 +1,166 @@
+'''
+Enrolment rush against a real server: overbooking and throughput.
+
+    python -m benchmarks.bench_enrolment --students 400 --capacity 50 --duplicates 2
+
+Seeds a throwaway SQLite database with a subject limited to --capacity seats
+and one without a limit, starts the server, then sends every student's
+enrolment request (--duplicates copies of it, to race the same student
+against themselves) at once, first to the open subject and then to the
+limited one. Afterwards it checks that the limited subject holds exactly
+min(students, capacity) students, that enrolled_count matches the rows,
+that nobody is both enrolled and waitlisted and that every student ended up
+in one of the two. Exits non-zero when any of those fail.
+'''
+import argparse
+import asyncio
+import collections
+import os
+import shlex
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.loadtest import DEFAULT_WSGI_CMD, free_port, wait_for_port
+from benchmarks.results import write_results
+
+OPEN_SUBJECT, LIMITED_SUBJECT = 1, 2
+
+
+def seed(database_url, students, capacity):
+    from app import create_app
+    from db import db
+    from flask_jwt_extended import create_access_token
+    from models import StudentModel, SubjectModel
+
+    os.environ["DATABASE_URL"] = database_url
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        db.session.execute(db.insert(SubjectModel), [
+            {"id": OPEN_SUBJECT, "name": "OPEN", "description": "No seat limit", "units": 3, "capacity": None},
+            {"id": LIMITED_SUBJECT, "name": "LIMITED", "description": "Limited seats", "units": 3, "capacity": capacity},
+        ])
+        db.session.execute(db.insert(StudentModel), [
+            {"name": f"Student {i}", "email": f"student{i}@example.com", "password": f"unused-{i}", "course": "BSCS"}
+            for i in range(1, students + 1)
+        ])
+        db.session.commit()
+        return app, [create_access_token(identity=student, expires_delta=False) for student in range(1, students + 1)]
+
+
+async def enrol(port, subject_id, token, statuses, latencies, timeout=60):
+    start = time.perf_counter()
+    try:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(
+            f"POST /student/subject/{subject_id} HTTP/1.1\r\nHost: localhost\r\nAuthorization: Bearer {token}\r\n"
+            f"Content-Length: 0\r\nConnection: close\r\n\r\n".encode()
+        )
+        await writer.drain()
+        head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout)
+        await asyncio.wait_for(reader.read(), timeout)
+        writer.close()
+    except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+        statuses["connection"] += 1
+        return
+
+    latencies.append(time.perf_counter() - start)
+    statuses[int(head.split(b" ", 2)[1])] += 1
+
+
+async def rush(port, subject_id, tokens, duplicates):
+    statuses, latencies = collections.Counter(), []
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        enrol(port, subject_id, token, statuses, latencies) for token in tokens for _ in range(duplicates)
+    ])
+    elapsed = time.perf_counter() - start
+
+    quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else [0] * 99
+    return {
+        "requests": len(tokens) * duplicates,
+        "seconds": round(elapsed, 3),
+        "rps": round(len(tokens) * duplicates / elapsed, 1),
+        "p50_ms": round(quantiles[49] * 1e3, 2),
+        "p99_ms": round(quantiles[98] * 1e3, 2),
+        "statuses": {str(status): count for status, count in sorted(statuses.items(), key=str)},
+    }
+
+
+def check(app, students, capacity):
+    from db import db
+    from models import SubjectModel, SubjectStudent, WaitlistModel
+
+    with app.app_context():
+        problems = []
+        for subject_id, limit in ((OPEN_SUBJECT, students), (LIMITED_SUBJECT, min(students, capacity))):
+            subject = db.session.get(SubjectModel, subject_id)
+            enrolled = {row.student_id for row in SubjectStudent.query.filter_by(subject_id=subject_id)}
+            rows = SubjectStudent.query.filter_by(subject_id=subject_id).count()
+            waiting = {row.student_id for row in WaitlistModel.query.filter_by(subject_id=subject_id)}
+
+            if rows != len(enrolled):
+                problems.append(f"{subject.name}: {rows - len(enrolled)} duplicate enrolments")
+            if len(enrolled) != limit:
+                problems.append(f"{subject.name}: {len(enrolled)} enrolled, expected {limit}")
+            if subject.enrolled_count != rows:
+                problems.append(f"{subject.name}: enrolled_count {subject.enrolled_count} but {rows} enrolments")
+            if enrolled & waiting:
+                problems.append(f"{subject.name}: {len(enrolled & waiting)} students both enrolled and waitlisted")
+            if len(enrolled | waiting) != students:
+                problems.append(f"{subject.name}: {students - len(enrolled | waiting)} students neither enrolled nor waitlisted")
+        return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=400)
+    parser.add_argument("--capacity", type=int, default=50)
+    parser.add_argument("--duplicates", type=int, default=2, help="Concurrent copies of every student's request")
+    parser.add_argument("--server-cmd", default=DEFAULT_WSGI_CMD)
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    handle, path = tempfile.mkstemp(suffix=".db")
+    os.close(handle)
+    database_url = "sqlite:///" + path
+    app, tokens = seed(database_url, args.students, args.capacity)
+    env = {**os.environ, "DATABASE_URL": database_url, "TRANSCRIPT_REFRESH_ASYNC": "false"}
+
+    port = free_port()
+    process = subprocess.Popen(shlex.split(args.server_cmd.format(port=port)), env=env)
+    results = {}
+    try:
+        wait_for_port(port, process)
+        for name, subject_id in (("open", OPEN_SUBJECT), ("limited", LIMITED_SUBJECT)):
+            results[name] = stats = asyncio.run(rush(port, subject_id, tokens, args.duplicates))
+            print(
+                f"{name:8} {stats['requests']:>5} requests {stats['rps']:>8} req/s  p50 {stats['p50_ms']:>8} ms  "
+                f"p99 {stats['p99_ms']:>8} ms  {stats['statuses']}",
+                flush=True
+            )
+    finally:
+        process.terminate()
+        process.wait()
+
+    problems = check(app, args.students, args.capacity)
+    for problem in problems:
+        print("FAILED", problem)
+    if not problems:
+        print(f"ok: {min(args.students, args.capacity)} seats taken, {max(args.students - args.capacity, 0)} waitlisted, no overbooking")
+
+    if args.output:
+        params = {"students": args.students, "capacity": args.capacity, "duplicates": args.duplicates}
+        write_results(args.output, "enrolment", params, {**results, "problems": len(problems)})
+
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,49 @@
+'''
+Per-request cost of the metrics hooks.
+
+    python -m benchmarks.bench_metrics --requests 20000
+
+Runs the before/after/teardown hooks the way Flask does for one request and
+reports the average time they add. Set PROMETHEUS_MULTIPROC_DIR to measure
+the multi-process (mmap backed) mode.
+'''
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from flask import Response
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20000)
+    args = parser.parse_args(argv)
+
+    handle, path = tempfile.mkstemp(suffix=".db")
+    os.close(handle)
+    os.environ["DATABASE_URL"] = "sqlite:///" + path
+
+    from app import create_app
+    from metrics import metrics
+
+    app = create_app()
+    response = Response("{}")
+
+    # The request context matches the route on push, so the endpoint label is the real one
+    with app.test_request_context("/student/subjects/grades"):
+        start = time.perf_counter()
+        for _ in range(args.requests):
+            metrics.start()
+            metrics.record(response)
+            metrics.finish(None)
+        elapsed = time.perf_counter() - start
+
+    os.remove(path)
+    mode = "multi-process" if os.getenv("PROMETHEUS_MULTIPROC_DIR") else "single process"
+    print(f"{mode}: {elapsed / args.requests * 1e6:.2f} us per request", flush=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,191 @@
+'''
+Mixed read/write load with and without read replicas.
+
+    python -m benchmarks.bench_replicas --writers 8 --readers 64 --duration 10 --replicas 2
+
+Seeds a throwaway SQLite primary, then runs the same load twice: once with
+every request on the primary, once with --replicas SQLite copies of it kept
+fresh by `flask replicas sync` every --sync-interval seconds. The load is
+--writers connections entering grades (PUT /student/subject/<id>/grades) and
+--readers connections reading --read-path as other students, so the readers
+are never inside a writer's read-your-writes window. Reports the primary's
+write throughput and latency and the read throughput of each run.
+
+With every database file on one machine and a single server process the
+run is bound by the server's CPU rather than by the primary, so expect the
+two runs to be close; replicas pay off once the primary is a separate
+database server shared by several application servers. Point --server-cmd
+at gunicorn with several workers to get nearer to that.
+'''
+import argparse
+import asyncio
+import json
+import os
+import random
+import shlex
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.loadtest import DEFAULT_WSGI_CMD, free_port, seed, wait_for_port
+from benchmarks.results import write_results
+
+PER_STUDENT = 8
+
+
+def grade_request(token, rng):
+    body = json.dumps({"prelims_grade": rng.randint(60, 100), "midterms_grade": rng.randint(60, 100)}).encode()
+    return (
+        f"PUT /student/subject/{rng.randint(1, PER_STUDENT)}/grades HTTP/1.1\r\nHost: localhost\r\n"
+        f"Authorization: Bearer {token}\r\nContent-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n"
+    ).encode() + body
+
+
+def read_request(token, path):
+    return f"GET {path} HTTP/1.1\r\nHost: localhost\r\nAuthorization: Bearer {token}\r\n\r\n".encode()
+
+
+async def worker(port, build, deadline, latencies, errors, timeout=30):
+    connection = None
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            if connection is None:
+                connection = await asyncio.open_connection("127.0.0.1", port)
+            reader, writer = connection
+
+            writer.write(build())
+            await writer.drain()
+
+            head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout)
+            status = int(head.split(b" ", 2)[1])
+            headers = dict(line.lower().split(b": ", 1) for line in head.split(b"\r\n")[1:] if b": " in line)
+            await asyncio.wait_for(reader.readexactly(int(headers.get(b"content-length", 0))), timeout)
+        except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+            errors.append("connection")
+            if connection is not None:
+                connection[1].close()
+            connection = None
+            continue
+
+        latencies.append(time.perf_counter() - start)
+        if status != 200:
+            errors.append(status)
+
+        if headers.get(b"connection") == b"close":
+            writer.close()
+            connection = None
+
+    if connection is not None:
+        connection[1].close()
+
+
+def summarize(latencies, errors, duration):
+    quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else [0] * 99
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "rps": round(len(latencies) / duration, 1),
+        "p50_ms": round(quantiles[49] * 1e3, 2),
+        "p99_ms": round(quantiles[98] * 1e3, 2),
+    }
+
+
+async def mixed_load(port, tokens, args):
+    # The first --writers students write, everyone else reads
+    writer_tokens, reader_tokens = tokens[:args.writers], tokens[args.writers:]
+    rng = random.Random(args.seed)
+    deadline = time.perf_counter() + args.duration
+    writes, write_errors, reads, read_errors = [], [], [], []
+
+    await asyncio.gather(
+        *[
+            worker(port, lambda token=token: grade_request(token, rng), deadline, writes, write_errors)
+            for token in writer_tokens
+        ],
+        *[
+            worker(port, lambda: read_request(rng.choice(reader_tokens), args.read_path), deadline, reads, read_errors)
+            for _ in range(args.readers)
+        ],
+    )
+    return {
+        "writes": summarize(writes, write_errors, args.duration),
+        "reads": summarize(reads, read_errors, args.duration),
+    }
+
+
+def run(env, tokens, args):
+    port = free_port()
+    process = subprocess.Popen(shlex.split(args.server_cmd.format(port=port)), env=env)
+    try:
+        wait_for_port(port, process)
+        return asyncio.run(mixed_load(port, tokens, args))
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--readers", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--replicas", type=int, default=2)
+    parser.add_argument("--sync-interval", type=float, default=1.0, help="Seconds between two copies to the replicas")
+    parser.add_argument("--read-path", default="/student/subjects/grades")
+    parser.add_argument("--server-cmd", default=DEFAULT_WSGI_CMD)
+    parser.add_argument("--seed", type=int, default=2024)
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    directory = tempfile.mkdtemp()
+    primary = os.path.join(directory, "primary.db")
+    tokens = seed("sqlite:///" + primary, per_student=PER_STUDENT)
+    if len(tokens) <= args.writers:
+        parser.error(f"--writers must leave some of the {len(tokens)} students to read")
+
+    # The response cache would hide most reads from either database
+    env = {**os.environ, "DATABASE_URL": "sqlite:///" + primary, "CACHE_BACKEND": "null"}
+    env.pop("DATABASE_REPLICA_URLS", None)
+    replica_env = {
+        **env,
+        "DATABASE_REPLICA_URLS": ",".join(
+            "sqlite:///" + os.path.join(directory, f"replica{number}.db") for number in range(1, args.replicas + 1)
+        ),
+    }
+
+    results = {"primary_only": run(env, tokens, args)}
+
+    # The replicas exist before the server's first read
+    flask = [sys.executable, "-m", "flask", "--app", "app", "replicas", "sync"]
+    subprocess.run([*flask, "--once"], env=replica_env, check=True)
+    replicator = subprocess.Popen([*flask, "--interval", str(args.sync_interval)], env=replica_env, stdout=subprocess.DEVNULL)
+    try:
+        results["replicas"] = run(replica_env, tokens, args)
+    finally:
+        replicator.terminate()
+        replicator.wait()
+
+    for mode, stats in results.items():
+        writes, reads = stats["writes"], stats["reads"]
+        print(
+            f"{mode:12} writes {writes['rps']:>8} req/s  p50 {writes['p50_ms']:>8} ms  p99 {writes['p99_ms']:>8} ms  "
+            f"errors {writes['errors']}  |  reads {reads['rps']:>8} req/s  p99 {reads['p99_ms']:>8} ms  errors {reads['errors']}",
+            flush=True
+        )
+
+    if args.output:
+        params = {
+            "writers": args.writers, "readers": args.readers, "duration": args.duration, "replicas": args.replicas,
+            "sync_interval": args.sync_interval, "read_path": args.read_path,
+        }
+        write_results(args.output, "replicas", params, results)
+
+    shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+'''
+Per-request cost of the blocklist check.
+
+    python -m benchmarks.bench_revocation [revoked_tokens]
+
+Fills the blocklist table, then times the token_in_blocklist_loader lookup on
+its own, the periodic refresh done by the background thread and a full
+protected request with and without the check.
+'''
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+from flask_jwt_extended import create_access_token
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main(revoked_tokens=100_000, repeat=20_000):
+    _, path = tempfile.mkstemp(suffix=".db")
+    os.environ["DATABASE_URL"] = "sqlite:///" + path
+    os.environ.setdefault("JWT_SECRET_KEY", "benchmark-secret-key-benchmark-secret-key")
+
+    from app import create_app
+    from db import db
+    from models import BlocklistModel, StudentModel
+    from revocation import revocation_cache
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        expires_at = int(time.time()) + 3600
+        db.session.execute(
+            BlocklistModel.__table__.insert(),
+            [{"jti": str(uuid.uuid4()), "expires_at": expires_at} for _ in range(revoked_tokens)],
+        )
+        db.session.commit()
+
+        start = time.perf_counter()
+        revocation_cache.load()
+        print(f"initial load of {revoked_tokens} jtis: {(time.perf_counter() - start) * 1e3:.1f} ms")
+
+        # Runs on the refresh thread, never inside a request
+        print(f"periodic refresh:     {timed(revocation_cache.refresh, 100):.1f} us")
+
+        known = db.session.query(BlocklistModel.jti).first()[0]
+        unknown = str(uuid.uuid4())
+        print(f"lookup (revoked):     {timed(lambda: revocation_cache.is_revoked(known), repeat):.3f} us")
+        print(f"lookup (not revoked): {timed(lambda: revocation_cache.is_revoked(unknown), repeat):.3f} us")
+
+        student = StudentModel(name="bench", email="bench@example.com", password="x", course="BSCS")
+        db.session.add(student)
+        db.session.commit()
+        token = create_access_token(identity=student.id)
+
+    client = app.test_client()
+    headers = {"Authorization": f"Bearer {token}"}
+    url = "/student/subjects"
+    assert client.get(url, headers=headers).status_code == 200
+
+    # Alternate rounds so both variants see the same machine noise
+    jwt_manager = app.extensions["flask-jwt-extended"]
+    check = jwt_manager._token_in_blocklist_callback
+    with_check = without_check = 0
+    for _ in range(5):
+        jwt_manager._token_in_blocklist_callback = check
+        with_check += timed(lambda: client.get(url, headers=headers), repeat // 50) / 5
+        jwt_manager._token_in_blocklist_callback = lambda jwt_header, jwt_payload: False
+        without_check += timed(lambda: client.get(url, headers=headers), repeat // 50) / 5
+
+    print(f"protected request with check:    {with_check:.1f} us")
+    print(f"protected request without check: {without_check:.1f} us")
+    print(f"overhead per request:            {with_check - without_check:.1f} us")
+
+    os.remove(path)
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
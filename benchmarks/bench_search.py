@@ -0,0 +1,78 @@
+'''
+Search latency on a generated student body.
+
+    python -m benchmarks.bench_search --students 100000
+
+Seeds a campus of --students with benchmarks/campus.py, then times
+/students/search style lookups (search.search_students) for a mix of prefix,
+substring, email and filtered queries and reports the median and worst time
+of each.
+'''
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from benchmarks.campus import generate
+
+QUERIES = [
+    ({"q": "mari"}, "prefix"),
+    ({"q": "villanu"}, "substring"),
+    ({"q": "maria santos"}, "two terms"),
+    ({"q": "student4213"}, "email"),
+    ({"q": "cruz", "course": "BSIT"}, "course filter"),
+    ({"q": "ramos", "subject_id": 3}, "enrolled filter"),
+    ({"q": "jo"}, "short term"),
+    ({"q": "reyes", "offset": 200}, "deep page"),
+]
+
+
+def seed(app, students, subjects=20):
+    from db import db
+
+    with app.app_context():
+        db.create_all()
+        generate(students=students, subjects=subjects, per_student=4, seed=7, graded=0)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args(argv)
+
+    handle, path = tempfile.mkstemp(suffix=".db")
+    os.close(handle)
+    os.environ["DATABASE_URL"] = "sqlite:///" + path
+
+    from app import create_app
+    from db import db
+    from search import search_students
+
+    app = create_app()
+    seed(app, args.students)
+
+    with app.app_context():
+        for params, label in QUERIES:
+            timings = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                results = search_students(**params)
+                timings.append(time.perf_counter() - start)
+                db.session.expunge_all()
+
+            print(
+                f"{label:16} {str(params):42} {len(results):>3} results  "
+                f"p50 {statistics.median(timings) * 1e3:6.2f} ms  max {max(timings) * 1e3:6.2f} ms",
+                flush=True
+            )
+
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,78 @@
+'''
+Marshmallow plus Flask's JSON provider against the compiled serializers.
+
+    python -m benchmarks.bench_serialization --rows 10,1000,100000
+
+Builds unsaved model objects shaped like the AllSubjectsGrades and Students
+responses, serializes them both ways, checks that the bytes match and reports
+the time per call.
+'''
+import argparse
+import os
+import sys
+import time
+
+
+def build_rows(rows, subjects_per_student=8):
+    from models import StudentModel, SubjectModel, SubjectStudent
+
+    subjects = [
+        SubjectModel(id=i, name=f"SUBJ{i}", description=f"Subject {i}", units=3) for i in range(1, subjects_per_student + 1)
+    ]
+
+    grades, students = [], []
+    for i in range(rows):
+        student = StudentModel(id=i + 1, name=f"Student {i}", email=f"student{i}@example.com", password="unused", course="BSCS")
+        student.subjects = subjects
+        students.append(student)
+        grades.append(SubjectStudent(
+            id=i + 1, student=student, subject=subjects[i % len(subjects)],
+            prelims_grade=80.5, midterms_grade=91.25, finals_grade=None, average_grade=85.88,
+        ))
+    return grades, students
+
+
+def timed(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", default="10,1000,100000")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+    from app import create_app
+    from schemas import GradeSchema, StudentSchema
+    from serializers import compile_schema
+
+    app = create_app()
+    with app.app_context():
+        cases = [("grades", GradeSchema(many=True)), ("students", StudentSchema(many=True))]
+        compiled = {name: compile_schema(schema) for name, schema in cases}
+
+        for rows in map(int, args.rows.split(",")):
+            grades, students = build_rows(rows)
+            data = {"grades": grades, "students": students}
+
+            for name, schema in cases:
+                marshmallow_time, expected = timed(lambda: app.json.response(schema.dump(data[name])).get_data(), args.repeat)
+                compiled_time, actual = timed(lambda: compiled[name].response(data[name]).get_data(), args.repeat)
+                assert actual == expected, f"{name}: compiled output differs"
+
+                print(
+                    f"{name:8} {rows:>7} rows  marshmallow {marshmallow_time * 1e3:>9.2f} ms  "
+                    f"compiled {compiled_time * 1e3:>8.2f} ms  x{marshmallow_time / compiled_time:.1f}",
+                    flush=True
+                )
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,109 @@
+'''
+Concurrent write throughput on SQLite for each DB_PROFILE.
+
+    python -m benchmarks.bench_sqlite_writes --threads 8 --writes 200
+
+Every thread updates grades of random enrolments and commits after each one,
+like teachers saving grades at the same time. Lock errors are counted instead
+of retried, so the "default" profile shows how often writers collide without
+WAL and a busy timeout.
+'''
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+from sqlalchemy.exc import OperationalError
+
+
+def build_app(database_url, profile):
+    from app import create_app
+
+    os.environ["DATABASE_URL"] = database_url
+    os.environ["DB_PROFILE"] = profile
+    return create_app()
+
+
+def seed(app, students=200, subjects=10):
+    from db import db
+    from models import StudentModel, SubjectModel, SubjectStudent
+
+    with app.app_context():
+        db.create_all()
+        db.session.execute(db.insert(SubjectModel), [
+            {"name": f"SUBJ{i}", "description": f"Subject {i}", "units": 3} for i in range(1, subjects + 1)
+        ])
+        db.session.execute(db.insert(StudentModel), [
+            {"name": f"Student {i}", "email": f"student{i}@example.com", "password": f"unused-{i}", "course": "BSCS"}
+            for i in range(1, students + 1)
+        ])
+        db.session.execute(db.insert(SubjectStudent), [
+            {"student_id": student, "subject_id": subject}
+            for student in range(1, students + 1) for subject in range(1, subjects + 1)
+        ])
+        db.session.commit()
+        return students * subjects
+
+
+def writer(app, enrolments, writes, errors):
+    from db import db
+    from models import SubjectStudent
+
+    rng = random.Random()
+    with app.app_context():
+        for _ in range(writes):
+            enrolment = db.session.get(SubjectStudent, rng.randint(1, enrolments))
+            enrolment.prelims_grade = rng.uniform(60, 100)
+            try:
+                db.session.commit()
+            except OperationalError:
+                db.session.rollback()
+                errors.append(1)
+        db.session.remove()
+
+
+def run(profile, threads, writes):
+    handle, path = tempfile.mkstemp(suffix=".db")
+    os.close(handle)
+    try:
+        app = build_app("sqlite:///" + path, profile)
+        enrolments = seed(app)
+
+        errors = []
+        workers = [threading.Thread(target=writer, args=(app, enrolments, writes, errors)) for _ in range(threads)]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - start
+
+        with app.app_context():
+            from db import db
+            db.engine.dispose()
+
+        committed = threads * writes - len(errors)
+        return {"commits_per_s": round(committed / elapsed, 1), "locked": len(errors), "seconds": round(elapsed, 2)}
+    finally:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--writes", type=int, default=200, help="Commits per thread")
+    parser.add_argument("--profiles", default="default,development,production")
+    args = parser.parse_args(argv)
+
+    for profile in args.profiles.split(","):
+        result = run(profile, args.threads, args.writes)
+        print(f"{profile:12} {result['commits_per_s']:>9} commits/s  locked {result['locked']:>5}  {result['seconds']}s", flush=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
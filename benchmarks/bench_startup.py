@@ -0,0 +1,157 @@
+'''
+Cold start: import times and time to first request, normal vs FAST_STARTUP.
+
+    python -m benchmarks.bench_startup --runs 5 --target-ms 750 --output startup.json
+
+For every mode the import report runs create_app() under `python -X
+importtime` and sums the self time of every module by top-level package, so
+the packages a start pays for are listed heaviest first. Time to first
+request starts --server-cmd (a plain WSGI server, like a gunicorn worker it
+never loads the flask CLI) and measures from the process being spawned to
+the first response on --path, the median of --runs starts. FAST_STARTUP
+gets a spec written by `flask openapi write` beforehand, as a build would.
+
+Exits non-zero when the FAST_STARTUP time to first request is over
+--target-ms.
+'''
+import argparse
+import collections
+import os
+import shlex
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.loadtest import free_port
+from benchmarks.results import write_results
+
+CREATE_APP = "from app import create_app; create_app()"
+
+# A bare WSGI worker: `flask run` would load the CLI plugins, Flask-Migrate among them, before the app
+DEFAULT_SERVER_CMD = (
+    shlex.quote(sys.executable) + " -c \"from werkzeug.serving import run_simple; from app import create_app; "
+    "run_simple('127.0.0.1', {port}, create_app(), threaded=True)\""
+)
+
+
+def import_report(env, top=15):
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", CREATE_APP], env=env, capture_output=True, text=True, check=True
+    )
+
+    packages = collections.Counter()
+    for line in completed.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, _, name = [part.strip() for part in line[len("import time:"):].split("|")]
+        if self_us.isdigit():
+            packages[name.split(".")[0]] += int(self_us)
+
+    return {
+        "total_ms": round(sum(packages.values()) / 1e3, 1),
+        "packages_ms": {name: round(us / 1e3, 1) for name, us in packages.most_common(top)},
+    }
+
+
+def first_response(port, path, process, timeout=30):
+    request = f"GET {path} HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n".encode()
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"server exited with code {process.returncode}")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=5) as sock:
+                sock.sendall(request)
+                status_line = sock.makefile("rb").readline()
+                if status_line:
+                    return int(status_line.split(b" ", 2)[1])
+        except OSError:
+            time.sleep(0.005)
+    raise RuntimeError(f"no response on port {port} after {timeout}s")
+
+
+def time_to_first_request(env, server_cmd, path, runs):
+    timings = []
+    for _ in range(runs):
+        port = free_port()
+        start = time.perf_counter()
+        process = subprocess.Popen(
+            shlex.split(server_cmd.format(port=port)), env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            status = first_response(port, path, process)
+            timings.append(time.perf_counter() - start)
+        finally:
+            process.terminate()
+            process.wait()
+        if status >= 500:
+            raise RuntimeError(f"{path} answered {status}")
+
+    return {
+        "runs": runs,
+        "median_ms": round(statistics.median(timings) * 1e3, 1),
+        "min_ms": round(min(timings) * 1e3, 1),
+        "max_ms": round(max(timings) * 1e3, 1),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--path", default="/subjects")
+    parser.add_argument("--server-cmd", default=DEFAULT_SERVER_CMD)
+    parser.add_argument("--top", type=int, default=15, help="Packages listed in the import report")
+    parser.add_argument("--target-ms", type=float, default=750, help="Time to first request FAST_STARTUP must stay under")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    directory = tempfile.mkdtemp()
+    spec_file = os.path.join(directory, "openapi.json")
+    env = {
+        **os.environ,
+        "DATABASE_URL": "sqlite:///" + os.path.join(directory, "startup.db"),
+        "JWT_SECRET_KEY": os.environ.get("JWT_SECRET_KEY", "benchmark-secret-key-benchmark-secret-key"),
+    }
+    env.pop("FAST_STARTUP", None)
+
+    # The schema and the spec, as a deployment would have them before the first worker starts
+    subprocess.run([sys.executable, "-m", "flask", "--app", "app", "db", "upgrade"], env=env, check=True, capture_output=True)
+    subprocess.run([sys.executable, "-m", "flask", "--app", "app", "openapi", "write", spec_file], env=env, check=True, capture_output=True)
+
+    modes = {
+        "normal": env,
+        "fast": {**env, "FAST_STARTUP": "true", "OPENAPI_SPEC_FILE": spec_file},
+    }
+
+    results = {}
+    for mode, mode_env in modes.items():
+        results[mode] = {
+            "imports": import_report(mode_env, args.top),
+            "first_request": time_to_first_request(mode_env, args.server_cmd, args.path, args.runs),
+        }
+
+        imports, first = results[mode]["imports"], results[mode]["first_request"]
+        print(f"{mode:7} imports {imports['total_ms']:>8} ms  first request {first['median_ms']:>8} ms (median of {first['runs']})", flush=True)
+        for name, ms in imports["packages_ms"].items():
+            print(f"          {name:32} {ms:>8} ms")
+
+    fast_ms = results["fast"]["first_request"]["median_ms"]
+    results["target_ms"] = args.target_ms
+    results["within_target"] = fast_ms <= args.target_ms
+    print(f"time to first request {fast_ms} ms with FAST_STARTUP, target {args.target_ms} ms: {'ok' if results['within_target'] else 'MISSED'}")
+
+    if args.output:
+        params = {"runs": args.runs, "path": args.path, "server_cmd": args.server_cmd}
+        write_results(args.output, "startup", params, results)
+
+    shutil.rmtree(directory, ignore_errors=True)
+    return 0 if results["within_target"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,159 @@
+'''
+Synthetic campus data for the benchmarks.
+
+    python -m benchmarks.campus --scale medium --database sqlite:///instance/campus.db
+
+Fills students, subjects and subject_student with realistic looking rows:
+Filipino style names, a handful of courses, every student enrolled in
+--per-student subjects of about --class-size students each, and most
+enrolments graded for one to three periods. The same --seed always gives the
+same rows, so two commits benchmarked on one scale see identical data.
+
+Scales are named by their number of enrolments: small (1k), medium (100k) and
+large (1M). The first --login-users students get a real password hash of
+PASSWORD so the login scenarios can sign in as them, the rest get a
+placeholder that never verifies.
+'''
+import argparse
+import math
+import os
+import random
+import sys
+import time
+
+SCALES = {
+    "small": 1_000,
+    "medium": 100_000,
+    "large": 1_000_000,
+}
+
+FIRST = ["Maria", "Jose", "Ana", "Juan", "Mark", "Angel", "Paolo", "Kristine", "John", "Patricia",
+         "Michael", "Camille", "Carlo", "Nicole", "Miguel", "Andrea", "Gabriel", "Bea", "Rafael", "Joy"]
+LAST = ["Santos", "Reyes", "Cruz", "Bautista", "Ocampo", "Garcia", "Mendoza", "Torres", "Tomas", "Andrada",
+        "Castillo", "Flores", "Villanueva", "Ramos", "Castro", "Rivera", "Aquino", "Navarro", "Salazar", "Mercado"]
+COURSES = ["BSCS", "BSIT", "BSIS", "BSEMC", "BSCE"]
+UNITS = [2, 3, 3, 3, 3, 4, 5]
+
+PASSWORD = "campus-password"
+CHUNK_SIZE = 10_000
+
+
+def campus_shape(enrolments, per_student=8, class_size=50):
+    # Students and subjects needed for this many enrolments
+    students = math.ceil(enrolments / per_student)
+    subjects = max(per_student, math.ceil(enrolments / class_size))
+    return {"students": students, "subjects": subjects, "per_student": per_student}
+
+
+def grade(rng):
+    return round(min(100.0, max(50.0, rng.gauss(82, 8))), 2)
+
+
+def chunked(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def generate(students, subjects, per_student=8, seed=2024, login_users=0, graded=0.8, progress=None):
+    '''
+    Inserts the campus into the current app's database, whose tables must
+    already exist and be empty. Returns the number of rows per table.
+    '''
+    from db import db
+    from enrolments import recount_seats
+    from hashing import password_hasher
+    from models import StudentModel, SubjectModel, SubjectStudent
+
+    rng = random.Random(seed)
+    per_student = min(per_student, subjects)
+
+    db.session.execute(db.insert(SubjectModel), [
+        {"name": f"SUBJ{i}", "description": f"Subject {i}", "units": rng.choice(UNITS)}
+        for i in range(1, subjects + 1)
+    ])
+
+    # Real hashes only where a benchmark logs in, hashing a million would take hours
+    login_users = min(login_users, students)
+    hashes = password_hasher.hash_many([PASSWORD] * login_users) if login_users else []
+
+    def student_rows():
+        for i in range(1, students + 1):
+            yield {
+                "name": f"{rng.choice(FIRST)} {rng.choice(LAST)}",
+                "email": f"student{i}@example.com",
+                "password": hashes[i - 1] if i <= login_users else f"unused-{i}",
+                "course": rng.choice(COURSES),
+            }
+
+    inserted = 0
+    for chunk in chunked(student_rows(), CHUNK_SIZE):
+        db.session.execute(db.insert(StudentModel), chunk)
+        inserted += len(chunk)
+        if progress is not None:
+            progress("students", inserted)
+
+    def enrolment_rows():
+        for student_id in range(1, students + 1):
+            for subject_id in rng.sample(range(1, subjects + 1), per_student):
+                # Periods are graded in order, an enrolment has none up to all three
+                periods = 0
+                if rng.random() < graded:
+                    periods = rng.choice([1, 2, 3, 3])
+                grades = [grade(rng) if period < periods else None for period in range(3)]
+                yield {
+                    "student_id": student_id, "subject_id": subject_id,
+                    "prelims_grade": grades[0], "midterms_grade": grades[1], "finals_grade": grades[2],
+                }
+
+    enrolments = 0
+    for chunk in chunked(enrolment_rows(), CHUNK_SIZE):
+        db.session.execute(db.insert(SubjectStudent), chunk)
+        enrolments += len(chunk)
+        if progress is not None:
+            progress("enrolments", enrolments)
+
+    # Bulk inserts skip the before_insert hook, fill the stored averages and seat counts the set-based way
+    SubjectStudent.recompute_averages()
+    recount_seats()
+    db.session.commit()
+
+    return {"students": students, "subjects": subjects, "enrolments": enrolments}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", choices=SCALES, default="small")
+    parser.add_argument("--enrolments", type=int, help="Overrides --scale")
+    parser.add_argument("--per-student", type=int, default=8)
+    parser.add_argument("--class-size", type=int, default=50)
+    parser.add_argument("--login-users", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=2024)
+    parser.add_argument("--database", required=True, help="SQLAlchemy URL of a new, empty database")
+    args = parser.parse_args(argv)
+
+    os.environ["DATABASE_URL"] = args.database
+
+    from app import create_app
+    from db import db
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+
+        shape = campus_shape(args.enrolments or SCALES[args.scale], args.per_student, args.class_size)
+        start = time.perf_counter()
+        counts = generate(
+            **shape, seed=args.seed, login_users=args.login_users,
+            progress=lambda table, count: print(f"{table}: {count}", flush=True)
+        )
+        print(f"{counts} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
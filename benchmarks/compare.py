@@ -0,0 +1,78 @@
+'''
+Compare two benchmark result files.
+
+    python -m benchmarks.compare baseline.json current.json --threshold 10
+
+Lists every timing and throughput found in both files with its change and
+exits with 1 when any of them got worse by more than --threshold percent.
+Counts and other numbers are shown but never fail the comparison.
+'''
+import argparse
+import sys
+
+from benchmarks.results import load_results
+
+LOWER_IS_BETTER = ("_ms", "_us", "seconds")
+HIGHER_IS_BETTER = ("rps", "_per_second")
+
+
+def flatten(tree, prefix=""):
+    if isinstance(tree, dict):
+        for key, value in tree.items():
+            yield from flatten(value, f"{prefix}.{key}" if prefix else str(key))
+    elif isinstance(tree, (int, float)) and not isinstance(tree, bool):
+        yield prefix, tree
+
+
+def direction(key):
+    name = key.rsplit(".", 1)[-1]
+    if name.endswith(LOWER_IS_BETTER):
+        return -1
+    if name.endswith(HIGHER_IS_BETTER):
+        return 1
+    return 0
+
+
+def compare(baseline, current, threshold):
+    before = dict(flatten(baseline["results"]))
+    after = dict(flatten(current["results"]))
+
+    rows, regressions = [], []
+    for key in sorted(before.keys() & after.keys()):
+        old, new = before[key], after[key]
+        change = (new - old) / old * 100 if old else 0.0
+        worse = -change * direction(key)
+
+        flag = ""
+        if direction(key) and worse > threshold:
+            flag = "REGRESSION"
+            regressions.append(key)
+        elif direction(key) and -worse > threshold:
+            flag = "improved"
+        rows.append((key, old, new, change, flag))
+    return rows, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=10, help="Percent change tolerated before failing")
+    args = parser.parse_args(argv)
+
+    baseline, current = load_results(args.baseline), load_results(args.current)
+    if baseline.get("benchmark") != current.get("benchmark"):
+        print(f"warning: comparing {baseline.get('benchmark')} against {current.get('benchmark')}")
+    if baseline.get("params") != current.get("params"):
+        print("warning: the runs used different parameters")
+
+    print(f"{baseline['environment']['commit']} -> {current['environment']['commit']}")
+    rows, regressions = compare(baseline, current, args.threshold)
+    for key, old, new, change, flag in rows:
+        print(f"{key:60} {old:>12.6g} {new:>12.6g} {change:>+8.1f}%  {flag}")
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,206 @@
+'''
+Compare the WSGI and ASGI serving modes on the enrolment and grade routes.
+
+    python -m benchmarks.loadtest --concurrency 200 --duration 10
+
+Seeds a throwaway SQLite database per mode, starts each server in turn on a
+free port, then keeps --concurrency keep-alive connections busy for
+--duration seconds per route and reports throughput and latency
+percentiles. The reads run first, then the writes: every enrolment is in a
+subject the student has not joined yet and every grade update sets a new
+grade, so none of them is rejected or a no-op. The
+server commands can be swapped (e.g. for gunicorn) with --wsgi-cmd and
+--asgi-cmd, "{port}" is substituted.
+'''
+import argparse
+import asyncio
+import itertools
+import os
+import shlex
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.results import write_results
+
+DEFAULT_WSGI_CMD = "flask --app app run --port {port} --with-threads"
+DEFAULT_ASGI_CMD = "uvicorn asgi:application --port {port} --log-level warning"
+
+# Method, path and body, "{fresh_subject}" and "{fresh_grade}" change with every request
+ROUTES = [
+    ("GET", "/student/subjects", None),
+    ("GET", "/student/subjects/grades", None),
+    ("GET", "/student/subject/1/grades", None),
+    ("POST", "/student/subject/{fresh_subject}", None),
+    ("PUT", "/student/subject/1/grades", '{{"prelims_grade": {fresh_grade}}}'),
+]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def seed(database_url, students=200, subjects=20, per_student=8, fresh_subjects=500):
+    # Build the data and mint one token per student inside a normal app context
+    from app import create_app
+    from db import db
+    from flask_jwt_extended import create_access_token
+    from models import StudentModel, SubjectModel, SubjectStudent
+
+    os.environ["DATABASE_URL"] = database_url
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        db.session.execute(db.insert(SubjectModel), [
+            {"name": f"SUBJ{i}", "description": f"Subject {i}", "units": 3} for i in range(1, subjects + fresh_subjects + 1)
+        ])
+        db.session.execute(db.insert(StudentModel), [
+            {"name": f"Student {i}", "email": f"student{i}@example.com", "password": f"unused-{i}", "course": "BSCS"}
+            for i in range(1, students + 1)
+        ])
+        db.session.execute(db.insert(SubjectStudent), [
+            {"student_id": student, "subject_id": subject, "prelims_grade": 80.0 + subject}
+            for student in range(1, students + 1) for subject in range(1, per_student + 1)
+        ])
+        db.session.commit()
+        tokens = [create_access_token(identity=student, expires_delta=False) for student in range(1, students + 1)]
+        # Subjects nobody is enrolled in, one per round over the students
+        return tokens, subjects + 1
+
+
+def build_request(route, number, tokens, first_fresh_subject):
+    # Request numbers are shared by all workers, so no two requests enrol the same student in the same subject
+    method, path, body = route
+    values = {"fresh_subject": first_fresh_subject + number // len(tokens), "fresh_grade": 60 + number % 40}
+    headers = f"Host: localhost\r\nAuthorization: Bearer {tokens[number % len(tokens)]}\r\n"
+    if body is None:
+        body = ""
+    else:
+        body = body.format(**values)
+        headers += f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+    return f"{method} {path.format(**values)} HTTP/1.1\r\n{headers}\r\n{body}".encode()
+
+
+async def worker(port, route, tokens, first_fresh_subject, numbers, deadline, latencies, errors, timeout=30):
+    connection = None
+    while time.perf_counter() < deadline:
+        message = build_request(route, next(numbers), tokens, first_fresh_subject)
+
+        start = time.perf_counter()
+        try:
+            if connection is None:
+                connection = await asyncio.open_connection("127.0.0.1", port)
+            reader, writer = connection
+
+            writer.write(message)
+            await writer.drain()
+
+            head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout)
+            status = int(head.split(b" ", 2)[1])
+            headers = dict(
+                line.lower().split(b": ", 1) for line in head.split(b"\r\n")[1:] if b": " in line
+            )
+            await asyncio.wait_for(reader.readexactly(int(headers.get(b"content-length", 0))), timeout)
+        except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+            errors.append("connection")
+            if connection is not None:
+                connection[1].close()
+            connection = None
+            continue
+
+        latencies.append(time.perf_counter() - start)
+        if status >= 300:
+            errors.append(status)
+
+        # Servers without keep-alive (the Werkzeug dev server) close after every response
+        if headers.get(b"connection") == b"close":
+            writer.close()
+            connection = None
+
+    if connection is not None:
+        connection[1].close()
+
+
+async def drive(port, route, tokens, first_fresh_subject, concurrency, duration):
+    latencies, errors = [], []
+    numbers = itertools.count()
+    deadline = time.perf_counter() + duration
+    await asyncio.gather(*[
+        worker(port, route, tokens, first_fresh_subject, numbers, deadline, latencies, errors)
+        for _ in range(concurrency)
+    ])
+
+    quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else [0] * 99
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "rps": round(len(latencies) / duration, 1),
+        "p50_ms": round(quantiles[49] * 1e3, 2),
+        "p99_ms": round(quantiles[98] * 1e3, 2),
+    }
+
+
+def wait_for_port(port, process, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"server exited with code {process.returncode}")
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError("server did not start")
+
+
+def run_mode(command, env, args):
+    # A fresh database per mode, the writes of the previous run would change what this one reads and enrols
+    _, path = tempfile.mkstemp(suffix=".db")
+    database_url = "sqlite:///" + path
+    tokens, first_fresh_subject = seed(database_url)
+
+    port = free_port()
+    process = subprocess.Popen(shlex.split(command.format(port=port)), env={**env, "DATABASE_URL": database_url})
+    try:
+        wait_for_port(port, process)
+        return {
+            f"{method} {route_path}": asyncio.run(drive(port, (method, route_path, body), tokens, first_fresh_subject, args.concurrency, args.duration))
+            for method, route_path, body in ROUTES
+        }
+    finally:
+        process.terminate()
+        process.wait()
+        os.remove(path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--duration", type=float, default=5)
+    parser.add_argument("--wsgi-cmd", default=DEFAULT_WSGI_CMD)
+    parser.add_argument("--asgi-cmd", default=DEFAULT_ASGI_CMD)
+    parser.add_argument("--modes", default="wsgi,asgi")
+    parser.add_argument("--cache-backend", default="null", help="Off by default so the runs compare the work behind the cache")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    env = {**os.environ, "CACHE_BACKEND": args.cache_backend}
+
+    commands = {"wsgi": args.wsgi_cmd, "asgi": args.asgi_cmd}
+    results = {}
+    for mode in args.modes.split(","):
+        results[mode] = run_mode(commands[mode], env, args)
+        for route, stats in results[mode].items():
+            print(f"{mode:5} {route:36} {stats['rps']:>9} req/s  p50 {stats['p50_ms']:>8} ms  p99 {stats['p99_ms']:>8} ms  errors {stats['errors']}", flush=True)
+
+    if args.output:
+        write_results(args.output, "loadtest", {"concurrency": args.concurrency, "duration": args.duration, "cache_backend": args.cache_backend}, results)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,179 @@
+'''
+Micro-benchmarks for grade averages, schema dumps and password hashing.
+
+    python -m benchmarks.micro --scale medium --output micro.json
+
+average_grade   SubjectStudent.compute_average_grade on one row, the set-based
+                recompute_averages over every enrolment of the campus, and
+                top_in_subject served by the (subject_id, average_grade) index
+schemas         one row through each response schema in schemas.py, as a bare
+                dump, as dump plus the app's JSON encoder, and through
+                compile_schema where a route serves it that way
+hashing         one hash and one verify at PASSWORD_HASH_ROUNDS on the calling
+                thread and through the worker pool, and hash_many throughput
+
+Every timing is the best of --repeat runs.
+'''
+import argparse
+import os
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+from benchmarks.campus import SCALES, campus_shape, generate
+from benchmarks.compare import flatten
+from benchmarks.results import write_results
+
+
+def best(fn, number=1, repeat=5):
+    # Seconds per call, best of `repeat` batches of `number` calls
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        timings.append((time.perf_counter() - start) / number)
+    return min(timings)
+
+
+def bench_average_grade(repeat):
+    from db import db
+    from models import SubjectStudent
+
+    enrolment = SubjectStudent(prelims_grade=81.5, midterms_grade=88.25, finals_grade=None)
+    rows = db.session.query(db.func.count(SubjectStudent.id)).scalar()
+
+    def recompute():
+        SubjectStudent.recompute_averages()
+        db.session.commit()
+
+    recompute_time = best(recompute, repeat=repeat)
+    top_time = best(lambda: SubjectStudent.top_in_subject(1, 10).all(), number=100, repeat=repeat)
+    return {
+        "compute_average_grade_us": round(best(enrolment.compute_average_grade, number=10000, repeat=repeat) * 1e6, 3),
+        "recompute_averages_ms": round(recompute_time * 1e3, 2),
+        "recompute_averages_per_row_us": round(recompute_time / max(rows, 1) * 1e6, 3),
+        "top_in_subject_us": round(top_time * 1e6, 1),
+    }
+
+
+def schema_cases(rows):
+    from sqlalchemy.orm import joinedload, selectinload
+
+    from models import StudentModel, SubjectModel, SubjectStudent
+    from schemas import GradeSchema, PlainSubjectSchema, StudentSchema, SubjectSchema, TranscriptSchema
+
+    grades = SubjectStudent.query.options(
+        joinedload(SubjectStudent.student), joinedload(SubjectStudent.subject)
+    ).order_by(SubjectStudent.id).limit(rows).all()
+    students = StudentModel.query.options(
+        selectinload(StudentModel.subjects),
+        selectinload(StudentModel.subject_students).joinedload(SubjectStudent.subject)
+    ).order_by(StudentModel.id).limit(rows).all()
+    subjects = SubjectModel.query.options(selectinload(SubjectModel.students)).order_by(SubjectModel.id).limit(rows).all()
+    transcripts = [
+        SimpleNamespace(student=student, subjects=student.subject_students, gwa=85.0, units=24.0) for student in students
+    ]
+
+    # (name, schema, objects, served compiled by a route)
+    return [
+        ("GradeSchema", GradeSchema(many=True), grades, True),
+        ("StudentSchema", StudentSchema(many=True), students, True),
+        ("SubjectSchema", SubjectSchema(many=True), subjects, False),
+        ("PlainSubjectSchema", PlainSubjectSchema(many=True), subjects, False),
+        ("TranscriptSchema", TranscriptSchema(many=True), transcripts, True),
+    ]
+
+
+def bench_schemas(rows, repeat):
+    from flask import current_app
+
+    from serializers import compile_schema
+
+    results = {}
+    for name, schema, objects, compiled in schema_cases(rows):
+        count = max(len(objects), 1)
+        dump_time = best(lambda: schema.dump(objects), repeat=repeat)
+        json_time = best(lambda: current_app.json.dumps(schema.dump(objects)), repeat=repeat)
+
+        results[name] = {
+            "rows": len(objects),
+            "dump_per_row_us": round(dump_time / count * 1e6, 3),
+            "dump_json_per_row_us": round(json_time / count * 1e6, 3),
+        }
+        if compiled:
+            serializer = compile_schema(schema)
+            compiled_time = best(lambda: serializer.dumps(objects), repeat=repeat)
+            results[name]["compiled_per_row_us"] = round(compiled_time / count * 1e6, 3)
+    return results
+
+
+def bench_hashing(repeat, batch):
+    from hashing import hash_password, password_hasher, verify_password
+
+    password = "benchmark-password"
+    password_hash = hash_password(password, password_hasher.rounds)
+    password_hasher.hash(password)  # start the pool outside the timings
+
+    hash_many_time = best(lambda: password_hasher.hash_many([password] * batch), repeat=max(1, repeat // 2))
+    return {
+        "rounds": password_hasher.rounds,
+        "workers": password_hasher.workers,
+        "hash_ms": round(best(lambda: hash_password(password, password_hasher.rounds), repeat=repeat) * 1e3, 2),
+        "verify_ms": round(best(lambda: verify_password(password, password_hash), repeat=repeat) * 1e3, 2),
+        "pool_hash_ms": round(best(lambda: password_hasher.hash(password), repeat=repeat) * 1e3, 2),
+        "pool_verify_ms": round(best(lambda: password_hasher.verify(password, password_hash), repeat=repeat) * 1e3, 2),
+        "hash_many_per_second": round(batch / hash_many_time, 1),
+    }
+
+
+SUITES = ["average_grade", "schemas", "hashing"]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", choices=SCALES, default="small")
+    parser.add_argument("--suites", default=",".join(SUITES))
+    parser.add_argument("--rows", type=int, default=500, help="Rows per schema dump")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--hash-batch", type=int, default=64, help="Passwords per hash_many call")
+    parser.add_argument("--seed", type=int, default=2024)
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    handle, path = tempfile.mkstemp(suffix=".db")
+    os.close(handle)
+    os.environ["DATABASE_URL"] = "sqlite:///" + path
+
+    from app import create_app
+    from db import db
+
+    app = create_app()
+    results = {}
+    with app.app_context():
+        db.create_all()
+        shape = campus_shape(SCALES[args.scale])
+        generate(**shape, seed=args.seed)
+
+        suites = args.suites.split(",")
+        if "average_grade" in suites:
+            results["average_grade"] = bench_average_grade(args.repeat)
+        if "schemas" in suites:
+            results["schemas"] = bench_schemas(args.rows, args.repeat)
+        if "hashing" in suites:
+            results["hashing"] = bench_hashing(args.repeat, args.hash_batch)
+
+    for key, value in flatten(results):
+        print(f"{key:48} {value}", flush=True)
+
+    if args.output:
+        write_results(args.output, "micro", {"scale": args.scale, "rows": args.rows, "seed": args.seed}, results)
+
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,47 @@
+'''
+JSON result files shared by the benchmarks.
+
+Every file records which commit and machine produced it next to the numbers,
+so two runs can be compared with `python -m benchmarks.compare`. Timings are
+named *_ms, *_us or seconds (lower is better) and throughputs rps or
+*_per_second (higher is better), compare relies on those suffixes.
+'''
+import json
+import os
+import platform
+import subprocess
+from datetime import datetime, timezone
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def git(*args):
+    try:
+        return subprocess.run(["git", *args], cwd=REPO, capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+
+
+def environment():
+    return {
+        "commit": git("rev-parse", "--short", "HEAD"),
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+
+
+def write_results(path, benchmark, params, results):
+    with open(path, "w") as output:
+        json.dump(
+            {"benchmark": benchmark, "environment": environment(), "params": params, "results": results},
+            output, indent=2
+        )
+        output.write("\n")
+
+
+def load_results(path):
+    with open(path) as source:
+        return json.load(source)
@@ -0,0 +1,245 @@
+'''
+End-to-end load scenarios on a generated campus.
+
+    python -m benchmarks.scenarios --scale medium --drivers client,server --output scenarios.json
+
+login_storm      every benchmark user signs in at once (POST /login)
+grade_release    grades are out: the users read their grades, transcript and
+                 average over and over
+enrolment_rush   every user tries to enrol in one new subject with
+                 --rush-capacity seats, checked for overbooking afterwards
+
+Each scenario is a fixed list of requests sent --concurrency at a time
+through one of two drivers: "client" calls create_app() in process through
+Flask's test client (no network, shows the cost of the app itself), "server"
+starts a real WSGI server (--server-cmd) and talks HTTP to it.
+'''
+import argparse
+import asyncio
+import collections
+import json
+import os
+import shlex
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.campus import PASSWORD, SCALES, campus_shape, generate
+from benchmarks.loadtest import DEFAULT_WSGI_CMD, free_port, wait_for_port
+from benchmarks.results import write_results
+
+Request = collections.namedtuple("Request", "method path token body")
+
+READ_PATHS = ["/student/subjects/grades", "/student/transcript", "/student/average", "/student/subject/{subject_id}/grades"]
+
+
+def setup(users, seed, scale):
+    from flask_jwt_extended import create_access_token
+
+    from app import create_app
+    from db import db
+    from models import SubjectStudent
+    from transcripts import refresh_transcripts
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        counts = generate(**campus_shape(SCALES[scale]), seed=seed, login_users=users)
+        users = min(users, counts["students"])
+        student_ids = list(range(1, users + 1))
+
+        # Grades have been released: the users' transcripts are already built
+        refresh_transcripts(student_ids)
+        db.session.commit()
+
+        first_subjects = dict(db.session.query(
+            SubjectStudent.student_id, db.func.min(SubjectStudent.subject_id)
+        ).filter(SubjectStudent.student_id.in_(student_ids)).group_by(SubjectStudent.student_id))
+
+        tokens = {student_id: create_access_token(identity=student_id, expires_delta=False) for student_id in student_ids}
+    return app, {"users": student_ids, "tokens": tokens, "first_subjects": first_subjects, "counts": counts}
+
+
+def login_storm(app, campus, args):
+    return [
+        Request("POST", "/login", None, {"email": f"student{student_id}@example.com", "password": PASSWORD})
+        for student_id in campus["users"]
+    ]
+
+
+def grade_release(app, campus, args):
+    users = campus["users"]
+    requests = []
+    for index in range(args.reads):
+        student_id = users[index % len(users)]
+        path = READ_PATHS[(index // len(users)) % len(READ_PATHS)]
+        requests.append(Request("GET", path.format(subject_id=campus["first_subjects"].get(student_id, 1)), campus["tokens"][student_id], None))
+    return requests
+
+
+def enrolment_rush(app, campus, args):
+    from db import db
+    from models import SubjectModel
+
+    with app.app_context():
+        count = SubjectModel.query.count()
+        subject = SubjectModel(name=f"RUSH{count}", description=f"Enrolment rush {count}", units=3, capacity=args.rush_capacity)
+        db.session.add(subject)
+        db.session.commit()
+        campus["rush_subject"] = subject.id
+
+    return [Request("POST", f"/student/subject/{campus['rush_subject']}", campus["tokens"][student_id], None) for student_id in campus["users"]]
+
+
+def check_rush(app, campus, args):
+    from db import db
+    from models import SubjectModel, SubjectStudent, WaitlistModel
+
+    with app.app_context():
+        subject_id = campus["rush_subject"]
+        enrolled = SubjectStudent.query.filter_by(subject_id=subject_id).count()
+        waiting = WaitlistModel.query.filter_by(subject_id=subject_id).count()
+        counter = db.session.get(SubjectModel, subject_id).enrolled_count
+        expected = min(len(campus["users"]), args.rush_capacity)
+        return {"enrolled": enrolled, "waitlisted": waiting, "correct": enrolled == counter == expected}
+
+
+SCENARIOS = {
+    "login_storm": (login_storm, None),
+    "grade_release": (grade_release, None),
+    "enrolment_rush": (enrolment_rush, check_rush),
+}
+
+
+def summarize(outcomes, elapsed):
+    latencies = [latency for _, latency in outcomes if latency is not None]
+    quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else [0] * 99
+    return {
+        "requests": len(outcomes),
+        "seconds": round(elapsed, 3),
+        "rps": round(len(outcomes) / elapsed, 1),
+        "p50_ms": round(quantiles[49] * 1e3, 2),
+        "p95_ms": round(quantiles[94] * 1e3, 2),
+        "p99_ms": round(quantiles[98] * 1e3, 2),
+        "statuses": dict(sorted(collections.Counter(str(status) for status, _ in outcomes).items())),
+    }
+
+
+def run_client(app, requests, concurrency):
+    def send(request):
+        headers = {"Authorization": f"Bearer {request.token}"} if request.token else {}
+        start = time.perf_counter()
+        response = app.test_client().open(request.path, method=request.method, headers=headers, json=request.body)
+        return response.status_code, time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(send, requests))
+    return summarize(outcomes, time.perf_counter() - start)
+
+
+async def send_http(port, request, timeout=120):
+    body = json.dumps(request.body).encode() if request.body is not None else b""
+    head = f"{request.method} {request.path} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(body)}\r\nConnection: close\r\n"
+    if request.body is not None:
+        head += "Content-Type: application/json\r\n"
+    if request.token:
+        head += f"Authorization: Bearer {request.token}\r\n"
+
+    start = time.perf_counter()
+    try:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(head.encode() + b"\r\n" + body)
+        await writer.drain()
+        status_line = await asyncio.wait_for(reader.readline(), timeout)
+        await asyncio.wait_for(reader.read(), timeout)
+        writer.close()
+    except (OSError, asyncio.TimeoutError):
+        return "connection", None
+    return int(status_line.split(b" ", 2)[1]), time.perf_counter() - start
+
+
+async def drive_http(port, requests, concurrency):
+    slots = asyncio.Semaphore(concurrency)
+
+    async def send(request):
+        async with slots:
+            return await send_http(port, request)
+
+    start = time.perf_counter()
+    outcomes = await asyncio.gather(*[send(request) for request in requests])
+    return summarize(outcomes, time.perf_counter() - start)
+
+
+def run_scenarios(driver, app, campus, args):
+    results = {}
+    server = None
+    if driver == "server":
+        port = free_port()
+        server = subprocess.Popen(shlex.split(args.server_cmd.format(port=port)), env=os.environ.copy())
+
+    try:
+        if server is not None:
+            wait_for_port(port, server)
+
+        for name in args.scenarios.split(","):
+            build, check = SCENARIOS[name]
+            requests = build(app, campus, args)
+
+            if server is not None:
+                stats = asyncio.run(drive_http(port, requests, args.concurrency))
+            else:
+                stats = run_client(app, requests, args.concurrency)
+            if check is not None:
+                stats.update(check(app, campus, args))
+
+            results[name] = stats
+            print(
+                f"{driver:6} {name:15} {stats['requests']:>6} requests {stats['rps']:>8} req/s  p50 {stats['p50_ms']:>8} ms  "
+                f"p99 {stats['p99_ms']:>8} ms  {stats['statuses']}" + ("" if check is None else f"  correct={stats['correct']}"),
+                flush=True
+            )
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", choices=SCALES, default="small")
+    parser.add_argument("--drivers", default="client,server")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--users", type=int, default=100, help="Students with a password and a token")
+    parser.add_argument("--reads", type=int, default=2000, help="Requests in grade_release")
+    parser.add_argument("--rush-capacity", type=int, default=25)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--server-cmd", default=DEFAULT_WSGI_CMD)
+    parser.add_argument("--seed", type=int, default=2024)
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    handle, path = tempfile.mkstemp(suffix=".db")
+    os.close(handle)
+    # The server subprocess inherits these, so it sees the same data and accepts the same tokens
+    os.environ["DATABASE_URL"] = "sqlite:///" + path
+    os.environ.setdefault("JWT_SECRET_KEY", "benchmark-secret-key-benchmark-secret-key")
+
+    app, campus = setup(args.users, args.seed, args.scale)
+    results = {driver: run_scenarios(driver, app, campus, args) for driver in args.drivers.split(",")}
+
+    if args.output:
+        params = {key: getattr(args, key) for key in ("scale", "users", "reads", "rush_capacity", "concurrency", "server_cmd", "seed")}
+        write_results(args.output, "scenarios", {**params, **campus["counts"]}, results)
+
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,108 @@
+import csv
+import io
+
+from flask import request
+from marshmallow import ValidationError
+from sqlalchemy import update
+
+from db import db
+from grade_history import grade_changes, utcnow
+from models import SubjectStudent
+from schemas import BulkGradeSchema
+
+GRADE_FIELDS = ("prelims_grade", "midterms_grade", "finals_grade")
+
+# Keep the IN (...) lists well under the database's bound parameter limit
+LOOKUP_CHUNK_SIZE = 500
+
+
+def read_grade_rows():
+    # Accept either a CSV upload (multipart "file" or a text/csv body) or a JSON array
+    upload = request.files.get("file")
+    if upload is not None:
+        return csv_rows(io.TextIOWrapper(upload.stream, encoding="utf-8-sig"))
+    if request.mimetype == "text/csv":
+        return csv_rows(io.StringIO(request.get_data(as_text=True)))
+
+    rows = request.get_json(silent=True)
+    if not isinstance(rows, list):
+        raise ValidationError("Expected a JSON array of grade rows or a CSV upload.")
+    return rows
+
+
+def csv_rows(stream):
+    for row in csv.DictReader(stream):
+        # An empty cell means "leave this grade alone", not an invalid number
+        yield {key.strip(): value for key, value in row.items() if key and value not in (None, "")}
+
+
+def validate_grade_rows(rows):
+    schema = BulkGradeSchema()
+    valid = {}
+    errors = []
+
+    for index, row in enumerate(rows):
+        try:
+            data = schema.load(row)
+        except ValidationError as err:
+            student_id = row.get("student_id") if isinstance(row, dict) else None
+            errors.append({"row": index, "student_id": student_id, "errors": err.messages})
+            continue
+
+        if data["student_id"] in valid:
+            errors.append({"row": index, "student_id": data["student_id"], "errors": {"student_id": ["Duplicate student_id in batch."]}})
+            continue
+
+        valid[data["student_id"]] = (index, data)
+
+    return valid, errors
+
+
+def find_enrolments(subject_id, student_ids):
+    # The current grades come along so the history can record what each row overwrote
+    student_ids = list(student_ids)
+    found = {}
+
+    for start in range(0, len(student_ids), LOOKUP_CHUNK_SIZE):
+        chunk = student_ids[start:start + LOOKUP_CHUNK_SIZE]
+        found.update((row.student_id, row) for row in db.session.query(
+            SubjectStudent.id, SubjectStudent.student_id, SubjectStudent.subject_id, *[getattr(SubjectStudent, field) for field in GRADE_FIELDS]
+        ).filter(
+            SubjectStudent.subject_id == subject_id,
+            SubjectStudent.in_term(),
+            SubjectStudent.student_id.in_(chunk)
+        ))
+
+    return found
+
+
+def apply_grade_rows(subject_id, rows, changed_by=None):
+    valid, errors = validate_grade_rows(rows)
+    enrolments = find_enrolments(subject_id, valid)
+    changed_at = utcnow()
+
+    params = []
+    history = []
+    for student_id, (index, data) in valid.items():
+        if student_id not in enrolments:
+            errors.append({"row": index, "student_id": student_id, "errors": {"student_id": ["Student not enrolled in that subject."]}})
+            continue
+
+        values = {field: data[field] for field in GRADE_FIELDS if field in data}
+        if values:
+            params.append({"id": enrolments[student_id].id, **values})
+            history += grade_changes(enrolments[student_id], values, changed_by, "bulk", changed_at)
+
+    # One executemany per distinct set of columns, all inside the caller's transaction
+    if params:
+        db.session.execute(update(SubjectStudent), params)
+        SubjectStudent.recompute_averages(SubjectStudent.subject_id == subject_id, SubjectStudent.in_term())
+
+    errors.sort(key=lambda error: error["row"])
+    return {
+        "updated": len(params),
+        "errors": errors,
+        "student_ids": [student_id for student_id in valid if student_id in enrolments],
+        # For grade_history.record() once the caller has committed
+        "history": history,
+    }
@@ -0,0 +1,197 @@
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import Response, make_response, request
+from flask_jwt_extended import get_jwt_identity
+
+from metrics import CACHE_LOOKUPS
+from replicas import replica_router
+from terms import current_term
+
+
+class LRUBackend:
+    '''
+    Bounded in-process cache, entries are evicted when full or once their TTL passes.
+
+    Tag versions live in the process too, so an invalidation made by one
+    worker is not seen by the others: they keep serving their entries until
+    the TTL passes. Only use it with a single worker, or with a TTL short
+    enough to serve stale data for.
+    '''
+
+    def __init__(self, max_entries=2048, ttl=5):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def versions(self, tags):
+        with self._lock:
+            return [self._versions.get(tag, 0) for tag in tags]
+
+    def bump(self, tags):
+        with self._lock:
+            for tag in tags:
+                self._versions[tag] = self._versions.get(tag, 0) + 1
+
+
+class RedisBackend:
+    '''Cache shared by every worker, needs the optional "redis" package.'''
+
+    def __init__(self, url, ttl=300, prefix="response-cache:"):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return None if value is None else pickle.loads(value)
+
+    def set(self, key, value):
+        self.client.setex(self.prefix + key, self.ttl, pickle.dumps(value))
+
+    def versions(self, tags):
+        values = self.client.mget([self.prefix + "tag:" + tag for tag in tags])
+        return [int(value or 0) for value in values]
+
+    def bump(self, tags):
+        pipeline = self.client.pipeline(transaction=False)
+        for tag in tags:
+            pipeline.incr(self.prefix + "tag:" + tag)
+        pipeline.execute()
+
+
+class ResponseCache:
+    '''
+    Caches the final serialized response of GET endpoints.
+
+    Every entry is filed under a set of tags ("subject-list", "subject:<id>",
+    "student:<id>"). The current version of each tag is part of the cache key,
+    so invalidating a tag only means bumping its version, stale entries are
+    never looked up again and age out of the backend on their own.
+
+    Invalidations reach every worker only through a shared backend, so caching
+    is off unless CACHE_REDIS_URL is set (CACHE_BACKEND defaults to "redis"
+    then, "null" otherwise). The per-process "lru" backend has to be asked
+    for and keeps entries for 5 seconds unless CACHE_TTL says otherwise.
+    '''
+
+    def __init__(self):
+        self.backend = None
+        self.hits = 0
+        self.misses = 0
+        # The backends lock their own state, the counters are updated from every request thread
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        redis_url = app.config.setdefault("CACHE_REDIS_URL", None)
+        backend = app.config.setdefault("CACHE_BACKEND", "redis" if redis_url else "null")
+
+        if backend == "lru":
+            self.backend = LRUBackend(app.config.setdefault("CACHE_MAX_ENTRIES", 2048), app.config.setdefault("CACHE_TTL", 5))
+        elif backend == "redis":
+            self.backend = RedisBackend(redis_url, app.config.setdefault("CACHE_TTL", 300))
+        elif backend is None or backend == "null":
+            self.backend = None
+        else:
+            # Any object with get/set/versions/bump can be plugged in directly
+            self.backend = backend
+
+        app.extensions["response_cache"] = self
+
+    def cached(self, tags, per_student=False):
+        def decorator(fn):
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                if self.backend is None or request.method != "GET":
+                    return fn(*args, **kwargs)
+
+                key = self.key(tags(**kwargs) if callable(tags) else tags, per_student)
+                response = self.lookup(key)
+                if response is None:
+                    # A lagging replica would be cached under the new tag versions until the TTL
+                    replica_router.use_primary()
+                    response = make_response(fn(*args, **kwargs))
+                    if not self.store(key, response):
+                        return response
+
+                # Turns a matching If-None-Match into an empty 304
+                return response.make_conditional(request)
+
+            return wrapper
+
+        return decorator
+
+    def key(self, tags, per_student=False):
+        # The current request's entry, asgi.py looks up the same entries as the Flask views
+        entry_tags = list(tags)
+        identity = None
+        if per_student:
+            identity = get_jwt_identity()
+            entry_tags.append(f"student:{identity}")
+
+        # The term is part of the key, a Redis cache outlives the restart that starts a new one
+        return "|".join([
+            current_term(),
+            request.full_path,
+            request.headers.get("Accept", ""),
+            str(identity),
+            ",".join(f"{tag}={version}" for tag, version in zip(entry_tags, self.backend.versions(entry_tags))),
+        ])
+
+    def lookup(self, key):
+        entry = self.backend.get(key)
+        if entry is None:
+            with self._lock:
+                self.misses += 1
+            CACHE_LOOKUPS.labels("miss").inc()
+            return None
+
+        with self._lock:
+            self.hits += 1
+        CACHE_LOOKUPS.labels("hit").inc()
+        status, headers, body = entry
+        return Response(body, status=status, headers=headers)
+
+    def store(self, key, response):
+        # Only complete 200 responses are kept, they get their ETag here
+        if response.status_code != 200 or response.is_streamed:
+            return False
+
+        response.add_etag()
+        self.backend.set(key, (response.status_code, response.headers.to_wsgi_list(), response.get_data()))
+        return True
+
+    def invalidate(self, *tags):
+        if self.backend is not None and tags:
+            self.backend.bump(tags)
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,126 @@
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+from student_import import StudentImporter, read_student_rows, CHUNK_SIZE
+from transcripts import rebuild_transcripts
+from enrolments import recount_seats, clear_closed_waitlists
+from purge import purge_students, count_students, CHUNK_SIZE as PURGE_CHUNK_SIZE
+from replicas import SQLiteReplicator
+from archive import archive_term, term_counts, CHUNK_SIZE as ARCHIVE_CHUNK_SIZE
+from terms import current_term
+from exports import export_runner
+from db import db
+
+students_cli = AppGroup("students", help="Manage student records.")
+transcripts_cli = AppGroup("transcripts", help="Manage the precomputed student transcripts.")
+subjects_cli = AppGroup("subjects", help="Manage subjects.")
+replicas_cli = AppGroup("replicas", help="Manage the read replicas.")
+terms_cli = AppGroup("terms", help="Manage academic terms and their archive.")
+exports_cli = AppGroup("exports", help="Manage grade sheet exports.")
+
+
+@students_cli.command("import")
+@click.argument("file", type=click.File("r", encoding="utf-8-sig"))
+@click.option("--format", "format", type=click.Choice(["csv", "ndjson"]), default=None, help="Defaults to the file extension.")
+@click.option("--chunk-size", default=CHUNK_SIZE, show_default=True, help="Rows hashed and inserted per transaction.")
+def import_students(file, format, chunk_size):
+    """Register every student listed in a CSV or NDJSON FILE."""
+    if format is None:
+        format = "ndjson" if file.name.endswith((".ndjson", ".jsonl")) else "csv"
+
+    def progress(report):
+        click.echo(f"processed {report['processed']}, created {report['created']}, failed {len(report['errors'])}")
+
+    report = StudentImporter(chunk_size=chunk_size, progress=progress).run(read_student_rows(file, format))
+
+    for error in report["errors"]:
+        click.echo(f"row {error['row']} ({error['email']}): {error['errors']}", err=True)
+
+
+@students_cli.command("purge")
+@click.option("--course", default=None, help="Delete the students of this course.")
+@click.option("--batch", type=int, default=None, help="Delete the students of this graduation batch.")
+@click.option("--chunk-size", default=PURGE_CHUNK_SIZE, show_default=True, help="Students deleted per transaction.")
+@click.option("--yes", is_flag=True, help="Do not ask for confirmation.")
+def purge(course, batch, chunk_size, yes):
+    """Delete every student of a course and/or graduation batch."""
+    if course is None and batch is None:
+        raise click.UsageError("Give --course, --batch or both.")
+
+    if not yes:
+        click.confirm(f"Delete {count_students(course, batch)} students and their grades?", abort=True)
+
+    def progress(report):
+        click.echo(f"deleted {report['deleted']} of {report['matched']}")
+
+    report = purge_students(course=course, batch=batch, chunk_size=chunk_size, progress=progress)
+    click.echo(f"{report['deleted']} students deleted, {report['promoted']} waitlisted students enrolled")
+
+
+@transcripts_cli.command("rebuild")
+@click.option("--chunk-size", default=CHUNK_SIZE, show_default=True, help="Students rebuilt per transaction.")
+def rebuild(chunk_size):
+    """Recompute every student's transcript from the grades."""
+    rebuilt = rebuild_transcripts(chunk_size=chunk_size, progress=lambda count: click.echo(f"rebuilt {count}"))
+    click.echo(f"{rebuilt} transcripts rebuilt")
+
+
+@subjects_cli.command("recount")
+def recount():
+    """Recompute every subject's enrolled_count from this term's enrolments, drop closed terms' waitlists."""
+    fixed = recount_seats()
+    dropped = clear_closed_waitlists()
+    db.session.commit()
+    click.echo(f"{fixed} subjects corrected, {dropped} waitlist entries of closed terms dropped")
+
+
+@replicas_cli.command("sync")
+@click.option("--interval", default=1.0, show_default=True, help="Seconds between two copies.")
+@click.option("--once", is_flag=True, help="Copy once and exit.")
+def sync_replicas(interval, once):
+    """Copy the SQLite primary over every SQLite replica, a local stand-in for replication."""
+    engines = [db.engines[None], *[db.engines[key] for key in current_app.config["REPLICA_BINDS"]]]
+    if len(engines) == 1:
+        raise click.UsageError("No replicas configured, set DATABASE_REPLICA_URLS.")
+    if any(engine.dialect.name != "sqlite" for engine in engines):
+        raise click.UsageError("Only SQLite primaries and replicas can be synced this way.")
+
+    replicator = SQLiteReplicator(engines[0].url.database, [engine.url.database for engine in engines[1:]])
+    if once:
+        replicator.sync()
+        return
+
+    click.echo(f"Copying {replicator.primary_path} to {len(replicator.replica_paths)} replicas every {interval}s")
+    replicator.run(interval)
+
+
+@terms_cli.command("list")
+def list_terms():
+    """Enrolments per term, in the database and in the archive."""
+    for term, counts in sorted(term_counts().items()):
+        marker = " (current)" if term == current_term() else ""
+        click.echo(f"{term}{marker}: {counts['enrolments']} enrolments, {counts['archived']} archived")
+
+
+@terms_cli.command("archive")
+@click.argument("term")
+@click.option("--chunk-size", default=ARCHIVE_CHUNK_SIZE, show_default=True, help="Enrolments moved per transaction.")
+@click.option("--no-compact", is_flag=True, help="Skip the VACUUM of the archive at the end.")
+def archive(term, chunk_size, no_compact):
+    """Move a closed term's enrolments and grade history to the archive. Safe to rerun after an interruption."""
+    def progress(archived):
+        click.echo(f"archived {archived['enrolments']} enrolments, {archived['history']} history rows")
+
+    try:
+        archived = archive_term(term, chunk_size=chunk_size, compact=not no_compact, progress=progress)
+    except ValueError as error:
+        raise click.UsageError(str(error))
+    click.echo(f"{term}: {archived['enrolments']} enrolments and {archived['history']} history rows archived")
+
+
+@exports_cli.command("cleanup")
+def cleanup_exports():
+    """Fail exports interrupted by a restart and delete the ones past EXPORT_RETENTION."""
+    failed, deleted = export_runner.cleanup()
+    click.echo(f"{failed} interrupted exports marked failed, {deleted} expired exports deleted")
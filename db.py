@@ -1,4 +1,79 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
 
-# Setup our initial database
-db = SQLAlchemy()
+from replicas import RoutingSession
+
+# Setup our initial database, GET requests may read from a replica (see replicas.py)
+db = SQLAlchemy(session_options={"class_": RoutingSession})
+
+# Engine settings per deployment profile, picked with DB_PROFILE.
+# "pool" only applies to server databases, "sqlite" pragmas are set on every new SQLite connection.
+ENGINE_PROFILES = {
+    # Library defaults, kept as a baseline for benchmarks
+    "default": {
+        "pool": {},
+        "sqlite": {},
+    },
+    "development": {
+        "pool": {"pool_pre_ping": True},
+        "sqlite": {
+            "journal_mode": "WAL",
+            "synchronous": "NORMAL",
+            "busy_timeout": 5000,
+        },
+    },
+    "production": {
+        "pool": {
+            "pool_size": 10,
+            "max_overflow": 20,
+            "pool_timeout": 30,
+            "pool_recycle": 1800,
+            "pool_pre_ping": True,
+        },
+        "sqlite": {
+            "journal_mode": "WAL",
+            "synchronous": "NORMAL",
+            "busy_timeout": 5000,
+            "cache_size": -64000,       # negative means KiB, so 64 MiB of page cache per connection
+            "mmap_size": 268435456,
+            "temp_store": "MEMORY",
+        },
+    },
+}
+
+
+def configure_engine(app):
+    # Must run before db.init_app, the engine options are read when the engine is created
+    profile = ENGINE_PROFILES[app.config.setdefault("DB_PROFILE", "development")]
+
+    uri = app.config.get("SQLALCHEMY_DATABASE_URI")
+    if not uri:
+        raise RuntimeError("DATABASE_URL is not set, it must name the database to use (e.g. sqlite:///data.db).")
+
+    if not uri.startswith("sqlite"):
+        app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", dict(profile["pool"]))
+    # Not a tuning knob: SQLite ignores ON DELETE CASCADE unless every connection turns foreign keys on
+    app.config.setdefault("SQLITE_PRAGMAS", {"foreign_keys": "ON", **profile["sqlite"]})
+
+
+def apply_sqlite_pragmas(engine, pragmas):
+    if engine.dialect.name != "sqlite" or not pragmas:
+        return
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+def init_engine_hooks(app):
+    replicas = app.config.get("REPLICA_BINDS", [])
+    with app.app_context():
+        for key, engine in db.engines.items():
+            pragmas = app.config["SQLITE_PRAGMAS"]
+            if key in replicas:
+                # Last, so the other pragmas can still be set. A write reaching a replica fails instead of diverging.
+                pragmas = {**pragmas, "query_only": "ON"}
+            apply_sqlite_pragmas(engine, pragmas)
@@ -0,0 +1,213 @@
+from datetime import datetime, timezone
+
+from flask_smorest import abort
+from sqlalchemy import delete, func, or_, select, update
+from sqlalchemy.orm import joinedload
+
+from db import db
+from models import StudentModel, SubjectModel, SubjectStudent, WaitlistModel
+from terms import current_term_param
+
+'''
+Every "is student S enrolled in subject T" question goes through here and is
+answered by one lookup on the unique (student_id, term, subject_id) index,
+instead of loading student.subjects and scanning it. Enrolling, seats and the
+waitlist are about the current term (see terms.py), a closed term's queue is
+dropped by `flask subjects recount` when the next term starts.
+
+Seats are counted in subjects.enrolled_count. A seat is taken with a single
+conditional UPDATE (only if the count is under the capacity), so the check
+and the increment cannot be split by a concurrent request and the only lock
+taken is on that subject's row. The unique (student_id, term, subject_id)
+index rejects a double enrolment, and since the seat was taken in the same
+transaction it is given back by the rollback. When a subject is full students
+join its waitlist, and freed seats go to the head of the queue in the
+transaction that frees them.
+
+A student is never both enrolled and waitlisted: the enrolment routes call
+lock_student() before checking either, which serializes that one student's
+own concurrent requests without blocking anybody else's.
+'''
+
+
+def find_enrolment(student_id, subject_id, *options, term=None):
+    return SubjectStudent.query.options(*options).filter(
+        SubjectStudent.student_id == student_id,
+        SubjectStudent.in_term(term),
+        SubjectStudent.subject_id == subject_id
+    ).first()
+
+
+def get_enrolment_or_abort(student_id, subject_id, message, *options, term=None):
+    enrolment = find_enrolment(student_id, subject_id, *options, term=term)
+
+    if enrolment is None:
+        # Only the failure path pays for telling a missing subject apart from a missing enrolment
+        SubjectModel.query.get_or_404(subject_id)
+        abort(400, message=message)
+
+    return enrolment
+
+
+def student_enrolments(student_id):
+    # Grades with their subject and student in one query, ready for GradeSchema
+    return SubjectStudent.query.options(
+        joinedload(SubjectStudent.subject), joinedload(SubjectStudent.student)
+    ).filter(
+        SubjectStudent.student_id == student_id,
+        SubjectStudent.in_term()
+    ).order_by(SubjectStudent.id).all()
+
+
+def enrolled_subjects(student_id):
+    return SubjectModel.query.join(
+        SubjectStudent, SubjectStudent.subject_id == SubjectModel.id
+    ).filter(
+        SubjectStudent.student_id == student_id,
+        SubjectStudent.in_term()
+    ).order_by(SubjectStudent.id).all()
+
+
+def lock_student(student_id):
+    if db.engine.dialect.name == "sqlite":
+        # SQLite starts the transaction (and takes its write lock) on the first write, a locking read does nothing
+        db.session.execute(
+            update(StudentModel).where(StudentModel.id == student_id).values(id=StudentModel.id),
+            execution_options={"synchronize_session": False}
+        )
+    else:
+        db.session.execute(select(StudentModel.id).where(StudentModel.id == student_id).with_for_update())
+
+
+def claim_seat(subject_id):
+    result = db.session.execute(
+        update(SubjectModel).where(
+            SubjectModel.id == subject_id,
+            or_(SubjectModel.capacity.is_(None), SubjectModel.enrolled_count < SubjectModel.capacity)
+        ).values(enrolled_count=SubjectModel.enrolled_count + 1),
+        execution_options={"synchronize_session": False}
+    )
+    return result.rowcount == 1
+
+
+def enrol(student_id, subject_id):
+    # None when the subject is full
+    if not claim_seat(subject_id):
+        return None
+
+    enrolment = SubjectStudent(student_id=student_id, subject_id=subject_id)
+    db.session.add(enrolment)
+    return enrolment
+
+
+def release_seats(subject_ids):
+    # Gives back one seat in each subject and fills it from the waitlist, returns the promoted student ids
+    if not subject_ids:
+        return []
+
+    db.session.execute(
+        update(SubjectModel).where(
+            SubjectModel.id.in_(subject_ids), SubjectModel.enrolled_count > 0
+        ).values(enrolled_count=SubjectModel.enrolled_count - 1),
+        execution_options={"synchronize_session": False}
+    )
+
+    promoted = []
+    for subject_id in subject_ids:
+        promoted += promote_waitlist(subject_id)
+    return promoted
+
+
+def unenrol(enrolment):
+    db.session.delete(enrolment)
+    return release_seats([enrolment.subject_id])
+
+
+def find_waitlist_entry(student_id, subject_id):
+    return WaitlistModel.query.filter(
+        WaitlistModel.student_id == student_id,
+        WaitlistModel.in_term(),
+        WaitlistModel.subject_id == subject_id
+    ).first()
+
+
+def join_waitlist(student_id, subject_id):
+    entry = WaitlistModel(
+        student_id=student_id, subject_id=subject_id, created_at=datetime.now(timezone.utc).replace(tzinfo=None)
+    )
+    db.session.add(entry)
+    return entry
+
+
+def leave_waitlist(student_id, subject_id):
+    # False when not waiting, including when a release just promoted them
+    result = db.session.execute(delete(WaitlistModel).where(
+        WaitlistModel.student_id == student_id,
+        WaitlistModel.in_term(),
+        WaitlistModel.subject_id == subject_id
+    ))
+    return result.rowcount == 1
+
+
+def waitlist_position(entry):
+    return WaitlistModel.query.filter(
+        WaitlistModel.subject_id == entry.subject_id,
+        WaitlistModel.term == entry.term,
+        WaitlistModel.id <= entry.id
+    ).count()
+
+
+def subject_waitlist(subject_id):
+    entries = WaitlistModel.query.options(
+        joinedload(WaitlistModel.student), joinedload(WaitlistModel.subject)
+    ).filter(
+        WaitlistModel.subject_id == subject_id,
+        WaitlistModel.in_term()
+    ).order_by(WaitlistModel.id).all()
+
+    for position, entry in enumerate(entries, 1):
+        entry.position = position
+    return entries
+
+
+def promote_waitlist(subject_id):
+    # Moves students from the head of the queue into free seats, returns their ids
+    promoted = []
+    while True:
+        # SKIP LOCKED lets two releases on PostgreSQL promote different students, SQLite ignores it
+        entry = WaitlistModel.query.filter(
+            WaitlistModel.subject_id == subject_id,
+            WaitlistModel.in_term()
+        ).order_by(WaitlistModel.id).with_for_update(skip_locked=True).first()
+
+        if entry is None or not claim_seat(subject_id):
+            return promoted
+
+        db.session.delete(entry)
+        db.session.add(SubjectStudent(student_id=entry.student_id, subject_id=subject_id))
+        promoted.append(entry.student_id)
+
+
+def recount_seats(subject_ids=None):
+    # Repairs enrolled_count after enrolments written around enrolments.py (raw inserts, imports,
+    # set-based deletes), for every subject or only the given ones
+    enrolled = select(func.count(SubjectStudent.id)).where(
+        SubjectStudent.subject_id == SubjectModel.id,
+        SubjectStudent.in_term()
+    ).scalar_subquery()
+
+    query = update(SubjectModel).where(SubjectModel.enrolled_count != enrolled)
+    if subject_ids is not None:
+        query = query.where(SubjectModel.id.in_(subject_ids))
+
+    result = db.session.execute(
+        query.values(enrolled_count=enrolled),
+        execution_options={"synchronize_session": False}
+    )
+    return result.rowcount
+
+
+def clear_closed_waitlists():
+    # Nobody is promoted out of a closed term's queue, returns the number of entries dropped
+    result = db.session.execute(delete(WaitlistModel).where(WaitlistModel.term != current_term_param()))
+    return result.rowcount
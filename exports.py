@@ -0,0 +1,321 @@
+import csv
+import importlib.util
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import func, select, update
+
+from db import db
+from models import ExportJobModel, StudentModel, SubjectModel, SubjectStudent
+
+'''
+Grade sheet exports.
+
+A job row is created by the request and the work happens on a small thread
+pool inside the app process. The join of the current term's subject_student
+rows, students and subjects is read with yield_per, so only one chunk of rows is in memory at a
+time, and every chunk is appended to the output file before the next one is
+fetched. The file is written under a ".part" name and renamed once complete,
+so a download never sees a half written export.
+
+Jobs live in the process that runs them, which moves their heartbeat_at
+forward when they are queued, when they start and as chunks are written.
+One whose heartbeat is older than EXPORT_TIMEOUT seconds lost its process
+to a crash or a restart and is marked failed, so clients polling it get an
+answer, and its ".part" file is removed; jobs the cleaning process is still
+running or holding in its queue are never touched, and a job marked failed
+is not started or completed afterwards. Finished exports are deleted, file and job,
+EXPORT_RETENTION seconds after they finished. Both happen at most every
+EXPORT_CLEANUP_INTERVAL seconds, on the first export request of a process
+and then along the export routes, or with `flask exports cleanup`.
+'''
+
+COLUMNS = [
+    ("subject_id", SubjectModel.id),
+    ("subject", SubjectModel.name),
+    ("units", SubjectModel.units),
+    ("student_id", StudentModel.id),
+    ("student", StudentModel.name),
+    ("email", StudentModel.email),
+    ("course", StudentModel.course),
+    ("prelims_grade", SubjectStudent.prelims_grade),
+    ("midterms_grade", SubjectStudent.midterms_grade),
+    ("finals_grade", SubjectStudent.finals_grade),
+    ("average_grade", SubjectStudent.average_grade),
+]
+HEADER = [name for name, _ in COLUMNS]
+
+
+def grade_rows(subject_id=None, course=None, chunk_size=1000):
+    query = select(*[column for _, column in COLUMNS]).select_from(SubjectStudent).join(
+        SubjectModel, SubjectModel.id == SubjectStudent.subject_id
+    ).join(
+        StudentModel, StudentModel.id == SubjectStudent.student_id
+    ).where(
+        SubjectStudent.in_term()
+    ).order_by(SubjectStudent.subject_id, SubjectStudent.student_id)
+
+    if subject_id is not None:
+        query = query.where(SubjectStudent.subject_id == subject_id)
+    if course is not None:
+        query = query.where(StudentModel.course == course)
+
+    # Server side cursor, rows arrive chunk_size at a time
+    result = db.session.execute(query.execution_options(yield_per=chunk_size))
+    for chunk in result.partitions():
+        yield chunk
+
+
+class CsvExport:
+    extension = "csv"
+    mimetype = "text/csv"
+    requires = None
+
+    def __init__(self, path):
+        self.file = open(path, "w", newline="", encoding="utf-8")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(HEADER)
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+
+    def close(self):
+        self.file.close()
+
+
+class XlsxExport:
+    '''Needs the optional "openpyxl" package, written in its streaming write-only mode.'''
+
+    extension = "xlsx"
+    mimetype = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    requires = "openpyxl"
+
+    def __init__(self, path):
+        from openpyxl import Workbook
+
+        self.path = path
+        self.workbook = Workbook(write_only=True)
+        self.sheet = self.workbook.create_sheet("Grades")
+        self.sheet.append(HEADER)
+
+    def write(self, rows):
+        for row in rows:
+            self.sheet.append(list(row))
+
+    def close(self):
+        self.workbook.save(self.path)
+
+
+class ParquetExport:
+    '''Needs the optional "pyarrow" package, every chunk becomes one row group.'''
+
+    extension = "parquet"
+    mimetype = "application/vnd.apache.parquet"
+    requires = "pyarrow"
+
+    def __init__(self, path):
+        import pyarrow
+        import pyarrow.parquet
+
+        self.pyarrow = pyarrow
+        self.schema = pyarrow.schema([
+            ("subject_id", pyarrow.int64()),
+            ("subject", pyarrow.string()),
+            ("units", pyarrow.float64()),
+            ("student_id", pyarrow.int64()),
+            ("student", pyarrow.string()),
+            ("email", pyarrow.string()),
+            ("course", pyarrow.string()),
+            ("prelims_grade", pyarrow.float64()),
+            ("midterms_grade", pyarrow.float64()),
+            ("finals_grade", pyarrow.float64()),
+            ("average_grade", pyarrow.float64()),
+        ])
+        self.writer = pyarrow.parquet.ParquetWriter(path, self.schema)
+
+    def write(self, rows):
+        columns = zip(*rows)
+        self.writer.write_table(self.pyarrow.Table.from_arrays(
+            [self.pyarrow.array(values, type=field.type) for values, field in zip(columns, self.schema)],
+            schema=self.schema
+        ))
+
+    def close(self):
+        self.writer.close()
+
+
+EXPORT_FORMATS = {
+    "csv": CsvExport,
+    "xlsx": XlsxExport,
+    "parquet": ParquetExport,
+}
+
+
+def missing_dependency(format):
+    requires = EXPORT_FORMATS[format].requires
+    if requires is not None and importlib.util.find_spec(requires) is None:
+        return requires
+    return None
+
+
+def utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class ExportRunner:
+    def __init__(self):
+        self.app = None
+        self.directory = None
+        self.workers = 2
+        self.chunk_size = 1000
+        self.timeout = 3600
+        self.retention = 7 * 24 * 3600
+        self.cleanup_interval = 300
+        self.heartbeat_interval = 30
+        self._next_cleanup = 0
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._in_flight = set()     # ids queued in or running on this process's pool
+
+    def init_app(self, app):
+        self.app = app
+        self.directory = app.config.setdefault("EXPORT_DIR", os.path.join(app.instance_path, "exports"))
+        self.workers = app.config.setdefault("EXPORT_WORKERS", 2)
+        self.chunk_size = app.config.setdefault("EXPORT_CHUNK_SIZE", 1000)
+        self.timeout = app.config.setdefault("EXPORT_TIMEOUT", 3600)
+        self.retention = app.config.setdefault("EXPORT_RETENTION", 7 * 24 * 3600)
+        self.cleanup_interval = app.config.setdefault("EXPORT_CLEANUP_INTERVAL", 300)
+        self.heartbeat_interval = app.config.setdefault("EXPORT_HEARTBEAT_INTERVAL", 30)
+        app.extensions["export_runner"] = self
+
+    @property
+    def pool(self):
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="export")
+        return self._pool
+
+    def create(self, format, subject_id=None, course=None, requested_by=None):
+        self.cleanup_if_due()
+        now = utcnow()
+        job = ExportJobModel(
+            format=format, subject_id=subject_id, course=course, requested_by=requested_by,
+            status="queued", rows=0, created_at=now, heartbeat_at=now
+        )
+        db.session.add(job)
+        db.session.commit()
+
+        with self._pool_lock:
+            self._in_flight.add(job.id)
+        self.pool.submit(self.run, job.id)
+        return job
+
+    def cleanup_if_due(self):
+        now = time.time()
+        if now >= self._next_cleanup:
+            self._next_cleanup = now + self.cleanup_interval
+            self.cleanup()
+
+    def cleanup(self):
+        # Returns the number of jobs marked failed and of finished jobs deleted
+        now = utcnow()
+        with self._pool_lock:
+            in_flight = set(self._in_flight)
+        stale = ExportJobModel.query.filter(
+            ExportJobModel.status.in_(("queued", "running")),
+            ExportJobModel.id.notin_(in_flight),
+            func.coalesce(ExportJobModel.heartbeat_at, ExportJobModel.created_at) < now - timedelta(seconds=self.timeout)
+        ).all()
+        for job in stale:
+            job.status, job.error, job.finished_at = "failed", "The export was interrupted, request it again.", now
+
+        expired = ExportJobModel.query.filter(
+            ExportJobModel.status.in_(("done", "failed")),
+            ExportJobModel.finished_at < now - timedelta(seconds=self.retention)
+        ).all()
+        for job in expired:
+            if job.path is not None and os.path.exists(job.path):
+                os.remove(job.path)
+            db.session.delete(job)
+        db.session.commit()
+
+        # Written to on every chunk, one untouched for EXPORT_TIMEOUT belongs to a job that will not finish
+        if os.path.isdir(self.directory):
+            cutoff = time.time() - self.timeout
+            running = {f"grades-{job_id}" for job_id in in_flight}
+            for name in os.listdir(self.directory):
+                path = os.path.join(self.directory, name)
+                if name.endswith(".part") and name.split(".", 1)[0] not in running and os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+
+        return len(stale), len(expired)
+
+    def run(self, job_id):
+        try:
+            with self.app.app_context():
+                self.export(job_id)
+        finally:
+            with self._pool_lock:
+                self._in_flight.discard(job_id)
+
+    def export(self, job_id):
+        # Only a queued job starts, one marked failed by another process's cleanup stays failed
+        if not self.set_status(job_id, ("queued",), status="running", heartbeat_at=utcnow()):
+            return
+        job = db.session.get(ExportJobModel, job_id)
+
+        exporter = EXPORT_FORMATS[job.format]
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"grades-{job.id}.{exporter.extension}")
+        partial = path + ".part"
+
+        rows = 0
+        next_heartbeat = time.monotonic() + self.heartbeat_interval
+        try:
+            writer = exporter(partial)
+            try:
+                for chunk in grade_rows(job.subject_id, job.course, self.chunk_size):
+                    writer.write(chunk)
+                    rows += len(chunk)
+                    if time.monotonic() >= next_heartbeat:
+                        self.heartbeat(job_id)
+                        next_heartbeat = time.monotonic() + self.heartbeat_interval
+            finally:
+                writer.close()
+            os.replace(partial, path)
+        except Exception as err:
+            self.app.logger.exception("Export %s failed", job_id)
+            db.session.rollback()
+            if os.path.exists(partial):
+                os.remove(partial)
+            self.set_status(job_id, ("running",), status="failed", error=str(err), finished_at=utcnow())
+            return
+
+        db.session.rollback()
+        if not self.set_status(job_id, ("running",), status="done", rows=rows, path=path, finished_at=utcnow()):
+            # Failed by a cleanup meanwhile, clients were already told to request it again
+            os.remove(path)
+
+    def heartbeat(self, job_id):
+        # Own connection and transaction, the session's is busy streaming the rows
+        with db.engine.begin() as connection:
+            connection.execute(
+                update(ExportJobModel).where(ExportJobModel.id == job_id).values(heartbeat_at=utcnow())
+            )
+
+    def set_status(self, job_id, expected, **values):
+        # Compare-and-set, False when the job is no longer in one of the expected states
+        result = db.session.execute(
+            update(ExportJobModel).where(
+                ExportJobModel.id == job_id, ExportJobModel.status.in_(expected)
+            ).values(**values)
+        )
+        db.session.commit()
+        return result.rowcount == 1
+
+
+export_runner = ExportRunner()
@@ -0,0 +1,189 @@
+import atexit
+import json
+import threading
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import and_, insert, or_
+
+from db import db
+from models import GradeHistoryModel
+
+'''
+Append-only history of grade changes.
+
+Every grade write records one row per grade it actually changed: the old and
+new value, who made the change, when and through which endpoint. The rows are
+not part of the grade's own transaction. Routes hand them to grade_history
+after their commit and a background thread inserts whatever has queued up as
+one executemany per batch, so a burst of grade entries at a deadline pays for
+one extra INSERT per batch instead of one per request.
+
+The queue is written out when the process exits normally (atexit), which
+includes a gunicorn worker being stopped or recycled. Entries still queued
+when a process is killed outright are lost, as are changes whose history
+could not be written after the database stayed unavailable through shutdown;
+those are logged in full instead. With GRADE_HISTORY_ASYNC off every entry
+is written inline.
+'''
+
+
+def utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def grade_changes(enrolment, values, changed_by, source, changed_at=None):
+    # History rows for the grades in `values` that differ from the enrolment's current ones.
+    # `enrolment` is a SubjectStudent or any row with the same attributes.
+    changed_at = changed_at or utcnow()
+    return [
+        {
+            "subject_student_id": enrolment.id, "student_id": enrolment.student_id, "subject_id": enrolment.subject_id,
+            "field": field, "old_value": getattr(enrolment, field), "new_value": value,
+            "changed_by": changed_by, "source": source, "changed_at": changed_at,
+        }
+        for field, value in values.items() if getattr(enrolment, field) != value
+    ]
+
+
+def write_history(entries):
+    if entries:
+        db.session.execute(insert(GradeHistoryModel), entries)
+
+
+def history_page(subject_student_id, after=None, limit=100, model=GradeHistoryModel):
+    # Keyset on (changed_at, id), read in order from the (subject_student_id, changed_at) index.
+    # The cursor is the id of the last row of the previous page. `model` is ArchivedGradeHistoryModel for archived terms.
+    query = model.query.filter(model.subject_student_id == subject_student_id)
+
+    if after is not None:
+        cursor = db.session.get(model, after)
+        if cursor is None or cursor.subject_student_id != subject_student_id:
+            return []
+        query = query.filter(or_(
+            model.changed_at > cursor.changed_at,
+            and_(model.changed_at == cursor.changed_at, model.id > cursor.id)
+        ))
+
+    return query.order_by(model.changed_at, model.id).limit(limit).all()
+
+
+class GradeHistoryWriter:
+    '''
+    Writes queued history rows on a background thread.
+
+    The thread wakes when GRADE_HISTORY_BATCH_SIZE rows are waiting or
+    GRADE_HISTORY_FLUSH_INTERVAL seconds after it last went to sleep,
+    whichever comes first. A batch that fails to insert goes back to the
+    front of the queue and is retried after the interval.
+    '''
+
+    def __init__(self):
+        self.app = None
+        self.run_async = True
+        self.batch_size = 500
+        self.interval = 1.0
+        self._pending = []
+        self._busy = False
+        self._flushing = False
+        self._stopping = False
+        self._condition = threading.Condition()
+        self._thread = None
+        self._registered = False
+
+    def init_app(self, app):
+        self.app = app
+        self.run_async = app.config.setdefault("GRADE_HISTORY_ASYNC", True)
+        self.batch_size = app.config.setdefault("GRADE_HISTORY_BATCH_SIZE", 500)
+        self.interval = app.config.setdefault("GRADE_HISTORY_FLUSH_INTERVAL", 1.0)
+        app.extensions["grade_history"] = self
+
+        if not self._registered:
+            atexit.register(self.close)
+            self._registered = True
+
+    def record(self, entries):
+        # Called after the grades were committed
+        if not entries:
+            return
+
+        with self._condition:
+            inline = not self.run_async or self._stopping
+            if not inline:
+                self._pending.extend(entries)
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name="grade-history-writer", daemon=True)
+                    self._thread.start()
+                if len(self._pending) >= self.batch_size:
+                    self._condition.notify_all()
+
+        if inline:
+            write_history(entries)
+            db.session.commit()
+
+    def flush(self, timeout=None):
+        # Writes everything queued so far and blocks until it is in, for tests and the CLI
+        with self._condition:
+            self._flushing = True
+            self._condition.notify_all()
+            try:
+                return self._condition.wait_for(lambda: not self._pending and not self._busy, timeout)
+            finally:
+                self._flushing = False
+
+    def close(self, timeout=10):
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+            thread = self._thread
+
+        if thread is not None:
+            thread.join(timeout)
+
+        with self._condition:
+            lost, self._pending = self._pending, []
+        if lost:
+            self.app.logger.error(
+                "%d grade history entries could not be written: %s", len(lost), json.dumps(lost, default=str)
+            )
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(
+                    lambda: len(self._pending) >= self.batch_size or self._flushing or self._stopping, self.interval
+                )
+                if not self._pending:
+                    if self._stopping:
+                        return
+                    continue
+                batch, self._pending = self._pending, []
+                self._busy = True
+
+            written = self._write(batch)
+
+            with self._condition:
+                self._busy = False
+                self._condition.notify_all()
+                if not written and self._stopping:
+                    # Left in the queue for close() to log
+                    return
+
+            if not written:
+                time.sleep(self.interval)
+
+    def _write(self, batch):
+        try:
+            with self.app.app_context():
+                for start in range(0, len(batch), self.batch_size):
+                    write_history(batch[start:start + self.batch_size])
+                db.session.commit()
+            return True
+        except Exception:
+            self.app.logger.exception("Grade history write failed, %d entries requeued", len(batch))
+            with self._condition:
+                self._pending[:0] = batch
+            return False
+
+
+grade_history = GradeHistoryWriter()
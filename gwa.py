@@ -0,0 +1,73 @@
+from sqlalchemy import cast, func
+
+from db import db
+from models import StudentModel, SubjectModel, SubjectStudent
+
+
+def gwa_columns():
+    # Unit-weighted mean of the subject averages, ungraded subjects carry no weight
+    units = func.sum(SubjectModel.units)
+    weighted = func.sum(SubjectStudent.average_grade * SubjectModel.units)
+    gwa = func.round(cast(weighted * 1.0 / func.nullif(units, 0), db.Numeric), 2, type_=db.Float)
+    return gwa.label("gwa"), units.label("units")
+
+
+def graded_enrolments(query):
+    return query.join(
+        SubjectModel, SubjectModel.id == SubjectStudent.subject_id
+    ).filter(
+        SubjectStudent.average_grade.is_not(None)
+    )
+
+
+def student_gwa(student_id):
+    # This term's
+    gwa, units = graded_enrolments(
+        db.session.query(*gwa_columns()).select_from(SubjectStudent)
+    ).filter(
+        SubjectStudent.student_id == student_id,
+        SubjectStudent.in_term()
+    ).one()
+
+    return {"gwa": gwa, "units": units or 0}
+
+
+def students_gwa(student_ids):
+    # Cumulative GWA over every term still in the database for many students in one GROUP BY,
+    # students without graded subjects are left out
+    gwa, units = gwa_columns()
+    rows = graded_enrolments(
+        db.session.query(SubjectStudent.student_id, gwa, units).select_from(SubjectStudent)
+    ).filter(
+        SubjectStudent.student_id.in_(student_ids)
+    ).group_by(SubjectStudent.student_id)
+
+    return {student_id: {"gwa": gwa, "units": units or 0} for student_id, gwa, units in rows}
+
+
+def enrolments_gwa(enrolments):
+    # The same over enrolments already loaded with their subject, archived ones included
+    graded = [enrolment for enrolment in enrolments if enrolment.average_grade is not None]
+    units = sum(enrolment.subject.units for enrolment in graded)
+    if not units:
+        return {"gwa": None, "units": units}
+    return {"gwa": round(sum(enrolment.average_grade * enrolment.subject.units for enrolment in graded) / units, 2), "units": units}
+
+
+def batch_gwa(course=None, min_gwa=None):
+    # Every student's GWA this term in a single GROUP BY, optionally limited to one course
+    gwa, units = gwa_columns()
+    query = graded_enrolments(
+        db.session.query(
+            StudentModel.id.label("student_id"), StudentModel.name, StudentModel.course, gwa, units
+        ).select_from(SubjectStudent).join(StudentModel, StudentModel.id == SubjectStudent.student_id)
+    ).filter(
+        SubjectStudent.in_term()
+    ).group_by(StudentModel.id, StudentModel.name, StudentModel.course)
+
+    if course is not None:
+        query = query.filter(StudentModel.course == course)
+    if min_gwa is not None:
+        query = query.having(gwa >= min_gwa)
+
+    return [row._asdict() for row in query.order_by(gwa.desc(), StudentModel.id)]
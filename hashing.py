@@ -0,0 +1,95 @@
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+from flask_smorest import abort
+
+from metrics import PASSWORD_HASH_LATENCY
+
+# passlib's own default for pbkdf2_sha256
+DEFAULT_ROUNDS = 29000
+
+
+def pbkdf2_sha256():
+    # passlib and its handlers are loaded on first use, not on every worker start
+    from passlib.hash import pbkdf2_sha256
+    return pbkdf2_sha256
+
+
+def hash_password(password, rounds):
+    return pbkdf2_sha256().using(rounds=rounds).hash(password)
+
+
+def verify_password(password, password_hash):
+    return pbkdf2_sha256().verify(password, password_hash)
+
+
+class PasswordHasher:
+    '''
+    Runs the key derivation on a bounded pool of worker processes.
+
+    Request threads only wait on the result, so a login storm can use at most
+    PASSWORD_HASH_WORKERS cores. Once PASSWORD_HASH_QUEUE requests are already
+    waiting, new ones are turned away with a 503 instead of piling up behind
+    them and starving every other route.
+    '''
+
+    def __init__(self):
+        self.rounds = DEFAULT_ROUNDS
+        self.workers = os.cpu_count() or 1
+        self.retry_after = 1
+        self._slots = threading.BoundedSemaphore(self.workers * 4)
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def init_app(self, app):
+        self.rounds = app.config.setdefault("PASSWORD_HASH_ROUNDS", DEFAULT_ROUNDS)
+        self.workers = app.config.setdefault("PASSWORD_HASH_WORKERS", os.cpu_count() or 1)
+        self.retry_after = app.config.setdefault("PASSWORD_HASH_RETRY_AFTER", 1)
+        self._slots = threading.BoundedSemaphore(app.config.setdefault("PASSWORD_HASH_QUEUE", self.workers * 4))
+        app.extensions["password_hasher"] = self
+
+    @property
+    def pool(self):
+        # Created on first use so pre-forking servers start the pool inside each worker
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool
+
+    def hash(self, password):
+        return self._run("hash", hash_password, password, self.rounds)
+
+    def verify(self, password, password_hash):
+        return self._run("verify", verify_password, password, password_hash)
+
+    def hash_many(self, passwords):
+        # Batch jobs (imports) share the pool but not the request queue limit
+        passwords = list(passwords)
+        chunksize = max(1, len(passwords) // (self.workers * 4))
+        with PASSWORD_HASH_LATENCY.labels("hash_many").time():
+            return list(self.pool.map(hash_password, passwords, repeat(self.rounds), chunksize=chunksize))
+
+    def needs_rehash(self, password_hash):
+        return pbkdf2_sha256().using(rounds=self.rounds).needs_update(password_hash)
+
+    def _run(self, operation, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            abort(
+                503,
+                message="The server is busy, please try again shortly.",
+                headers={"Retry-After": str(self.retry_after)}
+            )
+
+        started = time.perf_counter()
+        try:
+            return self.pool.submit(fn, *args).result()
+        finally:
+            self._slots.release()
+            PASSWORD_HASH_LATENCY.labels(operation).observe(time.perf_counter() - started)
+
+
+password_hasher = PasswordHasher()
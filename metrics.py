@@ -0,0 +1,118 @@
+'''
+Prometheus metrics, exposed on /metrics.
+
+Under a multi-process server set PROMETHEUS_MULTIPROC_DIR to an empty,
+writable directory before starting it. Every worker then writes its samples
+there and /metrics aggregates all of them, whichever worker answers. With
+gunicorn, also call metrics.mark_process_dead(worker.pid) from the child_exit
+hook so gauges of dead workers are dropped.
+'''
+import os
+import time
+
+from flask import Response, g, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, generate_latest, multiprocess
+)
+from sqlalchemy import event
+
+from db import db
+
+REQUESTS = Counter(
+    "http_requests_total", "Requests handled, per route and status.", ["method", "endpoint", "status"]
+)
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Time spent handling a request, per route.", ["method", "endpoint"]
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight", "Requests currently being handled.", multiprocess_mode="livesum"
+)
+
+DB_POOL_OPEN = Gauge(
+    "db_pool_open_connections", "Database connections currently open.", multiprocess_mode="livesum"
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out_connections", "Database connections currently in use.", multiprocess_mode="livesum"
+)
+
+PASSWORD_HASH_LATENCY = Histogram(
+    "password_hash_duration_seconds", "Time a request waits for a password hash or check, queueing included.",
+    ["operation"], buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
+CACHE_LOOKUPS = Counter(
+    "response_cache_lookups_total", "Response cache lookups, per result.", ["result"]
+)
+
+
+def mark_process_dead(pid):
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(pid)
+
+
+def watch_pool(engine):
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        DB_POOL_OPEN.inc()
+
+    @event.listens_for(engine, "close")
+    def on_close(dbapi_connection, connection_record):
+        DB_POOL_OPEN.dec()
+
+    @event.listens_for(engine, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        DB_POOL_CHECKED_OUT.inc()
+
+    @event.listens_for(engine, "checkin")
+    def on_checkin(dbapi_connection, connection_record):
+        DB_POOL_CHECKED_OUT.dec()
+
+
+class Metrics:
+    def init_app(self, app):
+        if not app.config.setdefault("METRICS_ENABLED", True):
+            return
+
+        with app.app_context():
+            for engine in db.engines.values():
+                watch_pool(engine)
+
+        app.before_request(self.start)
+        app.after_request(self.record)
+        app.teardown_request(self.finish)
+        app.add_url_rule("/metrics", "metrics", self.export)
+        app.extensions["metrics"] = self
+
+    def start(self):
+        g.metrics_start = time.perf_counter()
+        REQUESTS_IN_FLIGHT.inc()
+
+    def observe(self, status):
+        endpoint = request.endpoint or "unmatched"
+        REQUESTS.labels(request.method, endpoint, status).inc()
+        REQUEST_LATENCY.labels(request.method, endpoint).observe(time.perf_counter() - g.metrics_start)
+
+    def record(self, response):
+        if "metrics_start" in g:
+            self.observe(response.status_code)
+            g.metrics_recorded = True
+        return response
+
+    def finish(self, exc):
+        if "metrics_start" not in g:
+            return
+
+        # Unhandled errors skip after_request
+        if not g.get("metrics_recorded"):
+            self.observe(500)
+        REQUESTS_IN_FLIGHT.dec()
+
+    def export(self):
+        if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        else:
+            registry = REGISTRY
+        return Response(generate_latest(registry), headers={"Content-Type": CONTENT_TYPE_LATEST})
+
+
+metrics = Metrics()
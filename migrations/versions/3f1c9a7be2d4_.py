@@ -0,0 +1,28 @@
+"""add expires_at to blocklist_model
+
+Revision ID: 3f1c9a7be2d4
+Revises: ccdb16e0b87c
+Create Date: 2026-10-18 09:12:40.118220
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c9a7be2d4'
+down_revision = 'ccdb16e0b87c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('blocklist_model', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('expires_at', sa.Integer(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_blocklist_model_expires_at'), ['expires_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('blocklist_model', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_blocklist_model_expires_at'))
+        batch_op.drop_column('expires_at')
@@ -0,0 +1,31 @@
+"""transcripts read model
+
+Revision ID: 5d7e1b9f24a6
+Revises: c52b7e90d3a1
+Create Date: 2026-10-18 13:02:17.482913
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d7e1b9f24a6'
+down_revision = 'c52b7e90d3a1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Filled lazily on first read, or all at once with `flask transcripts rebuild`
+    op.create_table('transcripts',
+    sa.Column('student_id', sa.Integer(), nullable=False),
+    sa.Column('document', sa.Text(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['student_id'], ['students.id'], ),
+    sa.PrimaryKeyConstraint('student_id')
+    )
+
+
+def downgrade():
+    op.drop_table('transcripts')
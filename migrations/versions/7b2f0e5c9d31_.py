@@ -0,0 +1,84 @@
+"""search indexes on students and subjects
+
+Revision ID: 7b2f0e5c9d31
+Revises: e19a4c3b7f08
+Create Date: 2026-10-18 14:20:06.551872
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7b2f0e5c9d31'
+down_revision = 'e19a4c3b7f08'
+branch_labels = None
+depends_on = None
+
+SEARCH_INDEXES = {
+    "students_fts": ("students", ["name", "email", "course"]),
+    "subjects_fts": ("subjects", ["name", "description"]),
+}
+
+
+def sqlite_fts(fts_table, base_table, columns):
+    # External content FTS5 tables kept in sync by triggers, see search.py.
+    # Batch migrations that recreate students or subjects drop these triggers and must recreate them.
+    names = ", ".join(columns)
+    new = ", ".join(f"new.{name}" for name in columns)
+    old = ", ".join(f"old.{name}" for name in columns)
+
+    op.execute(f"CREATE VIRTUAL TABLE {fts_table} USING fts5({names}, content='{base_table}', content_rowid='id', tokenize='trigram')")
+    op.execute(
+        f"CREATE TRIGGER {fts_table}_ai AFTER INSERT ON {base_table} BEGIN "
+        f"INSERT INTO {fts_table}(rowid, {names}) VALUES (new.id, {new}); END"
+    )
+    op.execute(
+        f"CREATE TRIGGER {fts_table}_ad AFTER DELETE ON {base_table} BEGIN "
+        f"INSERT INTO {fts_table}({fts_table}, rowid, {names}) VALUES ('delete', old.id, {old}); END"
+    )
+    op.execute(
+        f"CREATE TRIGGER {fts_table}_au AFTER UPDATE OF {names} ON {base_table} BEGIN "
+        f"INSERT INTO {fts_table}({fts_table}, rowid, {names}) VALUES ('delete', old.id, {old}); "
+        f"INSERT INTO {fts_table}(rowid, {names}) VALUES (new.id, {new}); END"
+    )
+    op.execute(f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')")
+
+
+def upgrade():
+    with op.batch_alter_table('students', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_students_course'), ['course'], unique=False)
+        batch_op.create_index('ix_students_name_lower', [sa.text('lower(name)')], unique=False)
+
+    with op.batch_alter_table('subjects', schema=None) as batch_op:
+        batch_op.create_index('ix_subjects_name_lower', [sa.text('lower(name)')], unique=False)
+
+    dialect = op.get_bind().dialect.name
+    if dialect == "sqlite":
+        for fts_table, (base_table, columns) in SEARCH_INDEXES.items():
+            sqlite_fts(fts_table, base_table, columns)
+    elif dialect == "postgresql":
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        for base_table, columns in SEARCH_INDEXES.values():
+            for name in columns:
+                op.execute(f"CREATE INDEX ix_{base_table}_{name}_trgm ON {base_table} USING gin ({name} gin_trgm_ops)")
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == "sqlite":
+        for fts_table, (base_table, columns) in SEARCH_INDEXES.items():
+            for suffix in ("ai", "ad", "au"):
+                op.execute(f"DROP TRIGGER IF EXISTS {fts_table}_{suffix}")
+            op.execute(f"DROP TABLE IF EXISTS {fts_table}")
+    elif dialect == "postgresql":
+        for base_table, columns in SEARCH_INDEXES.values():
+            for name in columns:
+                op.execute(f"DROP INDEX IF EXISTS ix_{base_table}_{name}_trgm")
+
+    with op.batch_alter_table('subjects', schema=None) as batch_op:
+        batch_op.drop_index('ix_subjects_name_lower')
+
+    with op.batch_alter_table('students', schema=None) as batch_op:
+        batch_op.drop_index('ix_students_name_lower')
+        batch_op.drop_index(batch_op.f('ix_students_course'))
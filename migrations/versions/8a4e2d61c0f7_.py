@@ -0,0 +1,50 @@
+"""store average_grade on subject_student
+
+Revision ID: 8a4e2d61c0f7
+Revises: 3f1c9a7be2d4
+Create Date: 2026-10-18 10:02:11.532904
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8a4e2d61c0f7'
+down_revision = '3f1c9a7be2d4'
+branch_labels = None
+depends_on = None
+
+
+subject_student = sa.table('subject_student',
+    sa.column('prelims_grade', sa.Float()),
+    sa.column('midterms_grade', sa.Float()),
+    sa.column('finals_grade', sa.Float()),
+    sa.column('average_grade', sa.Float()),
+)
+
+
+def upgrade():
+    with op.batch_alter_table('subject_student', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('average_grade', sa.Float(), nullable=True))
+
+    # Backfill with the same rule as SubjectStudent.compute_average_grade
+    grades = [subject_student.c.prelims_grade, subject_student.c.midterms_grade, subject_student.c.finals_grade]
+    total = sum(sa.func.coalesce(grade, 0) for grade in grades)
+    count = sum(sa.case((grade.is_(None), 0), else_=1) for grade in grades)
+    op.execute(
+        subject_student.update().values(
+            average_grade=sa.func.round(sa.cast(total / sa.func.nullif(count, 0), sa.Numeric), 2)
+        )
+    )
+
+    with op.batch_alter_table('subject_student', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_subject_student_average_grade'), ['average_grade'], unique=False)
+        batch_op.create_index('ix_subject_student_subject_id_average_grade', ['subject_id', 'average_grade'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('subject_student', schema=None) as batch_op:
+        batch_op.drop_index('ix_subject_student_subject_id_average_grade')
+        batch_op.drop_index(batch_op.f('ix_subject_student_average_grade'))
+        batch_op.drop_column('average_grade')
@@ -0,0 +1,53 @@
+"""subject capacity and waitlist
+
+Revision ID: a4c81f6e2b93
+Revises: 7b2f0e5c9d31
+Create Date: 2026-10-18 15:02:37.118245
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4c81f6e2b93'
+down_revision = '7b2f0e5c9d31'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Plain ALTER TABLE rather than a batch: recreating subjects on SQLite would drop its search triggers
+    op.add_column('subjects', sa.Column('capacity', sa.Integer(), nullable=True))
+    op.add_column('subjects', sa.Column('enrolled_count', sa.Integer(), server_default='0', nullable=False))
+
+    # Seats already taken
+    op.execute(
+        "UPDATE subjects SET enrolled_count = "
+        "(SELECT count(*) FROM subject_student WHERE subject_student.subject_id = subjects.id)"
+    )
+
+    op.create_table('waitlist',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('student_id', sa.Integer(), nullable=False),
+    sa.Column('subject_id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['student_id'], ['students.id'], ),
+    sa.ForeignKeyConstraint(['subject_id'], ['subjects.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('waitlist', schema=None) as batch_op:
+        batch_op.create_index('ix_waitlist_subject_id_id', ['subject_id', 'id'], unique=False)
+        batch_op.create_index('uq_waitlist_student_id_subject_id', ['student_id', 'subject_id'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('waitlist', schema=None) as batch_op:
+        batch_op.drop_index('uq_waitlist_student_id_subject_id')
+        batch_op.drop_index('ix_waitlist_subject_id_id')
+
+    op.drop_table('waitlist')
+
+    # Native DROP COLUMN (SQLite 3.35+), same reason as above
+    op.drop_column('subjects', 'enrolled_count')
+    op.drop_column('subjects', 'capacity')
@@ -0,0 +1,37 @@
+"""academic terms on waitlist entries
+
+Revision ID: a81d5e3f6c27
+Revises: f2a7c4d81e36
+Create Date: 2026-10-18 20:03:17.442190
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a81d5e3f6c27'
+down_revision = 'f2a7c4d81e36'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Queued students wait for the default term, like the enrolments migrated before them
+    op.add_column('waitlist', sa.Column('term', sa.String(length=20), server_default='default', nullable=False))
+
+    op.drop_index('uq_waitlist_student_id_subject_id', table_name='waitlist')
+    op.drop_index('ix_waitlist_subject_id_id', table_name='waitlist')
+    op.create_index('uq_waitlist_student_id_term_subject_id', 'waitlist', ['student_id', 'term', 'subject_id'], unique=True)
+    op.create_index('ix_waitlist_subject_id_term_id', 'waitlist', ['subject_id', 'term', 'id'], unique=False)
+
+
+def downgrade():
+    # Fails while a student waits for the same subject in two terms
+    op.drop_index('ix_waitlist_subject_id_term_id', table_name='waitlist')
+    op.drop_index('uq_waitlist_student_id_term_subject_id', table_name='waitlist')
+    op.create_index('ix_waitlist_subject_id_id', 'waitlist', ['subject_id', 'id'], unique=False)
+    op.create_index('uq_waitlist_student_id_subject_id', 'waitlist', ['student_id', 'subject_id'], unique=True)
+
+    with op.batch_alter_table('waitlist', schema=None) as batch_op:
+        batch_op.drop_column('term')
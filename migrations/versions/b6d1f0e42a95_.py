@@ -0,0 +1,26 @@
+"""heartbeat on export jobs
+
+Revision ID: b6d1f0e42a95
+Revises: a81d5e3f6c27
+Create Date: 2026-10-18 21:41:06.513207
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b6d1f0e42a95'
+down_revision = 'a81d5e3f6c27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Jobs created before it have none, their creation time stands in for it
+    op.add_column('export_jobs', sa.Column('heartbeat_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('export_jobs', schema=None) as batch_op:
+        batch_op.drop_column('heartbeat_at')
@@ -0,0 +1,56 @@
+"""cascading deletes and student batch
+
+Revision ID: b6d2f9a17c4e
+Revises: a4c81f6e2b93
+Create Date: 2026-10-18 17:26:51.402963
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b6d2f9a17c4e'
+down_revision = 'a4c81f6e2b93'
+branch_labels = None
+depends_on = None
+
+# The foreign keys SQLite created without a name get one from this convention inside the batch
+NAMING_CONVENTION = {"fk": "fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s"}
+
+FOREIGN_KEYS = {
+    'subject_student': [('student_id', 'students'), ('subject_id', 'subjects')],
+    'transcripts': [('student_id', 'students')],
+    'waitlist': [('student_id', 'students'), ('subject_id', 'subjects')],
+}
+
+
+def foreign_key_name(table, column, referred):
+    if op.get_bind().dialect.name == "sqlite":
+        return f"fk_{table}_{column}_{referred}"
+    # PostgreSQL's own default names
+    return f"{table}_{column}_fkey"
+
+
+def replace_foreign_keys(ondelete):
+    for table, foreign_keys in FOREIGN_KEYS.items():
+        with op.batch_alter_table(table, schema=None, naming_convention=NAMING_CONVENTION) as batch_op:
+            for column, referred in foreign_keys:
+                name = foreign_key_name(table, column, referred)
+                batch_op.drop_constraint(name, type_='foreignkey')
+                batch_op.create_foreign_key(name, referred, [column], ['id'], ondelete=ondelete)
+
+
+def upgrade():
+    # Plain ALTER TABLE rather than a batch: recreating students on SQLite would drop its search triggers
+    op.add_column('students', sa.Column('batch', sa.Integer(), nullable=True))
+    op.create_index('ix_students_batch', 'students', ['batch'], unique=False)
+
+    replace_foreign_keys('CASCADE')
+
+
+def downgrade():
+    replace_foreign_keys(None)
+
+    op.drop_index('ix_students_batch', table_name='students')
+    op.drop_column('students', 'batch')
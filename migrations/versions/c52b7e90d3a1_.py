@@ -0,0 +1,37 @@
+"""unique (student_id, subject_id) index on subject_student
+
+Revision ID: c52b7e90d3a1
+Revises: 8a4e2d61c0f7
+Create Date: 2026-10-18 11:26:53.704116
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c52b7e90d3a1'
+down_revision = '8a4e2d61c0f7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Racing enrolment requests could have stored the same pair twice. Grades were entered on
+    # whichever row the lookups found, so keep a row holding grades, the newest one if several do.
+    op.execute(
+        "DELETE FROM subject_student WHERE id NOT IN ("
+        "SELECT (SELECT keep.id FROM subject_student AS keep "
+        "WHERE keep.student_id = pair.student_id AND keep.subject_id = pair.subject_id "
+        "ORDER BY (keep.prelims_grade IS NULL AND keep.midterms_grade IS NULL AND keep.finals_grade IS NULL), keep.id DESC "
+        "LIMIT 1) "
+        "FROM subject_student AS pair GROUP BY pair.student_id, pair.subject_id)"
+    )
+
+    with op.batch_alter_table('subject_student', schema=None) as batch_op:
+        batch_op.create_index('uq_subject_student_student_id_subject_id', ['student_id', 'subject_id'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('subject_student', schema=None) as batch_op:
+        batch_op.drop_index('uq_subject_student_student_id_subject_id')
@@ -0,0 +1,37 @@
+"""academic terms on enrolments
+
+Revision ID: f2a7c4d81e36
+Revises: d3e8a5c06f12
+Create Date: 2026-10-18 19:12:40.318824
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2a7c4d81e36'
+down_revision = 'd3e8a5c06f12'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing enrolments go to the default term. Plain ALTER TABLE, the indexes are separate objects anyway.
+    op.add_column('subject_student', sa.Column('term', sa.String(length=20), server_default='default', nullable=False))
+
+    op.drop_index('uq_subject_student_student_id_subject_id', table_name='subject_student')
+    op.drop_index('ix_subject_student_subject_id_average_grade', table_name='subject_student')
+    op.create_index('uq_subject_student_student_id_term_subject_id', 'subject_student', ['student_id', 'term', 'subject_id'], unique=True)
+    op.create_index('ix_subject_student_subject_id_term_average_grade', 'subject_student', ['subject_id', 'term', 'average_grade'], unique=False)
+
+
+def downgrade():
+    # Fails while a student is enrolled in the same subject in two terms still in the database
+    op.drop_index('ix_subject_student_subject_id_term_average_grade', table_name='subject_student')
+    op.drop_index('uq_subject_student_student_id_term_subject_id', table_name='subject_student')
+    op.create_index('ix_subject_student_subject_id_average_grade', 'subject_student', ['subject_id', 'average_grade'], unique=False)
+    op.create_index('uq_subject_student_student_id_subject_id', 'subject_student', ['student_id', 'subject_id'], unique=True)
+
+    with op.batch_alter_table('subject_student', schema=None) as batch_op:
+        batch_op.drop_column('term')
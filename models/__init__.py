@@ -1,4 +1,9 @@
 from models.student import StudentModel
 from models.subject import SubjectModel
 from models.subject_student import SubjectStudent
-from models.blocklist import BlocklistModel
\ No newline at end of file
+from models.blocklist import BlocklistModel
+from models.transcript import TranscriptModel
+from models.export_job import ExportJobModel
+from models.waitlist import WaitlistModel
+from models.grade_history import GradeHistoryModel
+from models.archive import ArchivedEnrolmentModel, ArchivedGradeHistoryModel
\ No newline at end of file
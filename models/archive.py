@@ -0,0 +1,57 @@
+from types import SimpleNamespace
+
+from db import db
+
+# Closed terms moved out of the main database by archive.py, in the "archive" bind (ARCHIVE_DATABASE_URL).
+# Rows keep the id they had, so a grade history row still points at its enrolment.
+
+class ArchivedEnrolmentModel(db.Model):
+    __bind_key__ = "archive"
+    __tablename__ = "enrolments"
+
+    # subject_student.id
+    id = db.Column(db.Integer, primary_key = True)
+    student_id = db.Column(db.Integer, nullable=False)
+    subject_id = db.Column(db.Integer, nullable=False)
+    term = db.Column(db.String(20), nullable=False)
+
+    # The subject as it was, transcripts are built without reaching back into the main database
+    subject_name = db.Column(db.String(80), nullable=False)
+    subject_description = db.Column(db.String, nullable=False)
+    units = db.Column(db.Integer, nullable=False)
+
+    prelims_grade = db.Column(db.Float, nullable=True)
+    midterms_grade = db.Column(db.Float, nullable=True)
+    finals_grade = db.Column(db.Float, nullable=True)
+    average_grade = db.Column(db.Float, nullable=True)
+
+    __table_args__ = (
+        # A student's transcript, and one enrolment of theirs for its history
+        db.Index("ix_enrolments_student_id_term_subject_id", "student_id", "term", "subject_id"),
+    )
+
+    @property
+    def subject(self):
+        # Shaped like a SubjectModel for GradeSchema
+        return SimpleNamespace(id=self.subject_id, name=self.subject_name, description=self.subject_description, units=self.units)
+
+
+class ArchivedGradeHistoryModel(db.Model):
+    __bind_key__ = "archive"
+    __tablename__ = "grade_history"
+
+    # grade_history.id
+    id = db.Column(db.Integer, primary_key = True)
+    subject_student_id = db.Column(db.Integer, nullable=False)
+    student_id = db.Column(db.Integer, nullable=False)
+    subject_id = db.Column(db.Integer, nullable=False)
+    field = db.Column(db.String(16), nullable=False)
+    old_value = db.Column(db.Float, nullable=True)
+    new_value = db.Column(db.Float, nullable=True)
+    changed_by = db.Column(db.Integer, nullable=True)
+    source = db.Column(db.String(16), nullable=False)
+    changed_at = db.Column(db.DateTime, nullable=False)
+
+    __table_args__ = (
+        db.Index("ix_grade_history_subject_student_id_changed_at", "subject_student_id", "changed_at"),
+    )
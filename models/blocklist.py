@@ -1,5 +1,10 @@
 from db import db
 
 class BlocklistModel(db.Model):
+    # A revoked token must not keep working for as long as a replica lags, see replicas.py
+    read_from_primary = True
+
     id = db.Column(db.Integer, primary_key=True)
-    jti = db.Column(db.String, unique=True)
\ No newline at end of file
+    jti = db.Column(db.String, unique=True)
+    # The token's own "exp" claim, once it has passed the row is no longer needed
+    expires_at = db.Column(db.Integer, nullable=True, index=True)
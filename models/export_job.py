@@ -0,0 +1,22 @@
+from db import db
+
+class ExportJobModel(db.Model):
+    __tablename__ = "export_jobs"
+
+    id = db.Column(db.Integer, primary_key = True)
+    format = db.Column(db.String(16), nullable=False)
+    # Optional filters, both empty exports every grade
+    subject_id = db.Column(db.Integer, nullable=True)
+    course = db.Column(db.String, nullable=True)
+
+    # queued -> running -> done / failed
+    status = db.Column(db.String(16), nullable=False, default="queued", index=True)
+    rows = db.Column(db.Integer, nullable=False, default=0)
+    path = db.Column(db.String, nullable=True)
+    error = db.Column(db.String, nullable=True)
+
+    requested_by = db.Column(db.Integer, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False)
+    # Moved forward while the job is queued or making progress, see exports.py
+    heartbeat_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
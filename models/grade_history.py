@@ -0,0 +1,23 @@
+from db import db
+
+class GradeHistoryModel(db.Model):
+    __tablename__ = "grade_history"
+
+    # Append-only, one row per changed grade. No foreign keys on purpose:
+    # the audit trail outlives the enrolment, student or subject it is about.
+    id = db.Column(db.Integer, primary_key = True)
+    subject_student_id = db.Column(db.Integer, nullable=False)
+    student_id = db.Column(db.Integer, nullable=False)
+    subject_id = db.Column(db.Integer, nullable=False)
+    field = db.Column(db.String(16), nullable=False)
+    old_value = db.Column(db.Float, nullable=True)
+    new_value = db.Column(db.Float, nullable=True)
+    # Identity of whoever made the change, and through which endpoint ("grades" or "bulk")
+    changed_by = db.Column(db.Integer, nullable=True)
+    source = db.Column(db.String(16), nullable=False)
+    changed_at = db.Column(db.DateTime, nullable=False)
+
+    __table_args__ = (
+        # One enrolment's history in order, served by /student/subject/<id>/grades/history
+        db.Index("ix_grade_history_subject_student_id_changed_at", "subject_student_id", "changed_at"),
+    )
@@ -1,4 +1,5 @@
 from db import db
+from models.subject_student import current_enrolments
 
 class StudentModel(db.Model):
     __tablename__ = "students"
@@ -7,8 +8,23 @@ class StudentModel(db.Model):
     name = db.Column(db.String(80), unique=False, nullable=False)
     email = db.Column(db.String(80), unique=True, nullable=False)
     password = db.Column(db.String(80), unique=True, nullable=False)
-    course = db.Column(db.String, unique=False, nullable=False)
+    course = db.Column(db.String, unique=False, nullable=False, index=True)
+    # Graduation batch (year), lets a whole batch be purged at once
+    batch = db.Column(db.Integer, nullable=True, index=True)
 
-    # Define a many-many relationship with subjects
-    subjects = db.relationship("SubjectModel", back_populates="students", secondary="subject_student", cascade='all, delete')
-    subject_students = db.relationship('SubjectStudent', back_populates='student', overlaps="subjects,students")
\ No newline at end of file
+    # Define a many-many relationship with subjects, this term's only (see terms.py).
+    # Read-only, enrolments are written through enrolments.py and removed by ON DELETE CASCADE.
+    subjects = db.relationship(
+        "SubjectModel", secondary="subject_student", viewonly=True,
+        primaryjoin=lambda: current_enrolments(StudentModel.id, "student_id"),
+        secondaryjoin="SubjectModel.id == SubjectStudent.subject_id"
+    )
+    subject_students = db.relationship(
+        'SubjectStudent', viewonly=True, primaryjoin=lambda: current_enrolments(StudentModel.id, "student_id")
+    )
+    waitlist_entries = db.relationship("WaitlistModel", back_populates="student", cascade="all, delete-orphan", passive_deletes=True)
+
+    __table_args__ = (
+        # Name prefix searches, see search.py
+        db.Index("ix_students_name_lower", db.func.lower(name)),
+    )
\ No newline at end of file
@@ -1,4 +1,5 @@
 from db import db
+from models.subject_student import current_enrolments
 
 class SubjectModel(db.Model):
     __tablename__ = "subjects"
@@ -8,9 +9,24 @@ class SubjectModel(db.Model):
     description = db.Column(db.String, unique=True, nullable=False)
     units = db.Column(db.Integer, unique=False, nullable=False)
 
-    # Define a many-many relationship with students
-    students = db.relationship("StudentModel", back_populates="subjects", secondary="subject_student", cascade='all, delete')
+    # No capacity means unlimited seats. enrolled_count is only changed by enrolments.py
+    capacity = db.Column(db.Integer, nullable=True)
+    enrolled_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
 
-    subject_students = db.relationship('SubjectStudent', back_populates='subject', overlaps="students,subjects")
+    # Define a many-many relationship with students, this term's only (see terms.py).
+    # Read-only, enrolments are deleted along with the subject by ON DELETE CASCADE.
+    students = db.relationship(
+        "StudentModel", secondary="subject_student", viewonly=True,
+        primaryjoin=lambda: current_enrolments(SubjectModel.id, "subject_id"),
+        secondaryjoin="StudentModel.id == SubjectStudent.student_id"
+    )
 
-    
\ No newline at end of file
+    subject_students = db.relationship(
+        'SubjectStudent', viewonly=True, primaryjoin=lambda: current_enrolments(SubjectModel.id, "subject_id")
+    )
+    waitlist_entries = db.relationship("WaitlistModel", back_populates="subject", cascade="all, delete-orphan", passive_deletes=True)
+
+    __table_args__ = (
+        # Name prefix searches, see search.py
+        db.Index("ix_subjects_name_lower", db.func.lower(name)),
+    )
@@ -1,22 +1,42 @@
+from sqlalchemy import case, cast, event, func
+
 from db import db
+from terms import DEFAULT_TERM, current_term, current_term_param
 
 class SubjectStudent(db.Model):
     __tablename__ = "subject_student"
 
     id = db.Column(db.Integer, primary_key = True)
-    student_id = db.Column(db.Integer, db.ForeignKey("students.id"))
-    subject_id = db.Column(db.Integer, db.ForeignKey("subjects.id"))
+    student_id = db.Column(db.Integer, db.ForeignKey("students.id", ondelete="CASCADE"))
+    subject_id = db.Column(db.Integer, db.ForeignKey("subjects.id", ondelete="CASCADE"))
+    # Academic term, see terms.py
+    term = db.Column(db.String(20), nullable=False, default=current_term, server_default=DEFAULT_TERM)
 
     prelims_grade = db.Column(db.Float, nullable=True)
     midterms_grade = db.Column(db.Float, nullable=True)
     finals_grade = db.Column(db.Float, nullable=True)
 
+    # Stored so it can be filtered and sorted on in SQL, kept in sync on every grade write
+    average_grade = db.Column(db.Float, nullable=True, index=True)
+
     # Add a new relationship to provide us with a subject and student
-    student = db.relationship('StudentModel', back_populates='subject_students', overlaps="subjects,students")
-    subject = db.relationship('SubjectModel', back_populates='subject_students', overlaps="students,subjects")
+    student = db.relationship('StudentModel')
+    subject = db.relationship('SubjectModel')
+
+    __table_args__ = (
+        # A student can only be enrolled once in a subject per term, also serves every enrolment lookup
+        # and a student's current term without reading their past ones
+        db.Index("uq_subject_student_student_id_term_subject_id", "student_id", "term", "subject_id", unique=True),
+        # Serves "top N students in subject X" this term without sorting the whole class
+        db.Index("ix_subject_student_subject_id_term_average_grade", "subject_id", "term", "average_grade"),
+    )
+
+    @classmethod
+    def in_term(cls, term=None):
+        # The current term unless told otherwise
+        return cls.term == (current_term_param() if term is None else term)
 
-    @property
-    def average_grade(self):
+    def compute_average_grade(self):
         grades = [self.prelims_grade, self.midterms_grade, self.finals_grade]
 
         valid_grades = list()
@@ -27,4 +47,44 @@ class SubjectStudent(db.Model):
 
         if len(valid_grades) > 0:
             return round(sum(valid_grades) / len(valid_grades), 2)
-        return None
\ No newline at end of file
+        return None
+
+    @classmethod
+    def average_grade_expression(cls):
+        # SQL version of compute_average_grade, used by set-based grade writes
+        grades = [cls.prelims_grade, cls.midterms_grade, cls.finals_grade]
+
+        total = sum(func.coalesce(grade, 0) for grade in grades)
+        count = sum(case((grade.is_(None), 0), else_=1) for grade in grades)
+
+        return func.round(cast(total / func.nullif(count, 0), db.Numeric), 2)
+
+    @classmethod
+    def recompute_averages(cls, *criteria):
+        return db.session.execute(
+            db.update(cls).where(*criteria).values(average_grade=cls.average_grade_expression()),
+            execution_options={"synchronize_session": False}
+        )
+
+    @classmethod
+    def top_in_subject(cls, subject_id, limit=10):
+        return cls.query.filter(
+            cls.subject_id == subject_id,
+            cls.in_term(),
+            cls.average_grade.is_not(None)
+        ).order_by(cls.average_grade.desc(), cls.id).limit(limit)
+
+    @classmethod
+    def failing(cls, passing_grade):
+        return cls.query.filter(cls.in_term(), cls.average_grade < passing_grade)
+
+
+def current_enrolments(column, key):
+    # Join condition of the student and subject relationships, which only see the current term
+    return db.and_(column == getattr(SubjectStudent, key), SubjectStudent.in_term())
+
+
+@event.listens_for(SubjectStudent, "before_insert")
+@event.listens_for(SubjectStudent, "before_update")
+def update_average_grade(mapper, connection, target):
+    target.average_grade = target.compute_average_grade()
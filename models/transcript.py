@@ -0,0 +1,9 @@
+from db import db
+
+class TranscriptModel(db.Model):
+    __tablename__ = "transcripts"
+
+    # One precomputed JSON document per student, rebuilt by transcripts.py on every grade or enrolment change
+    student_id = db.Column(db.Integer, db.ForeignKey("students.id", ondelete="CASCADE"), primary_key=True)
+    document = db.Column(db.Text, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False)
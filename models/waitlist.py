@@ -0,0 +1,27 @@
+from db import db
+from terms import DEFAULT_TERM, current_term, current_term_param
+
+class WaitlistModel(db.Model):
+    __tablename__ = "waitlist"
+
+    id = db.Column(db.Integer, primary_key = True)
+    student_id = db.Column(db.Integer, db.ForeignKey("students.id", ondelete="CASCADE"), nullable=False)
+    subject_id = db.Column(db.Integer, db.ForeignKey("subjects.id", ondelete="CASCADE"), nullable=False)
+    # The term the seat is wanted in, see terms.py
+    term = db.Column(db.String(20), nullable=False, default=current_term, server_default=DEFAULT_TERM)
+    created_at = db.Column(db.DateTime, nullable=False)
+
+    student = db.relationship("StudentModel", back_populates="waitlist_entries")
+    subject = db.relationship("SubjectModel", back_populates="waitlist_entries")
+
+    __table_args__ = (
+        # A student waits at most once per subject and term
+        db.Index("uq_waitlist_student_id_term_subject_id", "student_id", "term", "subject_id", unique=True),
+        # Head of a subject's queue this term, first come first served by id
+        db.Index("ix_waitlist_subject_id_term_id", "subject_id", "term", "id"),
+    )
+
+    @classmethod
+    def in_term(cls, term=None):
+        # The current term unless told otherwise
+        return cls.term == (current_term_param() if term is None else term)
@@ -0,0 +1,51 @@
+from flask import Response, current_app, request, stream_with_context
+
+from db import db
+from serializers import CompiledSerializer
+
+NDJSON_MIMETYPE = "application/x-ndjson"
+
+
+def keyset_page(query, column, after=None, limit=100):
+    # Seek past the cursor instead of using OFFSET so every page is an index range scan
+    if after is not None:
+        query = query.filter(column > after)
+    return query.order_by(column).limit(limit).all()
+
+
+def next_cursor_headers(page, limit):
+    # A short page means there is nothing left to fetch
+    if len(page) < limit:
+        return {}
+    return {"X-Next-Cursor": str(page[-1].id)}
+
+
+def wants_stream(page_args):
+    return page_args["stream"] or request.accept_mimetypes.best == NDJSON_MIMETYPE
+
+
+def ndjson_stream(query, column, schema, after=None, chunk_size=500):
+    # Walk the whole table one keyset chunk at a time, writing one JSON document per line.
+    # The session is emptied after every chunk so memory stays flat regardless of table size.
+    # `schema` is a marshmallow schema or a compiled serializer from serializers.py.
+    if isinstance(schema, CompiledSerializer):
+        encode = schema.dumps
+    else:
+        def encode(row):
+            return current_app.json.dumps(schema.dump(row), separators=(",", ":"))
+
+    def generate(after):
+        while True:
+            chunk = keyset_page(query, column, after, chunk_size)
+            if not chunk:
+                break
+
+            yield "".join(encode(row) + "\n" for row in chunk)
+
+            after = chunk[-1].id
+            db.session.expunge_all()
+
+            if len(chunk) < chunk_size:
+                break
+
+    return Response(stream_with_context(generate(after)), mimetype=NDJSON_MIMETYPE)
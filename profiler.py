@@ -0,0 +1,263 @@
+import re
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import current_app, g, has_app_context, jsonify, request
+from flask_jwt_extended import get_jwt, jwt_required
+from flask_smorest import abort
+from marshmallow import Schema
+from sqlalchemy import event
+
+import schemas
+from db import db
+from serializers import CompiledSerializer
+
+# Bound parameter lists of any length look the same, "IN (?, ?, ?)" and "IN (?)"
+PARAM_LIST = re.compile(r"\(\s*(?:\?|%\(\w+\)s|:\w+)(?:\s*,\s*(?:\?|%\(\w+\)s|:\w+))*\s*\)")
+NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_statement(statement):
+    # Statements that only differ by parameters or literals count as the same query
+    statement = WHITESPACE.sub(" ", statement).strip()
+    statement = PARAM_LIST.sub("(?)", statement)
+    return NUMBER.sub("?", statement)
+
+
+class QueryCapture:
+    '''Collects the statements run while it is active, along with the time spent in the database.'''
+
+    def __init__(self):
+        self.statements = []
+        self.db_time = 0.0
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def record(self, statement, elapsed):
+        self.statements.append(statement)
+        self.db_time += elapsed
+
+    def duplicates(self):
+        counts = Counter(normalize_statement(statement) for statement in self.statements)
+        return {statement: count for statement, count in counts.most_common() if count > 1}
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("query_start")
+    if not starts:
+        # Listener attached while this statement was already running
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    for capture in active_captures():
+        capture.record(statement, elapsed)
+
+
+_local = threading.local()
+
+
+def active_captures():
+    captures = list(getattr(_local, "captures", ()))
+    if has_app_context() and "query_profile" in g:
+        captures.append(g.query_profile)
+    return captures
+
+
+def listen(engine):
+    if not event.contains(engine, "before_cursor_execute", before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", after_cursor_execute)
+
+
+@contextmanager
+def query_budget(max_queries, engine=None):
+    '''
+    Fails with an AssertionError when the block runs more than max_queries statements.
+
+        with query_budget(3):
+            client.get("/student/subjects/grades", headers=headers)
+
+    Works with or without QUERY_PROFILER, it only needs an app context.
+    '''
+    listen(engine or db.engine)
+    capture = QueryCapture()
+    captures = _local.__dict__.setdefault("captures", [])
+    captures.append(capture)
+    try:
+        yield capture
+    finally:
+        captures.remove(capture)
+
+    if capture.count > max_queries:
+        duplicates = "".join(f"\n  {count} x {statement}" for statement, count in capture.duplicates().items())
+        raise AssertionError(f"{capture.count} queries run, budget is {max_queries}.{duplicates}")
+
+
+class RequestProfile(QueryCapture):
+    def __init__(self):
+        super().__init__()
+        self.started = time.perf_counter()
+        self.serialize_time = 0.0
+        self.dump_depth = 0
+
+
+class QueryProfiler:
+    '''
+    Opt-in per request instrumentation, enabled with QUERY_PROFILER.
+
+    Every response gets a Server-Timing header with the database, serialization
+    and total time plus the query count. Requests running more than
+    QUERY_BUDGET statements (QUERY_BUDGETS overrides it per endpoint) are
+    logged, and /debug/profile reports the recent history per endpoint with
+    the statements that were repeated, the usual sign of an N+1.
+    '''
+
+    def __init__(self, history=200):
+        self.enabled = False
+        self.history = history
+        self._requests = defaultdict(lambda: deque(maxlen=self.history))
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.enabled = app.config.setdefault("QUERY_PROFILER", False)
+        app.config.setdefault("QUERY_BUDGET", 10)
+        app.config.setdefault("QUERY_BUDGETS", {})
+        app.extensions["query_profiler"] = self
+        if not self.enabled:
+            return
+
+        with app.app_context():
+            for engine in db.engines.values():
+                listen(engine)
+        time_schema_dumps()
+
+        app.before_request(self.start)
+        app.after_request(self.finish)
+        app.add_url_rule("/debug/profile", "debug_profile", self.report_view)
+
+    def budget_for(self, app, endpoint):
+        return app.config["QUERY_BUDGETS"].get(endpoint, app.config["QUERY_BUDGET"])
+
+    def start(self):
+        g.query_profile = RequestProfile()
+
+    def finish(self, response):
+        profile = g.pop("query_profile", None)
+        if profile is None or request.endpoint == "debug_profile":
+            return response
+
+        total = time.perf_counter() - profile.started
+        budget = self.budget_for(current_app, request.endpoint)
+        duplicates = profile.duplicates()
+
+        response.headers.add(
+            "Server-Timing",
+            f'db;dur={profile.db_time * 1e3:.2f};desc="{profile.count} queries", '
+            f"serialize;dur={profile.serialize_time * 1e3:.2f}, "
+            f"total;dur={total * 1e3:.2f}"
+        )
+
+        if profile.count > budget:
+            current_app.logger.warning(
+                "%s %s ran %d queries (budget %d), repeated: %s",
+                request.method, request.path, profile.count, budget, list(duplicates.values())
+            )
+
+        with self._lock:
+            self._requests[f"{request.method} {request.endpoint}"].append({
+                "path": request.full_path.rstrip("?"),
+                "status": response.status_code,
+                "queries": profile.count,
+                "db_ms": round(profile.db_time * 1e3, 2),
+                "serialize_ms": round(profile.serialize_time * 1e3, 2),
+                "total_ms": round(total * 1e3, 2),
+                "over_budget": profile.count > budget,
+                "duplicates": duplicates,
+            })
+        return response
+
+    def report(self):
+        with self._lock:
+            requests = {key: list(entries) for key, entries in self._requests.items()}
+
+        endpoints = {}
+        for key, entries in sorted(requests.items()):
+            duplicates = Counter()
+            for entry in entries:
+                duplicates.update(entry["duplicates"])
+
+            endpoints[key] = {
+                "requests": len(entries),
+                "budget": self.budget_for(current_app, key.split(" ", 1)[1]),
+                "over_budget": sum(entry["over_budget"] for entry in entries),
+                "avg_queries": round(sum(entry["queries"] for entry in entries) / len(entries), 2),
+                "max_queries": max(entry["queries"] for entry in entries),
+                "avg_db_ms": round(sum(entry["db_ms"] for entry in entries) / len(entries), 2),
+                "avg_serialize_ms": round(sum(entry["serialize_ms"] for entry in entries) / len(entries), 2),
+                "avg_total_ms": round(sum(entry["total_ms"] for entry in entries) / len(entries), 2),
+                "repeated_statements": dict(duplicates.most_common(10)),
+                "recent": entries[-5:],
+            }
+        return endpoints
+
+    @jwt_required()
+    def report_view(self):
+        jwt = get_jwt()
+        if not jwt.get("is_admin"):
+            abort(401, message="Admin privilege required.")
+
+        if request.args.get("reset"):
+            with self._lock:
+                self._requests.clear()
+        return jsonify(self.report())
+
+
+def serialization_methods():
+    # The app's own schemas and compiled serializers, marshmallow and other libraries are left untouched
+    app_schemas = [
+        value for value in vars(schemas).values()
+        if isinstance(value, type) and issubclass(value, Schema) and value.__module__ == schemas.__name__
+    ]
+    return [(schema, "dump") for schema in app_schemas] + [(CompiledSerializer, "dumps")]
+
+
+def time_schema_dumps():
+    # Wraps them once so they report to the current request profile. Nested schemas dump
+    # through the same methods, only the outermost call is timed and any lazy loads it
+    # triggers are counted as database time, not serialization.
+    for owner, name in serialization_methods():
+        setattr(owner, name, timed_serialization(getattr(owner, name)))
+
+
+def timed_serialization(original):
+    if getattr(original, "profiled", False):
+        return original
+
+    @wraps(original)
+    def serialize(*args, **kwargs):
+        profile = g.get("query_profile") if has_app_context() else None
+        if profile is None or profile.dump_depth:
+            return original(*args, **kwargs)
+
+        profile.dump_depth += 1
+        started, db_time = time.perf_counter(), profile.db_time
+        try:
+            return original(*args, **kwargs)
+        finally:
+            profile.dump_depth -= 1
+            profile.serialize_time += (time.perf_counter() - started) - (profile.db_time - db_time)
+
+    serialize.profiled = True
+    return serialize
+
+
+query_profiler = QueryProfiler()
@@ -0,0 +1,89 @@
+from sqlalchemy import delete, func, select
+
+from cache import response_cache
+from db import db
+from enrolments import promote_waitlist, recount_seats
+from models import StudentModel, SubjectStudent
+from transcripts import refresh_transcripts
+
+'''
+Set-based student deletes.
+
+A student is removed with one DELETE statement. Their enrolments, waitlist
+entries and transcript go with it through the ON DELETE CASCADE foreign keys,
+the ORM never loads them, so deleting a student costs the same whether they
+took two subjects or forty. The seats they held are recounted in the subjects
+they touched and handed to those subjects' waitlists in the same transaction.
+
+Whole courses or graduation batches are purged a chunk of students per
+transaction, so the write lock is never held for long and an interrupted
+purge keeps what it deleted; running it again picks up the rest.
+'''
+
+CHUNK_SIZE = 500
+
+
+def delete_students(student_ids):
+    # Deletes in the current transaction, returns the touched subject ids and the promoted student ids
+    subject_ids = db.session.scalars(
+        select(SubjectStudent.subject_id).where(SubjectStudent.student_id.in_(student_ids)).distinct()
+    ).all()
+
+    deleted = db.session.execute(
+        delete(StudentModel).where(StudentModel.id.in_(student_ids)),
+        execution_options={"synchronize_session": False}
+    ).rowcount
+
+    # Their seats go to the waitlists
+    recount_seats(subject_ids)
+    promoted = []
+    for subject_id in subject_ids:
+        promoted += promote_waitlist(subject_id)
+    refresh_transcripts(promoted)
+
+    return {"deleted": deleted, "subject_ids": subject_ids, "promoted": promoted}
+
+
+def invalidate_deleted(student_ids, result):
+    response_cache.invalidate(
+        "subject-list",
+        *[f"student:{student_id}" for student_id in [*student_ids, *result["promoted"]]],
+        *[f"subject:{subject_id}" for subject_id in result["subject_ids"]]
+    )
+
+
+def purge_filters(course=None, batch=None):
+    filters = []
+    if course is not None:
+        filters.append(StudentModel.course == course)
+    if batch is not None:
+        filters.append(StudentModel.batch == batch)
+    return filters
+
+
+def count_students(course=None, batch=None):
+    return db.session.scalar(select(func.count(StudentModel.id)).where(*purge_filters(course, batch)))
+
+
+def purge_students(course=None, batch=None, chunk_size=CHUNK_SIZE, progress=None):
+    filters = purge_filters(course, batch)
+    if not filters:
+        raise ValueError("A purge needs a course, a batch or both.")
+
+    report = {"matched": count_students(course, batch), "deleted": 0, "promoted": 0}
+    while True:
+        # Deleted rows drop out of the filter, so the next chunk is always the first one left
+        student_ids = db.session.scalars(
+            select(StudentModel.id).where(*filters).order_by(StudentModel.id).limit(chunk_size)
+        ).all()
+        if not student_ids:
+            return report
+
+        result = delete_students(student_ids)
+        db.session.commit()
+        invalidate_deleted(student_ids, result)
+
+        report["deleted"] += result["deleted"]
+        report["promoted"] += len(result["promoted"])
+        if progress is not None:
+            progress(report)
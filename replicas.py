@@ -0,0 +1,208 @@
+import random
+import sqlite3
+import threading
+import time
+
+from flask import current_app, g, has_request_context, request
+from flask_jwt_extended import decode_token
+from flask_sqlalchemy.session import Session
+from sqlalchemy.sql.dml import UpdateBase
+from sqlalchemy.sql.elements import TextClause
+
+'''
+Read-replica routing.
+
+DATABASE_REPLICA_URLS adds one bind per replica ("replica_1", "replica_2",
+...). A GET or HEAD request reads from one of them, picked at random when its
+first query runs; every other request, and everything outside a request (CLI,
+background threads), uses the primary. Within a routed request the session
+still sends every write to the primary: a flush or an INSERT/UPDATE/DELETE
+goes there, and the rest of the request follows it. Models with
+read_from_primary (the token blocklist) are always read from the primary.
+Replica connections to SQLite are opened query_only, so a write that slipped
+through fails instead of diverging.
+
+Read-your-writes: after a student's successful non-GET request their reads go
+to the primary for REPLICA_STICKY_SECONDS, which should exceed the replication
+lag. The window is kept per process, or in Redis with
+REPLICA_STICKY_BACKEND=redis so every worker sees it. Cache misses of
+response_cache are read from the primary too, a stale replica read would
+otherwise be cached under the freshly bumped tag version.
+
+SQLiteReplicator stands in for replication when developing with SQLite: it
+copies the primary file over every replica file with SQLite's online backup
+API, run by `flask replicas sync`.
+'''
+
+READ_METHODS = ("GET", "HEAD")
+
+
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        engine = super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+        # Explicit binds and models on another bind key are left alone
+        if bind is not None or engine is not self._db.engines.get(None):
+            return engine
+
+        replica = replica_router.replica_bind(self, mapper, clause)
+        return engine if replica is None else self._db.engines[replica]
+
+
+class LocalStickiness:
+    '''Read-your-writes windows of this process.'''
+
+    def __init__(self, window):
+        self.window = window
+        self._until = {}
+        self._lock = threading.Lock()
+
+    def stick(self, identity):
+        now = time.monotonic()
+        with self._lock:
+            self._until[str(identity)] = now + self.window
+            if len(self._until) > 10000:
+                self._until = {key: until for key, until in self._until.items() if until > now}
+
+    def is_sticky(self, identity):
+        until = self._until.get(str(identity))
+        return until is not None and until > time.monotonic()
+
+
+class RedisStickiness:
+    '''Read-your-writes windows shared by every worker, needs the optional "redis" package.'''
+
+    def __init__(self, url, window, prefix="replica-sticky:"):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.window_ms = int(window * 1000)
+        self.prefix = prefix
+
+    def stick(self, identity):
+        self.client.set(self.prefix + str(identity), 1, px=self.window_ms)
+
+    def is_sticky(self, identity):
+        return self.client.exists(self.prefix + str(identity)) == 1
+
+
+class ReplicaRouter:
+    def __init__(self):
+        self.replicas = []
+        self.stickiness = None
+
+    def init_app(self, app):
+        # Must run before db.init_app, the binds are read when the engines are created
+        urls = app.config.setdefault("DATABASE_REPLICA_URLS", [])
+        window = app.config.setdefault("REPLICA_STICKY_SECONDS", 5)
+        backend = app.config.setdefault("REPLICA_STICKY_BACKEND", "local")
+
+        self.replicas = [f"replica_{number}" for number in range(1, len(urls) + 1)]
+        app.config["REPLICA_BINDS"] = self.replicas
+        app.config.setdefault("SQLALCHEMY_BINDS", {}).update(zip(self.replicas, urls))
+
+        if backend == "redis":
+            self.stickiness = RedisStickiness(app.config["REPLICA_STICKY_REDIS_URL"], window)
+        else:
+            self.stickiness = LocalStickiness(window)
+
+        if self.replicas:
+            app.after_request(self.after_request)
+        app.extensions["replica_router"] = self
+
+    def replica_bind(self, session, mapper=None, clause=None):
+        if not self.replicas or not has_request_context():
+            return None
+
+        if session._flushing or isinstance(clause, (UpdateBase, TextClause)):
+            # Raw SQL is assumed to write
+            g.db_wrote = True
+            return None
+        if mapper is not None and getattr(mapper.class_, "read_from_primary", False):
+            return None
+        return self.read_bind()
+
+    def choose_replica(self):
+        if request.method not in READ_METHODS:
+            return None
+
+        identity = request_identity()
+        if identity is not None and self.stickiness.is_sticky(identity):
+            return None
+        return random.choice(self.replicas)
+
+    def read_bind(self):
+        # The bind the current request reads from, also used by asgi.py's own sessions. None for the primary
+        if not self.replicas or g.get("db_wrote") or g.get("db_primary"):
+            return None
+        if "db_replica" not in g:
+            g.db_replica = self.choose_replica()
+        return g.db_replica
+
+    def use_primary(self):
+        # Everything the current request reads from here on comes from the primary
+        if has_request_context():
+            g.db_primary = True
+
+    def stick(self, identity):
+        # For writes made before the client has a token, e.g. registering
+        if self.replicas:
+            self.stickiness.stick(identity)
+
+    def after_request(self, response):
+        if request.method not in READ_METHODS and response.status_code < 400:
+            identity = request_identity()
+            if identity is not None:
+                self.stickiness.stick(identity)
+        return response
+
+
+def request_identity():
+    # Reading the route's own decoded token when it has run, otherwise decoding it (signature only, no blocklist lookup)
+    if "_jwt_extended_jwt" in g:
+        return g._jwt_extended_jwt.get(current_app.config["JWT_IDENTITY_CLAIM"])
+
+    authorization = request.headers.get("Authorization", "")
+    if not authorization.startswith("Bearer "):
+        return None
+    try:
+        return decode_token(authorization[len("Bearer "):]).get(current_app.config["JWT_IDENTITY_CLAIM"])
+    except Exception:
+        return None
+
+
+class SQLiteReplicator:
+    '''
+    Copies a SQLite primary over its replicas, a local stand-in for
+    streaming replication. Every sync is a full, consistent snapshot taken
+    with the online backup API, so replicas lag by up to one interval plus
+    the copy itself.
+    '''
+
+    def __init__(self, primary_path, replica_paths):
+        self.primary_path = primary_path
+        self.replica_paths = replica_paths
+
+    def sync(self):
+        source = sqlite3.connect(self.primary_path)
+        try:
+            for path in self.replica_paths:
+                target = sqlite3.connect(path, timeout=30)
+                try:
+                    source.backup(target)
+                finally:
+                    target.close()
+        finally:
+            source.close()
+
+    def run(self, interval, stop=None, progress=None):
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            started = time.perf_counter()
+            self.sync()
+            if progress is not None:
+                progress(time.perf_counter() - started)
+            stop.wait(interval)
+
+
+replica_router = ReplicaRouter()
@@ -0,0 +1,72 @@
+import os
+
+from flask import send_file
+from flask.views import MethodView
+from flask_smorest import Blueprint, abort
+from flask_jwt_extended import jwt_required, get_jwt, get_jwt_identity
+
+from db import db
+from models import ExportJobModel
+from schemas import ExportRequestSchema, ExportJobSchema
+from exports import export_runner, missing_dependency, EXPORT_FORMATS
+
+
+blp = Blueprint("exports", __file__, description="Grade sheet exports."
+)
+
+'''
+@jwt_required(is_admin=True)
+✅ /exports               - POST (Queue a grade sheet export, ?format csv/xlsx/parquet, optional subject_id and course)
+✅ /exports/<id>          - GET  (Status of an export)
+✅ /exports/<id>/download - GET  (The finished file)
+'''
+
+def require_admin():
+    jwt = get_jwt()
+    if not jwt.get("is_admin"):
+        abort(401, message="Admin privilege required.")
+
+
+@blp.route("/exports")
+class Exports(MethodView):
+    @jwt_required()
+    @blp.arguments(ExportRequestSchema)
+    @blp.response(202, ExportJobSchema)
+    def post(self, export_args):
+        require_admin()
+
+        requires = missing_dependency(export_args["format"])
+        if requires is not None:
+            abort(400, message=f"{export_args['format'].upper()} exports need the {requires} package installed.")
+
+        return export_runner.create(requested_by=get_jwt_identity(), **export_args)
+
+
+@blp.route("/exports/<int:job_id>")
+class Export(MethodView):
+    @jwt_required()
+    @blp.response(200, ExportJobSchema)
+    def get(self, job_id):
+        require_admin()
+        export_runner.cleanup_if_due()
+        return db.get_or_404(ExportJobModel, job_id)
+
+
+@blp.route("/exports/<int:job_id>/download")
+class ExportDownload(MethodView):
+    @jwt_required()
+    def get(self, job_id):
+        require_admin()
+        export_runner.cleanup_if_due()
+        job = db.get_or_404(ExportJobModel, job_id)
+
+        if job.status != "done":
+            abort(409, message=f"The export is {job.status}, it can only be downloaded once done.")
+        if not os.path.exists(job.path):
+            abort(410, message="The export file is no longer available.")
+
+        exporter = EXPORT_FORMATS[job.format]
+        return send_file(
+            job.path, mimetype=exporter.mimetype, as_attachment=True,
+            download_name=f"grades-{job.id}.{exporter.extension}"
+        )
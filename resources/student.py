@@ -1,44 +1,71 @@
+import io
+
+from flask import current_app, jsonify, request
 from flask.views import MethodView
 from flask_smorest import Blueprint, abort
-from flask_jwt_extended import jwt_required, create_access_token, create_refresh_token, get_jwt_identity, get_jti
+from flask_jwt_extended import jwt_required, create_access_token, create_refresh_token, get_jwt_identity, get_jwt
 
 from db import db
-from models import StudentModel, BlocklistModel, SubjectModel, SubjectStudent
-from schemas import StudentSchema, StudentLoginSchema, GradeSchema, PlainSubjectSchema
-from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy import or_
-
-from passlib.hash import pbkdf2_sha256
+from models import StudentModel, SubjectModel, SubjectStudent, GradeHistoryModel, ArchivedGradeHistoryModel
+from schemas import StudentSchema, StudentLoginSchema, GradeSchema, PlainSubjectSchema, PageArgsSchema, GwaArgsSchema, StudentGwaSchema, StudentImportResultSchema, TranscriptSchema, PlainStudentSchema, StudentSearchArgsSchema, WaitlistEntrySchema, StudentPurgeSchema, StudentPurgeResultSchema, GradeHistoryArgsSchema, GradeHistorySchema
+from student_import import StudentImporter, read_student_rows
+from pagination import keyset_page, next_cursor_headers, wants_stream, ndjson_stream
+from serializers import compile_schema
+from transcripts import get_transcript, refresh_transcript, refresh_transcripts
+from search import search_students, next_offset_headers
+from revocation import revocation_cache
+from gwa import student_gwa, batch_gwa
+from cache import response_cache
+from replicas import replica_router
+from grade_history import grade_history, grade_changes, history_page
+from archive import find_archived_enrolment
+from purge import delete_students, invalidate_deleted, purge_students, count_students
+from enrolments import get_enrolment_or_abort, find_enrolment, student_enrolments, enrolled_subjects, enrol, unenrol, lock_student, find_waitlist_entry, join_waitlist, leave_waitlist, waitlist_position, promote_waitlist
+from sqlalchemy.exc import SQLAlchemyError, IntegrityError
+from sqlalchemy.orm import selectinload, joinedload
+
+from hashing import password_hasher
 
 
 blp = Blueprint("students", __file__, description="Operations on students."
 )
 
+# Same output as the schemas, without marshmallow's per-field dump on every row
+student_serializer = compile_schema(StudentSchema())
+students_serializer = compile_schema(StudentSchema(many=True))
+grades_serializer = compile_schema(GradeSchema(many=True))
+
 '''
 
 ✅ /login     - POST   (Generate access, refresh)
 ✅ /logout    - POST   (Revoke access token)
 ✅ /refresh   - POST   (Generate non-fresh token)
 ✅ /register  - POST   (Create a new student model)
+✅ /students/import - POST (Register many students from a CSV or NDJSON upload)
+✅ /students/purge  - POST (Delete every student of a course and/or graduation batch, chunked)
 
 JWT Based - Identity (user.id)
 ✅ /student - GET (Student info)
 ✅ /student - DELETE (Delete account)
 
 
-/students - GET (Get all students)
+✅ /students - GET (Get all students, paginated with ?limit=&after= or streamed with ?stream=true)
+✅ /students/search - GET (?q= substring of name, email or course, ?course= and ?subject_id= filters, ?limit=&offset=)
 
 ✅ /student/subject/<id> - GET (Get subject info by ID)
-✅ /student/subject/<id> - POST (Enroll to a subject by ID)
-✅ /student/subject/<id> - DELETE (Unenroll to a subject by ID)
+✅ /student/subject/<id> - POST (Enroll to a subject by ID, 202 and a waitlist position when it is full)
+✅ /student/subject/<id> - DELETE (Unenroll to a subject by ID, or leave its waitlist)
 
 ✅ /student/subject/<id>/grades - GET (Get grades from a single subject)
 ✅ /student/subject/<id>/grades - PUT (Edit Grades)
-✅ /student/subjects/grades - GET ALL SUBJECTS AND THEIR GRADES
+✅ /student/subject/<id>/grades/history - GET (Every change to those grades, oldest first, ?limit=&after= keyset pages, ?term= for a past term)
+✅ /student/subjects/grades - GET ALL SUBJECTS AND THEIR GRADES (current term)
 
 
 ✅ /student/subjects         - GET (GET ALL SUBJECTS)
-✅ /student/average - GET (GET AVERAGE FROM ALL SUBJECTS)
+✅ /student/average - GET (GET AVERAGE FROM ALL SUBJECTS OF THE CURRENT TERM, weighted by units)
+✅ /student/transcript - GET (Profile, every subject of every term with its grades and the cumulative GWA in one document)
+✅ /students/gwa    - GET (GWA of every student, ?course= and ?min_gwa= for the dean's list)
 
 
 '''
@@ -47,58 +74,80 @@ JWT Based - Identity (user.id)
 class StudentAverage(MethodView):
     @jwt_required()
     def get(self):
-        grades = StudentModel.query.get_or_404(get_jwt_identity()).subject_students
-        average = [85.0, 91.0, 88.0, 88.67]
-        for grade in grades:
-            average.append(grade.average_grade)
+        gwa = student_gwa(get_jwt_identity())
+        return {"average": gwa["gwa"], "units": gwa["units"]}
+
+@blp.route("/students/gwa")
+class StudentsGwa(MethodView):
+    @jwt_required()
+    @blp.arguments(GwaArgsSchema, location="query")
+    @blp.response(200, StudentGwaSchema(many=True))
+    def get(self, gwa_args):
+        jwt = get_jwt()
+        if not jwt.get("is_admin"):
+            abort(401, message="Admin privilege required.")
 
-        return {"average": sum(average)/len(average)}
+        return batch_gwa(course=gwa_args["course"], min_gwa=gwa_args["min_gwa"])
 
 @blp.route("/students")
 class Students(MethodView):
+    @blp.arguments(PageArgsSchema, location="query")
     @blp.response(200, StudentSchema(many=True))
-    def get(self):
-        return StudentModel.query.all()
+    def get(self, page_args):
+        # Load every page's subjects in one extra query instead of one per student
+        query = StudentModel.query.options(selectinload(StudentModel.subjects))
+
+        if wants_stream(page_args):
+            return ndjson_stream(query, StudentModel.id, student_serializer, after=page_args["after"])
+
+        students = keyset_page(query, StudentModel.id, page_args["after"], page_args["limit"])
+        return students_serializer.response(students, headers=next_cursor_headers(students, page_args["limit"]))
+
+@blp.route("/students/search")
+class StudentSearch(MethodView):
+    @blp.arguments(StudentSearchArgsSchema, location="query")
+    @blp.response(200, PlainStudentSchema(many=True))
+    def get(self, search_args):
+        students = search_students(**search_args)
+        return students, next_offset_headers(students, search_args["limit"], search_args["offset"])
 
 @blp.route("/student/subjects/grades")
 class AllSubjectsGrades(MethodView):
     @jwt_required()
+    @response_cache.cached([], per_student=True)
     @blp.response(200, GradeSchema(many=True))
     def get(self):
-        return StudentModel.query.get_or_404(get_jwt_identity()).subject_students
+        return grades_serializer.response(student_enrolments(get_jwt_identity()))
+
+@blp.route("/student/transcript")
+class StudentTranscript(MethodView):
+    @jwt_required()
+    @blp.response(200, TranscriptSchema)
+    def get(self):
+        # Stored already serialized, served as is
+        transcript = get_transcript(get_jwt_identity())
+        if transcript is None:
+            abort(404, message="Student not found.")
+
+        return current_app.response_class(transcript.document + "\n", mimetype=current_app.json.mimetype)
 
 @blp.route("/student/subject/<int:subject_id>/grades")
 class SubjectGrades(MethodView):
     @jwt_required()
     @blp.response(200, GradeSchema)
     def get(self, subject_id):
-        student = StudentModel.query.get_or_404(get_jwt_identity()) # 1
-        subject = SubjectModel.query.get_or_404(subject_id)         # 1
-
-        if subject not in student.subjects:
-            abort(400, message="Student not enrolled in that subject")
-        
-        grades = SubjectStudent.query.filter(
-            SubjectStudent.student_id == student.id,
-            SubjectStudent.subject_id == subject.id
-        ).first()
-
-        return grades
+        return get_enrolment_or_abort(
+            get_jwt_identity(), subject_id, "Student not enrolled in that subject",
+            joinedload(SubjectStudent.student), joinedload(SubjectStudent.subject)
+        )
     
     @jwt_required()
     @blp.arguments(GradeSchema)
     @blp.response(200, GradeSchema)
     def put(self, grade_data, subject_id):
-        student = StudentModel.query.get_or_404(get_jwt_identity()) # 1
-        subject = SubjectModel.query.get_or_404(subject_id)         # 1
-
-        if subject not in student.subjects:
-            abort(400, message="Student not enrolled in that subject")
-        
-        grades = SubjectStudent.query.filter(
-            SubjectStudent.student_id == student.id,
-            SubjectStudent.subject_id == subject.id
-        ).first()
+        student_id = get_jwt_identity()
+        grades = get_enrolment_or_abort(student_id, subject_id, "Student not enrolled in that subject")
+        changes = grade_changes(grades, grade_data, student_id, "grades")
 
         if 'prelims_grade' in grade_data:
             grades.prelims_grade = grade_data['prelims_grade']
@@ -108,66 +157,131 @@ class SubjectGrades(MethodView):
             grades.finals_grade = grade_data['finals_grade']
 
         db.session.add(grades)
+        refresh_transcript(student_id)
         db.session.commit()
+        grade_history.record(changes)
+        response_cache.invalidate(f"student:{student_id}")
 
         return grades
+
+@blp.route("/student/subject/<int:subject_id>/grades/history")
+class SubjectGradesHistory(MethodView):
+    @jwt_required()
+    @blp.arguments(GradeHistoryArgsSchema, location="query")
+    @blp.response(200, GradeHistorySchema(many=True))
+    def get(self, history_args, subject_id):
+        student_id = get_jwt_identity()
+        term = history_args["term"]
+
+        # A closed term may have been moved to the archive, along with its history
+        enrolment = find_archived_enrolment(student_id, subject_id, term) if term is not None else None
+        if enrolment is not None:
+            model = ArchivedGradeHistoryModel
+        else:
+            enrolment = get_enrolment_or_abort(student_id, subject_id, "Student not enrolled in that subject", term=term)
+            model = GradeHistoryModel
+
+        page = history_page(enrolment.id, history_args["after"], history_args["limit"], model)
+        return page, next_cursor_headers(page, history_args["limit"])
         
 @blp.route("/student/subjects")
 class EnrolledSubjects(MethodView):
     @jwt_required()
+    @response_cache.cached([], per_student=True)
     @blp.response(200, PlainSubjectSchema(many=True))
     def get(self):
-        student = StudentModel.query.get_or_404(get_jwt_identity())
-        
-        return student.subjects
+        return enrolled_subjects(get_jwt_identity())
 
 @blp.route("/student/subject/<int:subject_id>")
 class EnrolledSubject(MethodView):
     @jwt_required()
     @blp.response(200, PlainSubjectSchema)
     def get(self, subject_id):
-        student = StudentModel.query.get_or_404(get_jwt_identity())
-        subject = SubjectModel.query.get_or_404(subject_id)
-
-        if subject not in student.subjects:
-            abort(400, message="Student not enrolled in the subject.")
+        enrolment = get_enrolment_or_abort(
+            get_jwt_identity(), subject_id, "Student not enrolled in the subject.",
+            joinedload(SubjectStudent.subject)
+        )
 
-        return subject
+        return enrolment.subject
 
     @jwt_required()
     @blp.response(201, PlainSubjectSchema)
+    @blp.alt_response(202, schema=WaitlistEntrySchema, description="The subject is full, the student joined its waitlist.")
     def post(self, subject_id):
         student = StudentModel.query.get_or_404(get_jwt_identity())
         subject = SubjectModel.query.get_or_404(subject_id)
 
-        # Before linking, make sure that the item and the tag is inside the same store
-        if subject in student.subjects:
+        # Held until the commit, a duplicate request waits here and then sees this one's result
+        lock_student(student.id)
+        if find_enrolment(student.id, subject.id) is not None:
             abort(400, message="You are already enrolled in that subject.")
+        if find_waitlist_entry(student.id, subject.id) is not None:
+            abort(400, message="You are already on the waitlist for that subject.")
 
-        student.subjects.append(subject)
+        if enrol(student.id, subject.id) is None:
+            return self.wait_for_seat(student, subject)
     
         try:
+            refresh_transcript(student.id)
             db.session.commit()
+        except IntegrityError:
+            # A concurrent request enrolled the same student first
+            db.session.rollback()
+            abort(400, message="You are already enrolled in that subject.")
         except SQLAlchemyError:
             abort(500, message="An error occured while enrolling on the subject.")
+
+        response_cache.invalidate(f"student:{student.id}", f"subject:{subject.id}", "subject-list")
         
         return subject
+
+    def wait_for_seat(self, student, subject):
+        entry = join_waitlist(student.id, subject.id)
+
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            abort(400, message="You are already on the waitlist for that subject.")
+
+        # A seat freed between the full check and joining the queue would otherwise wait for the next release
+        promoted = promote_waitlist(subject.id)
+        if promoted:
+            refresh_transcripts(promoted)
+            db.session.commit()
+            response_cache.invalidate(*[f"student:{student_id}" for student_id in promoted], f"subject:{subject.id}", "subject-list")
+
+            if student.id in promoted:
+                return subject
+
+        entry.position = waitlist_position(entry)
+        return jsonify(WaitlistEntrySchema().dump(entry)), 202
     
     @jwt_required()
     def delete(self, subject_id):
-        student = StudentModel.query.get_or_404(get_jwt_identity())
-        subject = SubjectModel.query.get_or_404(subject_id)
+        student_id = get_jwt_identity()
+        lock_student(student_id)
+
+        if leave_waitlist(student_id, subject_id):
+            # Not holding a seat, nothing to give back
+            db.session.commit()
+            return {"message": "You have left the waitlist of that subject."}
 
-        if subject not in student.subjects:
-            abort(400, message="You are not enrolled on that subject.")
+        enrolment = get_enrolment_or_abort(student_id, subject_id, "You are not enrolled on that subject.")
         
-        student.subjects.remove(subject)
+        promoted = unenrol(enrolment)
 
         try:
+            refresh_transcripts([student_id, *promoted])
             db.session.commit()
         except SQLAlchemyError:
             abort(500, message="An error occured while unenrolling from the subject.")
 
+        response_cache.invalidate(
+            f"student:{student_id}", *[f"student:{promoted_id}" for promoted_id in promoted],
+            f"subject:{subject_id}", "subject-list"
+        )
+
         return {"message": "Subject was successfully unenrolled."}
 
 
@@ -183,10 +297,12 @@ class Student(MethodView):
     @jwt_required(fresh=True)
     def delete(self):
         student_id = get_jwt_identity()
-        student = StudentModel.query.get_or_404(student_id)
-        
-        db.session.delete(student)
+        StudentModel.query.get_or_404(student_id)
+
+        # One DELETE, the database drops their enrolments, waitlist entries and transcript
+        result = delete_students([student_id])
         db.session.commit()
+        invalidate_deleted([student_id], result)
 
         return {"message": "Your account has been successfully deleted."}
 
@@ -204,15 +320,66 @@ class StudentRegister(MethodView):
         student = StudentModel(
             name=student_info["name"],
             email=student_info["email"],
-            password=pbkdf2_sha256.hash(student_info["password"]),
-            course=student_info["course"]
+            password=password_hasher.hash(student_info["password"]),
+            course=student_info["course"],
+            batch=student_info["batch"]
         )
 
         db.session.add(student)
         db.session.commit()
+        # Their first reads come before they have a token the write could be tied to
+        replica_router.stick(student.id)
 
         return student
 
+@blp.route("/students/import")
+class StudentImport(MethodView):
+    @jwt_required()
+    @blp.response(200, StudentImportResultSchema)
+    def post(self):
+        jwt = get_jwt()
+        if not jwt.get("is_admin"):
+            abort(401, message="Admin privilege required.")
+
+        upload = request.files.get("file")
+        if upload is not None:
+            stream = io.TextIOWrapper(upload.stream, encoding="utf-8-sig")
+            filename, mimetype = upload.filename or "", upload.mimetype
+        else:
+            stream = io.StringIO(request.get_data(as_text=True))
+            filename, mimetype = "", request.mimetype
+
+        ndjson = filename.endswith((".ndjson", ".jsonl")) or mimetype == "application/x-ndjson"
+
+        def progress(report):
+            current_app.logger.info("Student import: %(processed)s processed, %(created)s created", report)
+
+        return StudentImporter(progress=progress).run(read_student_rows(stream, "ndjson" if ndjson else "csv"))
+
+@blp.route("/students/purge")
+class StudentPurge(MethodView):
+    @jwt_required(fresh=True)
+    @blp.arguments(StudentPurgeSchema)
+    @blp.response(200, StudentPurgeResultSchema)
+    def post(self, purge_args):
+        jwt = get_jwt()
+        if not jwt.get("is_admin"):
+            abort(401, message="Admin privilege required.")
+
+        course, batch = purge_args["course"], purge_args["batch"]
+        if purge_args["dry_run"]:
+            return {"matched": count_students(course, batch), "deleted": 0, "promoted": 0}
+
+        def progress(report):
+            current_app.logger.info("Student purge: %(deleted)s of %(matched)s deleted", report)
+
+        try:
+            return purge_students(course=course, batch=batch, progress=progress)
+        except SQLAlchemyError:
+            # Chunks already committed stay deleted, the request can be repeated for the rest
+            db.session.rollback()
+            abort(500, message="An error occurred while purging students.")
+
 @blp.route("/login")
 class UserLogin(MethodView):
     @blp.arguments(StudentLoginSchema)
@@ -221,7 +388,12 @@ class UserLogin(MethodView):
             StudentModel.email == login_cred["email"]
         ).first()
 
-        if student and pbkdf2_sha256.verify(login_cred["password"], student.password):
+        if student and password_hasher.verify(login_cred["password"], student.password):
+            # Upgrade hashes made with older KDF settings while we have the plain password
+            if password_hasher.needs_rehash(student.password):
+                student.password = password_hasher.hash(login_cred["password"])
+                db.session.commit()
+
             # Create access token
             access_token = create_access_token(identity=student.id, fresh=True)
             refresh_token = create_refresh_token(identity=student.id)
@@ -234,10 +406,8 @@ class UserLogout(MethodView):
     @jwt_required()
     def post(self):
         # GET JTI
-        jwt_jti = get_jti()
-        new_blocked_jti = BlocklistModel(jti=jwt_jti)
-        db.session.add(new_blocked_jti)
-        db.session.commit()
+        jwt = get_jwt()
+        revocation_cache.revoke(jwt["jti"], expires_at=jwt.get("exp"))
 
         return {"message": "Successfully logged out."}
 
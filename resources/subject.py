@@ -1,13 +1,23 @@
+from flask import current_app
 from flask.views import MethodView
 from flask_smorest import Blueprint, abort
-from flask_jwt_extended import jwt_required, create_access_token, create_refresh_token, get_jwt
+from flask_jwt_extended import jwt_required, get_jwt, get_jwt_identity
 
 from db import db
-from models import SubjectModel
-from schemas import SubjectSchema, PlainSubjectSchema
+from models import SubjectModel, SubjectStudent
+from schemas import SubjectSchema, PlainSubjectSchema, PageArgsSchema, BulkGradeResultSchema, GradeSchema, RankingArgsSchema, FailingArgsSchema, StatsArgsSchema, SubjectStatsSchema, SubjectSearchArgsSchema, SubjectCapacitySchema, WaitlistEntrySchema
+from stats import subject_stats, all_subject_stats
+from cache import response_cache
+from transcripts import transcript_refresher, refresh_transcripts
+from grade_history import grade_history
+from enrolments import promote_waitlist, subject_waitlist
+from search import search_subjects, next_offset_headers
+from bulk_grades import read_grade_rows, apply_grade_rows
+from marshmallow import ValidationError
+from pagination import keyset_page, next_cursor_headers, wants_stream, ndjson_stream
+from sqlalchemy import delete, select
 from sqlalchemy.exc import SQLAlchemyError
-
-from passlib.hash import pbkdf2_sha256
+from sqlalchemy.orm import selectinload, joinedload
 
 
 blp = Blueprint("subjects", __file__, description="Operations on subjects."
@@ -15,41 +25,116 @@ blp = Blueprint("subjects", __file__, description="Operations on subjects."
 
 '''
 @jwt_required(is_admin=True)
-✅ /subjects - GET ALL SUBJECTS
+✅ /subjects - GET ALL SUBJECTS (?limit=&after= keyset pages, ?stream=true for NDJSON)
 ✅ /subject/ - POST (CREATE SUBJECT)
+✅ /subjects/search - GET (?q= substring of name or description, ?units= and ?student_id= filters, ?limit=&offset=)
 
 ✅ /subject/<id> - GET (GET SUBJECT BY ID)
 ✅ /subject/<id> - DELETE (DELETE SUBJECT BY ID)
 
    /subject/<id>/student - GET (Get enrolled students on a subject)
+
+✅ /subject/<id>/capacity - PUT (Set or remove the seat limit, raising it admits students from the waitlist)
+✅ /subject/<id>/waitlist - GET (Students waiting for a seat, in order)
+
+✅ /subject/<id>/grades/bulk - POST (Set grades for many students at once, JSON array or CSV)
+✅ /subject/<id>/top         - GET (Highest averages in a subject)
+✅ /subjects/failing         - GET (Enrolments averaging below the passing grade)
+✅ /subject/<id>/stats       - GET (Grade distribution of a subject)
+✅ /subjects/stats           - GET (Grade distribution of every subject)
 '''
 @blp.route("/subject/<int:subject_id>")
 class Subjects(MethodView):
+    @response_cache.cached(lambda subject_id: [f"subject:{subject_id}"])
     @blp.response(200, SubjectSchema)
     def get(self, subject_id):
         subject = SubjectModel.query.get_or_404(subject_id)
         return subject
     
     def delete(self, subject_id):
-        subject = SubjectModel.query.get_or_404(subject_id)
-
+        SubjectModel.query.get_or_404(subject_id)
+        student_ids = db.session.scalars(select(SubjectStudent.student_id).where(SubjectStudent.subject_id == subject_id)).all()
+        student_tags = [f"student:{student_id}" for student_id in student_ids]
 
+        # Enrolments and waitlist entries are removed by ON DELETE CASCADE
         try:
-            db.session.delete(subject)
+            db.session.execute(
+                delete(SubjectModel).where(SubjectModel.id == subject_id),
+                execution_options={"synchronize_session": False}
+            )
             db.session.commit()
-        except:
-            return {"message": "The subject is currently in use by other students."}
+        except SQLAlchemyError:
+            db.session.rollback()
+            abort(500, message="An error occurred while deleting the subject.")
+
+        response_cache.invalidate("subject-list", f"subject:{subject_id}", *student_tags)
+        transcript_refresher.schedule(student_ids)
 
         return {"message": "The subject has been successfully deleted."}
     
 
+@blp.route("/subject/<int:subject_id>/capacity")
+class SubjectCapacity(MethodView):
+    @jwt_required()
+    @blp.arguments(SubjectCapacitySchema)
+    @blp.response(200, SubjectSchema)
+    def put(self, capacity_data, subject_id):
+        jwt = get_jwt()
+        if not jwt.get("is_admin"):
+            abort(401, message="Admin privilege required.")
+
+        subject = SubjectModel.query.get_or_404(subject_id)
+
+        # Lowering it below the enrolled count removes nobody, new enrolments wait until enough seats free up
+        subject.capacity = capacity_data["capacity"]
+        db.session.flush()
+
+        promoted = promote_waitlist(subject_id)
+        refresh_transcripts(promoted)
+        db.session.commit()
+        response_cache.invalidate("subject-list", f"subject:{subject_id}", *[f"student:{student_id}" for student_id in promoted])
+
+        db.session.refresh(subject)
+        return subject
+
+
+@blp.route("/subject/<int:subject_id>/waitlist")
+class SubjectWaitlist(MethodView):
+    @jwt_required()
+    @blp.response(200, WaitlistEntrySchema(many=True))
+    def get(self, subject_id):
+        jwt = get_jwt()
+        if not jwt.get("is_admin"):
+            abort(401, message="Admin privilege required.")
+
+        SubjectModel.query.get_or_404(subject_id)
+        return subject_waitlist(subject_id)
+
+
 @blp.route("/subjects")
 class GetSubjects(MethodView):
+    @response_cache.cached(["subject-list"])
+    @blp.arguments(PageArgsSchema, location="query")
     @blp.response(200, SubjectSchema(many=True))
-    def get(self):
-        return SubjectModel.query.all()
+    def get(self, page_args):
+        query = SubjectModel.query.options(selectinload(SubjectModel.students))
+
+        if wants_stream(page_args):
+            return ndjson_stream(query, SubjectModel.id, SubjectSchema(), after=page_args["after"])
+
+        subjects = keyset_page(query, SubjectModel.id, page_args["after"], page_args["limit"])
+        return subjects, next_cursor_headers(subjects, page_args["limit"])
                   
                   
+@blp.route("/subjects/search")
+class SubjectSearch(MethodView):
+    @blp.arguments(SubjectSearchArgsSchema, location="query")
+    @blp.response(200, PlainSubjectSchema(many=True))
+    def get(self, search_args):
+        subjects = search_subjects(**search_args)
+        return subjects, next_offset_headers(subjects, search_args["limit"], search_args["offset"])
+
+
 @blp.route("/subject")
 class CreateSubject(MethodView):
     @blp.arguments(SubjectSchema)
@@ -62,5 +147,91 @@ class CreateSubject(MethodView):
             db.session.commit()
         except SQLAlchemyError:
             abort(500, message="An error has occured while creating an item.")
+
+        response_cache.invalidate("subject-list")
         
-        return new_subj
\ No newline at end of file
+        return new_subj
+
+
+@blp.route("/subject/<int:subject_id>/grades/bulk")
+class BulkSubjectGrades(MethodView):
+    @jwt_required()
+    @blp.response(200, BulkGradeResultSchema)
+    def post(self, subject_id):
+        jwt = get_jwt()
+        if not jwt.get("is_admin"):
+            abort(401, message="Admin privilege required.")
+
+        SubjectModel.query.get_or_404(subject_id)
+
+        try:
+            result = apply_grade_rows(subject_id, read_grade_rows(), changed_by=get_jwt_identity())
+        except ValidationError as err:
+            abort(400, message=str(err.messages[0]))
+        except UnicodeDecodeError:
+            abort(400, message="The uploaded CSV must be UTF-8 encoded.")
+
+        try:
+            db.session.commit()
+        except SQLAlchemyError:
+            db.session.rollback()
+            abort(500, message="An error occured while saving the grades.")
+
+        grade_history.record(result["history"])
+        response_cache.invalidate(*[f"student:{student_id}" for student_id in result["student_ids"]])
+        transcript_refresher.schedule(result["student_ids"])
+
+        return result
+
+
+@blp.route("/subject/<int:subject_id>/top")
+class SubjectTopStudents(MethodView):
+    @jwt_required()
+    @blp.arguments(RankingArgsSchema, location="query")
+    @blp.response(200, GradeSchema(many=True))
+    def get(self, ranking_args, subject_id):
+        jwt = get_jwt()
+        if not jwt.get("is_admin"):
+            abort(401, message="Admin privilege required.")
+
+        return SubjectStudent.top_in_subject(subject_id, ranking_args["limit"]).options(
+            joinedload(SubjectStudent.student), joinedload(SubjectStudent.subject)
+        ).all()
+
+
+@blp.route("/subjects/failing")
+class FailingEnrolments(MethodView):
+    @jwt_required()
+    @blp.arguments(FailingArgsSchema, location="query")
+    @blp.response(200, GradeSchema(many=True))
+    def get(self, failing_args):
+        jwt = get_jwt()
+        if not jwt.get("is_admin"):
+            abort(401, message="Admin privilege required.")
+
+        passing_grade = failing_args["passing_grade"]
+        if passing_grade is None:
+            passing_grade = current_app.config["PASSING_GRADE"]
+
+        query = SubjectStudent.failing(passing_grade).options(
+            joinedload(SubjectStudent.student), joinedload(SubjectStudent.subject)
+        )
+        enrolments = keyset_page(query, SubjectStudent.id, failing_args["after"], failing_args["limit"])
+        return enrolments, next_cursor_headers(enrolments, failing_args["limit"])
+
+
+@blp.route("/subject/<int:subject_id>/stats")
+class SubjectStats(MethodView):
+    @blp.arguments(StatsArgsSchema, location="query")
+    @blp.response(200, SubjectStatsSchema)
+    def get(self, stats_args, subject_id):
+        subject = SubjectModel.query.get_or_404(subject_id)
+        return subject_stats(subject, stats_args["bucket_size"])
+
+
+@blp.route("/subjects/stats")
+class AllSubjectStats(MethodView):
+    @blp.arguments(StatsArgsSchema, location="query")
+    @blp.response(200, SubjectStatsSchema(many=True))
+    def get(self, stats_args):
+        return all_subject_stats(stats_args["bucket_size"])
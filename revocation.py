@@ -0,0 +1,125 @@
+import heapq
+import threading
+import time
+
+from db import db
+from models import BlocklistModel
+
+
+class RevocationCache:
+    '''
+    Process-local copy of the blocklist table.
+
+    Checking a token is a set lookup, requests never read the table. A daemon
+    thread started by the first check re-reads it every
+    BLOCKLIST_REFRESH_INTERVAL seconds, only the rows added since its last
+    read (an id range scan), so revocations made by other workers show up
+    within that interval. Ids are handed out before rows commit, so a lower
+    id can commit after a higher one has been read: every read goes back
+    BLOCKLIST_RESCAN_IDS ids to pick those up.
+
+    The first check of a process loads the whole table itself, and checks
+    arriving meanwhile wait for it instead of looking at an empty set.
+    '''
+
+    def __init__(self):
+        self.app = None
+        self.refresh_interval = 2
+        self.purge_interval = 300
+        self.rescan_ids = 1000
+
+        self._lock = threading.Lock()
+        self._thread = None
+        self._reset()
+
+    def _reset(self):
+        self._revoked = set()
+        self._expiry = []           # heap of (exp, jti) used to drop expired entries
+        self._last_id = 0
+        self._next_purge = 0
+        self._loaded = False
+
+    def init_app(self, app):
+        self.app = app
+        self.refresh_interval = app.config.setdefault("BLOCKLIST_REFRESH_INTERVAL", 2)
+        self.purge_interval = app.config.setdefault("BLOCKLIST_PURGE_INTERVAL", 300)
+        self.rescan_ids = app.config.setdefault("BLOCKLIST_RESCAN_IDS", 1000)
+        app.extensions["revocation_cache"] = self
+
+        # Another app means another database, nothing read from the previous one applies
+        with self._lock:
+            self._reset()
+
+    def is_revoked(self, jti):
+        if not self._loaded:
+            self.load()
+        return jti in self._revoked
+
+    def load(self):
+        with self._lock:
+            if not self._loaded:
+                self._read()
+
+            # Started here rather than in init_app so pre-forking servers get one in each worker
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="blocklist-refresh", daemon=True)
+                self._thread.start()
+
+    def refresh(self):
+        with self._lock:
+            self._read()
+
+    def _run(self):
+        while True:
+            time.sleep(self.refresh_interval)
+            try:
+                with self.app.app_context():
+                    self.refresh()
+            except Exception:
+                self.app.logger.exception("Blocklist refresh failed, revocations from other workers are delayed")
+
+    def _read(self):
+        rows = db.session.query(
+            BlocklistModel.id, BlocklistModel.jti, BlocklistModel.expires_at
+        ).filter(
+            BlocklistModel.id > self._last_id - self.rescan_ids
+        ).order_by(BlocklistModel.id).all()
+
+        for row_id, jti, expires_at in rows:
+            if jti not in self._revoked:
+                self._add(jti, expires_at)
+            self._last_id = max(self._last_id, row_id)
+
+        self._expire(time.time())
+        self._loaded = True
+
+    def revoke(self, jti, expires_at=None):
+        db.session.add(BlocklistModel(jti=jti, expires_at=expires_at))
+
+        # Piggyback the table cleanup on a write path instead of the read path
+        now = time.time()
+        if now >= self._next_purge:
+            BlocklistModel.query.filter(BlocklistModel.expires_at < now).delete()
+            self._next_purge = now + self.purge_interval
+
+        db.session.commit()
+
+        with self._lock:
+            if jti not in self._revoked:
+                self._add(jti, expires_at)
+
+    def _add(self, jti, expires_at):
+        self._revoked.add(jti)
+
+        # Rows without an expiry (created before it was recorded) are kept forever
+        if expires_at is not None:
+            heapq.heappush(self._expiry, (expires_at, jti))
+
+    def _expire(self, now):
+        # An expired token is rejected before the blocklist is consulted, so it can be forgotten
+        while self._expiry and self._expiry[0][0] < now:
+            _, jti = heapq.heappop(self._expiry)
+            self._revoked.discard(jti)
+
+
+revocation_cache = RevocationCache()
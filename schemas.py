@@ -1,4 +1,4 @@
-from marshmallow import Schema, fields
+from marshmallow import Schema, fields, validate, validates_schema, ValidationError
 
 class PlainStudentSchema(Schema):
     id = fields.Int(dump_only=True)
@@ -6,6 +6,8 @@ class PlainStudentSchema(Schema):
     email = fields.Str(required=True)
     password = fields.Str(required=True, load_only=True)
     course = fields.Str(required=True)
+    # Graduation batch (year)
+    batch = fields.Int(load_default=None, allow_none=True)
 
 class StudentLoginSchema(Schema):
     email = fields.Str(required=True)
@@ -21,6 +23,8 @@ class StudentSchema(PlainStudentSchema):
     subjects = fields.List(fields.Nested(PlainSubjectSchema()), dump_only=True)
 
 class SubjectSchema(PlainSubjectSchema):
+    capacity = fields.Int(allow_none=True, validate=validate.Range(min=0))
+    enrolled_count = fields.Int(dump_only=True)
     students = fields.List(fields.Nested(PlainStudentSchema()), dump_only=True)
 
 # Used when unenrolling a subject to a student
@@ -32,11 +36,171 @@ class SubjectAndStudentSchema(Schema):
 class GradeSchema(Schema):
     student = fields.Nested(PlainStudentSchema(), dump_only=True)
     subject = fields.Nested(PlainSubjectSchema(), dump_only=True)
+    term = fields.Str(dump_only=True)
     prelims_grade = fields.Float(required=False)
     midterms_grade = fields.Float(required=False)
     finals_grade = fields.Float(required=False)
     average_grade = fields.Float(required=False, dump_only=True)
 
+# One row of a bulk grade upload
+class BulkGradeSchema(GradeSchema):
+    student_id = fields.Int(required=True)
+
+class BulkGradeErrorSchema(Schema):
+    row = fields.Int()
+    student_id = fields.Raw()
+    errors = fields.Dict()
+
+class BulkGradeResultSchema(Schema):
+    updated = fields.Int()
+    errors = fields.List(fields.Nested(BulkGradeErrorSchema()))
+
+# Query string arguments for the keyset paginated listings
+class PageArgsSchema(Schema):
+    limit = fields.Int(load_default=100, validate=validate.Range(min=1, max=1000))
+    after = fields.Int(load_default=None)
+    stream = fields.Bool(load_default=False)
+
+class GradeHistoryArgsSchema(Schema):
+    limit = fields.Int(load_default=100, validate=validate.Range(min=1, max=1000))
+    after = fields.Int(load_default=None)
+    # Defaults to the current term, past terms are also looked up in the archive
+    term = fields.Str(load_default=None)
+
+# One changed grade, see grade_history.py
+class GradeHistorySchema(Schema):
+    id = fields.Int(dump_only=True)
+    field = fields.Str(dump_only=True)
+    old_value = fields.Float(dump_only=True, allow_none=True)
+    new_value = fields.Float(dump_only=True, allow_none=True)
+    changed_by = fields.Int(dump_only=True, allow_none=True)
+    source = fields.Str(dump_only=True)
+    changed_at = fields.DateTime(dump_only=True)
+
+class RankingArgsSchema(Schema):
+    limit = fields.Int(load_default=10, validate=validate.Range(min=1, max=1000))
+
+class FailingArgsSchema(Schema):
+    passing_grade = fields.Float(load_default=None)
+    limit = fields.Int(load_default=100, validate=validate.Range(min=1, max=1000))
+    after = fields.Int(load_default=None)
+
+class GwaArgsSchema(Schema):
+    course = fields.Str(load_default=None)
+    min_gwa = fields.Float(load_default=None)
+
+class StudentGwaSchema(Schema):
+    student_id = fields.Int()
+    name = fields.Str()
+    course = fields.Str()
+    gwa = fields.Float()
+    units = fields.Float()
+
+class StatsArgsSchema(Schema):
+    bucket_size = fields.Float(load_default=10, validate=validate.Range(min=0, min_inclusive=False))
+
+class HistogramBucketSchema(Schema):
+    start = fields.Float()
+    end = fields.Float()
+    count = fields.Int()
+
+class GradeStatsSchema(Schema):
+    count = fields.Int()
+    mean = fields.Float(allow_none=True)
+    median = fields.Float(allow_none=True)
+    std_dev = fields.Float(allow_none=True)
+    min = fields.Float(allow_none=True)
+    max = fields.Float(allow_none=True)
+    percentiles = fields.Dict(keys=fields.Str(), values=fields.Float(allow_none=True))
+    histogram = fields.List(fields.Nested(HistogramBucketSchema()))
+
+class SubjectStatsSchema(Schema):
+    subject_id = fields.Int()
+    name = fields.Str()
+    enrolled = fields.Int()
+    prelims_grade = fields.Nested(GradeStatsSchema())
+    midterms_grade = fields.Nested(GradeStatsSchema())
+    finals_grade = fields.Nested(GradeStatsSchema())
+    average_grade = fields.Nested(GradeStatsSchema())
+
+class StudentImportErrorSchema(Schema):
+    row = fields.Int()
+    email = fields.Raw()
+    errors = fields.Dict()
+
+class StudentImportResultSchema(Schema):
+    processed = fields.Int()
+    created = fields.Int()
+    errors = fields.List(fields.Nested(StudentImportErrorSchema()))
+
+class StudentPurgeSchema(Schema):
+    course = fields.Str(load_default=None)
+    batch = fields.Int(load_default=None)
+    # Only count the students that would be deleted
+    dry_run = fields.Bool(load_default=False)
+
+    @validates_schema
+    def require_filter(self, data, **kwargs):
+        if data["course"] is None and data["batch"] is None:
+            raise ValidationError("Give a course, a batch or both.")
+
+class StudentPurgeResultSchema(Schema):
+    matched = fields.Int()
+    deleted = fields.Int()
+    promoted = fields.Int()
+
+# One subject of a transcript, the student is only given once at the top
+class TranscriptEntrySchema(GradeSchema):
+    class Meta:
+        exclude = ("student",)
+
+# Precomputed per student, see transcripts.py
+class TranscriptSchema(Schema):
+    student = fields.Nested(PlainStudentSchema(), dump_only=True)
+    subjects = fields.List(fields.Nested(TranscriptEntrySchema()), dump_only=True)
+    gwa = fields.Float(allow_none=True, dump_only=True)
+    units = fields.Float(dump_only=True)
+
+class ExportRequestSchema(Schema):
+    format = fields.Str(load_default="csv", validate=validate.OneOf(["csv", "xlsx", "parquet"]))
+    subject_id = fields.Int(load_default=None)
+    course = fields.Str(load_default=None)
+
+class ExportJobSchema(Schema):
+    id = fields.Int(dump_only=True)
+    format = fields.Str(dump_only=True)
+    subject_id = fields.Int(dump_only=True)
+    course = fields.Str(dump_only=True)
+    status = fields.Str(dump_only=True)
+    rows = fields.Int(dump_only=True)
+    error = fields.Str(dump_only=True)
+    created_at = fields.DateTime(dump_only=True)
+    finished_at = fields.DateTime(dump_only=True)
+
+class SubjectCapacitySchema(Schema):
+    # null removes the limit
+    capacity = fields.Int(required=True, allow_none=True, validate=validate.Range(min=0))
+
+class WaitlistEntrySchema(Schema):
+    student = fields.Nested(PlainStudentSchema(), dump_only=True)
+    subject = fields.Nested(PlainSubjectSchema(), dump_only=True)
+    position = fields.Int(dump_only=True)
+    created_at = fields.DateTime(dump_only=True)
+
+class StudentSearchArgsSchema(Schema):
+    q = fields.Str(required=True, validate=validate.Length(min=1, max=100))
+    course = fields.Str(load_default=None)
+    subject_id = fields.Int(load_default=None)
+    limit = fields.Int(load_default=20, validate=validate.Range(min=1, max=100))
+    offset = fields.Int(load_default=0, validate=validate.Range(min=0))
+
+class SubjectSearchArgsSchema(Schema):
+    q = fields.Str(required=True, validate=validate.Length(min=1, max=100))
+    units = fields.Int(load_default=None)
+    student_id = fields.Int(load_default=None)
+    limit = fields.Int(load_default=20, validate=validate.Range(min=1, max=100))
+    offset = fields.Int(load_default=0, validate=validate.Range(min=0))
+
 '''
 login user 1
 
@@ -53,4 +217,3 @@ login user 1
     "average_grade": 50
 }
 '''
-
@@ -0,0 +1,176 @@
+import re
+
+from sqlalchemy import and_, column, event, exists, func, not_, or_, table, text
+
+from db import db
+from models import StudentModel, SubjectModel, SubjectStudent
+
+'''
+Substring search over students and subjects.
+
+On SQLite every searchable column is indexed by an FTS5 table using the
+trigram tokenizer, so any substring of three characters or more is an index
+lookup instead of a scan. The FTS tables only hold the index ("external
+content"), triggers on the base tables keep them in step with every insert,
+update and delete. Terms shorter than three characters cannot use a trigram
+index and are checked with LIKE on the rows the longer terms matched, a query
+made only of such terms matches name prefixes only.
+
+Names starting with the query rank first (served by the lower(name) index),
+then the other matches. bm25 is not used: it has to score every match before
+the first page can be returned, which is most of the table for a common
+surname, and it adds little when the documents are names. Other databases use
+case-insensitive LIKE instead of FTS5 (PostgreSQL serves it from the pg_trgm
+indexes created by the migration).
+'''
+
+SEARCH_INDEXES = {
+    "students_fts": ("students", ["name", "email", "course"]),
+    "subjects_fts": ("subjects", ["name", "description"]),
+}
+
+MIN_TRIGRAM_LENGTH = 3
+
+
+def search_ddl(fts_table):
+    # Same objects as migration 7b2f0e5c9d31 creates, safe to run again on an existing database
+    base_table, columns = SEARCH_INDEXES[fts_table]
+    names = ", ".join(columns)
+    new = ", ".join(f"new.{name}" for name in columns)
+    old = ", ".join(f"old.{name}" for name in columns)
+
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table} USING fts5({names}, content='{base_table}', content_rowid='id', tokenize='trigram')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts_table}_ai AFTER INSERT ON {base_table} BEGIN "
+        f"INSERT INTO {fts_table}(rowid, {names}) VALUES (new.id, {new}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts_table}_ad AFTER DELETE ON {base_table} BEGIN "
+        f"INSERT INTO {fts_table}({fts_table}, rowid, {names}) VALUES ('delete', old.id, {old}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts_table}_au AFTER UPDATE OF {names} ON {base_table} BEGIN "
+        f"INSERT INTO {fts_table}({fts_table}, rowid, {names}) VALUES ('delete', old.id, {old}); "
+        f"INSERT INTO {fts_table}(rowid, {names}) VALUES (new.id, {new}); END",
+        # Index whatever the base table already holds
+        f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')",
+    ]
+
+
+def create_search_indexes(target, connection, **kw):
+    if connection.dialect.name != "sqlite":
+        return
+    for fts_table in SEARCH_INDEXES:
+        for statement in search_ddl(fts_table):
+            connection.execute(text(statement))
+
+
+def drop_search_indexes(target, connection, **kw):
+    if connection.dialect.name != "sqlite":
+        return
+    for fts_table in SEARCH_INDEXES:
+        connection.execute(text(f"DROP TABLE IF EXISTS {fts_table}"))
+
+
+# db.create_all() (tests, benchmarks) builds the same search tables the migration does
+event.listen(db.metadata, "after_create", create_search_indexes)
+event.listen(db.metadata, "before_drop", drop_search_indexes)
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    # Keep autogenerate from proposing to drop the FTS tables and their shadow tables
+    if type_ == "table" and reflected and compare_to is None:
+        return not name.startswith(tuple(SEARCH_INDEXES))
+    return True
+
+
+def escape_like(term):
+    return re.sub(r"([\\%_])", r"\\\1", term)
+
+
+def fts_query(terms):
+    # Every term is a quoted phrase, FTS5 ANDs them
+    return " ".join('"' + term.replace('"', '""') + '"' for term in terms)
+
+
+def prefix_range(column, prefix):
+    # lower(column) LIKE 'prefix%' written as a range so it is served by the lower(column) index
+    prefix = prefix.lower()
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    lowered = func.lower(column)
+    return and_(lowered >= prefix, lowered < upper)
+
+
+def substring_matches(model, fts_table, terms, query):
+    _, columns = SEARCH_INDEXES[fts_table]
+    long_terms = [term for term in terms if len(term) >= MIN_TRIGRAM_LENGTH]
+    short_terms = [term for term in terms if len(term) < MIN_TRIGRAM_LENGTH]
+
+    if db.engine.dialect.name == "sqlite":
+        fts = table(fts_table, column("rowid"))
+        query = query.join(fts, fts.c.rowid == model.id).filter(
+            text(f"{fts_table} MATCH :match").bindparams(match=fts_query(long_terms))
+        ).order_by(fts.c.rowid)
+    else:
+        short_terms = terms
+        query = query.order_by(model.id)
+
+    for term in short_terms:
+        pattern = "%" + escape_like(term) + "%"
+        query = query.filter(or_(*[getattr(model, name).ilike(pattern, escape="\\") for name in columns]))
+    return query
+
+
+def search(model, fts_table, q, filters=(), limit=20, offset=0):
+    # Names starting with the query come first in name order, then every other row containing all
+    # of its terms in id order. Both parts are read in index order and stop after offset + limit
+    # rows, so a page costs the same whether the query matches ten rows or half the table.
+    wanted = offset + limit
+    q = " ".join(q.split())
+    if not q:
+        return []
+
+    ids = db.session.query(model.id).filter(*filters)
+    is_prefix = prefix_range(model.name, q)
+
+    # likely() keeps SQLite from reading the prefix part through e.g. the course index, a fifth of the
+    # table, instead of walking the lower(name) index and stopping after `wanted` rows
+    prefixed = db.session.query(model.id).filter(is_prefix)
+    if filters:
+        prefixed = prefixed.filter(func.likely(and_(*filters)) if db.engine.dialect.name == "sqlite" else and_(*filters))
+    found = [row_id for row_id, in prefixed.order_by(func.lower(model.name), model.id).limit(wanted)]
+
+    # Terms under three characters cannot use the trigram index, those queries only match name prefixes
+    terms = q.split()
+    if len(found) < wanted and any(len(term) >= MIN_TRIGRAM_LENGTH for term in terms):
+        others = substring_matches(model, fts_table, terms, ids.filter(not_(is_prefix)))
+        found += [row_id for row_id, in others.limit(wanted - len(found))]
+
+    page = found[offset:wanted]
+    rows = {row.id: row for row in model.query.filter(model.id.in_(page))} if page else {}
+    return [rows[row_id] for row_id in page]
+
+
+def search_students(q, course=None, subject_id=None, limit=20, offset=0):
+    filters = []
+    if course is not None:
+        filters.append(StudentModel.course == course)
+    if subject_id is not None:
+        # Answered by the unique (student_id, term, subject_id) index
+        filters.append(exists().where(
+            SubjectStudent.student_id == StudentModel.id, SubjectStudent.in_term(), SubjectStudent.subject_id == subject_id
+        ))
+    return search(StudentModel, "students_fts", q, filters, limit, offset)
+
+
+def search_subjects(q, units=None, student_id=None, limit=20, offset=0):
+    filters = []
+    if units is not None:
+        filters.append(SubjectModel.units == units)
+    if student_id is not None:
+        filters.append(exists().where(
+            SubjectStudent.subject_id == SubjectModel.id, SubjectStudent.student_id == student_id, SubjectStudent.in_term()
+        ))
+    return search(SubjectModel, "subjects_fts", q, filters, limit, offset)
+
+
+def next_offset_headers(page, limit, offset):
+    if len(page) < limit:
+        return {}
+    return {"X-Next-Offset": str(offset + limit)}
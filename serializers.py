@@ -0,0 +1,139 @@
+'''
+Precompiled JSON serializers for the large list endpoints.
+
+compile_schema() reads a marshmallow schema's dump fields once and generates
+a plain Python function that writes the JSON text straight from the ORM
+objects: keys are sorted and encoded ahead of time, values go through the C
+string encoder and repr() like the json module does. dumps() writes byte for
+byte what the schema plus Flask's default JSON provider write in compact mode
+(sorted keys, compact separators, ASCII only). response() only uses it when
+that is what jsonify() would send: when the app pretty-prints (debug mode or
+app.json.compact = False) or has its own provider settings, it goes through
+schema.dump() and app.json.response() instead, so a route can switch over
+without clients noticing.
+
+Field types without a fast path fall back to the field's own serialize() and
+the app's JSON provider, so adding one to a schema never changes the output.
+'''
+import itertools
+from json.encoder import encode_basestring_ascii
+
+from flask import current_app
+from flask.json.provider import DefaultJSONProvider
+from marshmallow import fields
+
+_names = itertools.count()
+
+
+def encode_float(value):
+    # Same spelling as the json module for the special values
+    if value != value:
+        return "NaN"
+    if value in (float("inf"), float("-inf")):
+        return "Infinity" if value > 0 else "-Infinity"
+    return repr(value)
+
+
+def encode_fallback(value):
+    return current_app.json.dumps(value, separators=(",", ":"))
+
+
+def field_expression(field, value, namespace):
+    # Source for an expression turning `value` (an already fetched attribute) into JSON text
+    if isinstance(field, fields.Nested):
+        dump = compile_dump(field.schema, namespace)
+        if field.many or field.schema.many:
+            return f'("null" if {value} is None else "[" + ",".join(map({dump}, {value})) + "]")'
+        return f'("null" if {value} is None else {dump}({value}))'
+
+    if isinstance(field, fields.List):
+        item = f"item_{next(_names)}"
+        inner = field_expression(field.inner, item, namespace)
+        return f'("null" if {value} is None else "[" + ",".join([{inner} for {item} in {value}]) + "]")'
+
+    if is_fast(field):
+        if isinstance(field, fields.Str):
+            encoded = f"encode_str(str({value}))"
+        elif isinstance(field, fields.Float):
+            encoded = f"encode_float(float({value}))"
+        else:
+            encoded = f"str(int({value}))"
+        return f'("null" if {value} is None else {encoded})'
+
+    # Anything else inside a list is serialized exactly like the List field would
+    name = f"field_{next(_names)}"
+    namespace[name] = field
+    return f"encode_fallback({name}._serialize({value}, None, None))"
+
+
+def is_fast(field):
+    if isinstance(field, (fields.Nested, fields.List)):
+        return True
+    return isinstance(field, (fields.Str, fields.Float, fields.Int)) and not getattr(field, "as_string", False)
+
+
+def compile_dump(schema, namespace):
+    name = f"dump_{type(schema).__name__}_{next(_names)}"
+    dump_fields = sorted(
+        ((field.data_key or field_name, field) for field_name, field in schema.dump_fields.items()),
+        key=lambda entry: entry[0]
+    )
+
+    body, parts = [], []
+    for index, (key, field) in enumerate(dump_fields):
+        parts.append(repr(("," if index else "{") + encode_basestring_ascii(key) + ":"))
+
+        if is_fast(field):
+            body.append(f"    v{index} = obj.{field.attribute or field.name}")
+            parts.append(field_expression(field, f"v{index}", namespace))
+        else:
+            # Method fields, custom accessors and the like go through the schema's own field
+            field_ref = f"field_{next(_names)}"
+            namespace[field_ref] = field
+            parts.append(f"encode_fallback({field_ref}.serialize({field.name!r}, obj))")
+    parts.append('"}"' if dump_fields else '"{}"')
+
+    source = f"def {name}(obj):\n" + "\n".join(body) + f"\n    return {' + '.join(parts)}\n"
+    exec(source, namespace)
+    return name
+
+
+def jsonify_is_compact(app):
+    # Whether app.json.response() would write what dumps() writes
+    json = app.json
+    if type(json) is not DefaultJSONProvider or not json.sort_keys or not json.ensure_ascii:
+        return False
+    return json.compact if json.compact is not None else not app.debug
+
+
+class CompiledSerializer:
+    def __init__(self, schema):
+        namespace = {
+            "encode_str": encode_basestring_ascii,
+            "encode_float": encode_float,
+            "encode_fallback": encode_fallback,
+        }
+        self.schema = schema
+        self.many = schema.many
+        self._dump = namespace[compile_dump(schema, namespace)]
+
+    def dumps(self, obj):
+        if self.many:
+            return "[" + ",".join(map(self._dump, obj)) + "]"
+        return self._dump(obj)
+
+    def response(self, obj, status=200, headers=None):
+        if not jsonify_is_compact(current_app):
+            response = current_app.json.response(self.schema.dump(obj))
+            response.status_code = status
+            response.headers.extend(headers or {})
+            return response
+
+        # Trailing newline like Flask's own JSON responses
+        return current_app.response_class(
+            self.dumps(obj) + "\n", status=status, headers=headers, mimetype=current_app.json.mimetype
+        )
+
+
+def compile_schema(schema):
+    return CompiledSerializer(schema)
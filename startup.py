@@ -0,0 +1,104 @@
+import json
+import os
+
+import click
+import flask
+import flask_smorest
+from flask_smorest.spec import openapi_cli
+
+'''
+Startup-optimized mode (FAST_STARTUP), for autoscaled workers and short-lived
+containers where every worker start is paid for before it serves anything.
+
+With it on, create_app:
+
+- serves the OpenAPI document from OPENAPI_SPEC_FILE instead of building it
+  from every route and schema, which is most of create_app's own time. The
+  file is a build artifact, written from a normal start with
+
+      flask --app app openapi write instance/openapi.json
+
+  and must be rewritten whenever a route or schema changes.
+- does not import Flask-Migrate and alembic, the largest import of a start.
+  A server process never runs migrations, `flask db` loads them when it is
+  invoked.
+- does not read .env, the environment comes from the container.
+
+Api replaces private parts of flask-smorest (_init_spec, _openapi_json and
+the blp_name_to_api registry), which is why requirements.txt pins its
+version. tests/test_startup.py checks both modes against each other, run it
+before moving the pin.
+
+Password hashing backends are loaded on first use in either mode, see
+hashing.py. `python -m benchmarks.bench_startup` reports import times and the
+time to first request of both modes.
+'''
+
+
+class PrecomputedSpec:
+    # Stands in for the apispec.APISpec flask-smorest builds, the doc pages and `flask openapi` only need these
+    def __init__(self, path, title):
+        self.path = path
+        self.title = title
+
+    def to_dict(self):
+        with open(self.path, encoding="utf-8") as file:
+            return json.load(file)
+
+
+class Api(flask_smorest.Api):
+    def init_app(self, app, *, spec_kwargs=None):
+        self.spec_file = app.config.setdefault("OPENAPI_SPEC_FILE", None)
+        if self.spec_file is not None:
+            self.spec_file = os.path.abspath(self.spec_file)
+            if not os.path.exists(self.spec_file):
+                raise RuntimeError(
+                    f"OpenAPI spec {self.spec_file} not found, write it with "
+                    f"`flask --app app openapi write {self.spec_file}` without FAST_STARTUP"
+                )
+        super().init_app(app, spec_kwargs=spec_kwargs)
+
+    def _init_spec(self, **kwargs):
+        if self.spec_file is None:
+            return super()._init_spec(**kwargs)
+
+        self.spec = PrecomputedSpec(self.spec_file, self.config.get("API_TITLE"))
+        self._app.cli.add_command(openapi_cli)
+
+    def register_blueprint(self, blp, *, parameters=None, **options):
+        if self.spec_file is None:
+            return super().register_blueprint(blp, parameters=parameters, **options)
+
+        # What flask-smorest does without documenting the views
+        self._app.extensions["flask-smorest"]["blp_name_to_api"][options.get("name", blp.name)] = self
+        self._app.register_blueprint(blp, **options)
+
+    def _openapi_json(self):
+        if self.spec_file is None:
+            return super()._openapi_json()
+        return flask.send_file(self.spec_file, mimetype="application/json")
+
+
+class MigrationCommands(click.Group):
+    # Stands in for Flask-Migrate's `db` group, which takes over once `flask db ...` is invoked
+    def __init__(self, app, db, kwargs):
+        super().__init__("db", help="Perform database migrations.")
+        self.app = app
+        self.db = db
+        self.kwargs = kwargs
+
+    def make_context(self, info_name, args, parent=None, **extra):
+        from flask_migrate.cli import db as commands
+
+        if "migrate" not in self.app.extensions:
+            init_migrations(self.app, self.db, lazy=False, **self.kwargs)
+        return commands.make_context(info_name, args, parent=parent, **extra)
+
+
+def init_migrations(app, db, lazy=None, **kwargs):
+    if app.config["FAST_STARTUP"] if lazy is None else lazy:
+        app.cli.add_command(MigrationCommands(app, db, kwargs))
+        return None
+
+    from flask_migrate import Migrate
+    return Migrate(app, db, **kwargs)
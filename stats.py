@@ -0,0 +1,138 @@
+import math
+
+from sqlalchemy import select
+
+from db import db
+from models import SubjectModel, SubjectStudent
+
+PERIODS = ("prelims_grade", "midterms_grade", "finals_grade", "average_grade")
+PERCENTILES = (10, 25, 50, 75, 90)
+
+STREAM_CHUNK_SIZE = 1000
+
+
+class GradeStats:
+    '''
+    Single-pass accumulator for one column of grades.
+
+    Moments use Welford's update. Quantiles and the histogram come from a
+    frequency sketch of the values rounded to the grades' own precision, which
+    stays bounded by the number of distinct grades however many rows are fed in.
+    '''
+
+    def __init__(self, precision=2):
+        self.precision = precision
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = None
+        self.max = None
+        self.frequencies = {}
+
+    def add(self, value):
+        if value is None:
+            return
+
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+        key = round(value, self.precision)
+        self.frequencies[key] = self.frequencies.get(key, 0) + 1
+
+    def quantiles(self, fractions):
+        # Linear interpolation between closest ranks, like statistics.quantiles(method="inclusive")
+        if not self.count:
+            return [None for _ in fractions]
+
+        values = sorted(self.frequencies.items())
+        results = []
+        for fraction in fractions:
+            position = (self.count - 1) * fraction
+            lower = self._value_at(values, math.floor(position))
+            upper = self._value_at(values, math.ceil(position))
+            results.append(round(lower + (upper - lower) * (position - math.floor(position)), self.precision))
+        return results
+
+    def histogram(self, bucket_size):
+        buckets = {}
+        for value, frequency in self.frequencies.items():
+            start = math.floor(value / bucket_size) * bucket_size
+            buckets[start] = buckets.get(start, 0) + frequency
+
+        return [
+            {"start": start, "end": start + bucket_size, "count": count}
+            for start, count in sorted(buckets.items())
+        ]
+
+    def summary(self, bucket_size):
+        median, *_ = self.quantiles([0.5])
+        percentiles = self.quantiles([p / 100 for p in PERCENTILES])
+
+        return {
+            "count": self.count,
+            "mean": round(self.mean, self.precision) if self.count else None,
+            "median": median,
+            "std_dev": round(math.sqrt(self.m2 / self.count), self.precision) if self.count else None,
+            "min": self.min,
+            "max": self.max,
+            "percentiles": {f"p{p}": value for p, value in zip(PERCENTILES, percentiles)},
+            "histogram": self.histogram(bucket_size),
+        }
+
+    @staticmethod
+    def _value_at(values, rank):
+        seen = 0
+        for value, frequency in values:
+            seen += frequency
+            if rank < seen:
+                return value
+        return values[-1][0]
+
+
+def stream_grades(subject_id=None):
+    # Plain row tuples straight off the cursor, no model objects are built
+    query = select(SubjectStudent.subject_id, *[getattr(SubjectStudent, period) for period in PERIODS]).where(SubjectStudent.in_term())
+    if subject_id is not None:
+        query = query.where(SubjectStudent.subject_id == subject_id)
+
+    return db.session.execute(query.execution_options(yield_per=STREAM_CHUNK_SIZE))
+
+
+def collect_stats(rows):
+    # subject_id -> (enrolment count, one GradeStats per period)
+    accumulators = {}
+    for subject_id, *grades in rows:
+        if subject_id not in accumulators:
+            accumulators[subject_id] = [0, [GradeStats() for _ in PERIODS]]
+
+        accumulator = accumulators[subject_id]
+        accumulator[0] += 1
+        for period_stats, grade in zip(accumulator[1], grades):
+            period_stats.add(grade)
+
+    return accumulators
+
+
+def subject_summary(subject, accumulator, bucket_size):
+    enrolled, period_stats = accumulator or (0, [GradeStats() for _ in PERIODS])
+
+    summary = {"subject_id": subject.id, "name": subject.name, "enrolled": enrolled}
+    for period, stats in zip(PERIODS, period_stats):
+        summary[period] = stats.summary(bucket_size)
+    return summary
+
+
+def subject_stats(subject, bucket_size=10):
+    accumulators = collect_stats(stream_grades(subject.id))
+    return subject_summary(subject, accumulators.get(subject.id), bucket_size)
+
+
+def all_subject_stats(bucket_size=10):
+    accumulators = collect_stats(stream_grades())
+    subjects = db.session.query(SubjectModel.id, SubjectModel.name).order_by(SubjectModel.id)
+    return [subject_summary(subject, accumulators.get(subject.id), bucket_size) for subject in subjects]
@@ -0,0 +1,111 @@
+import csv
+import json
+from marshmallow import EXCLUDE, ValidationError
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+
+from db import db
+from hashing import password_hasher
+from models import StudentModel
+from schemas import PlainStudentSchema
+
+CHUNK_SIZE = 500
+
+
+def read_student_rows(stream, format="csv"):
+    # Lazily yields one dict per line so the whole file is never held in memory
+    if format == "csv":
+        for row in csv.DictReader(stream):
+            # Blank cells count as missing so the schema reports them as required
+            yield {key.strip(): value for key, value in row.items() if key and value not in (None, "")}
+    elif format == "ndjson":
+        for line in stream:
+            line = line.strip()
+            if line:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # Left to the schema, which rejects it as an invalid input type
+                    yield line
+    else:
+        raise ValueError(f"Unsupported import format: {format}")
+
+
+def chunked(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class StudentImporter:
+    def __init__(self, chunk_size=CHUNK_SIZE, progress=None):
+        self.chunk_size = chunk_size
+        self.progress = progress
+        self.schema = PlainStudentSchema(unknown=EXCLUDE)
+
+    def run(self, rows):
+        report = {"processed": 0, "created": 0, "errors": []}
+
+        for chunk in chunked(enumerate(rows), self.chunk_size):
+            report["created"] += self.import_chunk(chunk, report["errors"])
+            report["processed"] += len(chunk)
+
+            if self.progress is not None:
+                self.progress(report)
+
+        report["errors"].sort(key=lambda error: error["row"])
+        return report
+
+    def import_chunk(self, chunk, errors):
+        valid = {}
+        for index, row in chunk:
+            try:
+                data = self.schema.load(row)
+            except ValidationError as err:
+                errors.append({"row": index, "email": row.get("email") if isinstance(row, dict) else None, "errors": err.messages})
+                continue
+
+            if data["email"] in valid:
+                errors.append({"row": index, "email": data["email"], "errors": {"email": ["Duplicate email in import."]}})
+                continue
+            valid[data["email"]] = (index, data)
+
+        # One IN query per chunk instead of one lookup per student
+        existing = {email for email, in db.session.query(StudentModel.email).filter(StudentModel.email.in_(list(valid)))}
+        for email in existing:
+            index, _ = valid.pop(email)
+            errors.append({"row": index, "email": email, "errors": {"email": ["A student with that email already exists."]}})
+
+        if not valid:
+            return 0
+
+        entries = list(valid.values())
+        hashes = password_hasher.hash_many(data["password"] for _, data in entries)
+        students = [
+            {"name": data["name"], "email": data["email"], "password": password_hash, "course": data["course"], "batch": data["batch"]}
+            for (_, data), password_hash in zip(entries, hashes)
+        ]
+
+        try:
+            db.session.execute(insert(StudentModel), students)
+            db.session.commit()
+            return len(students)
+        except IntegrityError:
+            db.session.rollback()
+
+        # Someone registered one of these emails mid-import, retry row by row to find it
+        created = 0
+        for (index, data), student in zip(entries, students):
+            try:
+                db.session.execute(insert(StudentModel), [student])
+                db.session.commit()
+                created += 1
+            except IntegrityError:
+                db.session.rollback()
+                errors.append({"row": index, "email": data["email"], "errors": {"email": ["A student with that email already exists."]}})
+        return created
@@ -0,0 +1,32 @@
+from flask import current_app
+from sqlalchemy import bindparam
+
+'''
+Academic terms.
+
+Every enrolment belongs to a term, CURRENT_TERM is the one being taught.
+Enrolling, dropping, grades, seats, rankings, averages and the students and
+subjects listed on each other only look at the current term; the transcript
+and the grade history look at every term. Current-term queries are served by
+the unique (student_id, term, subject_id) and the (subject_id, term,
+average_grade) indexes, so a student's or a subject's past terms are never
+scanned.
+
+Starting a term is a configuration change: set CURRENT_TERM to the new term
+and run `flask subjects recount` so every subject's seat count starts from
+the new term's (empty) enrolments and the closed term's waitlists are
+dropped. Closed terms are then moved out of the database with `flask terms
+archive`, see archive.py. Enrolments and waitlist entries made before terms
+existed are in DEFAULT_TERM.
+'''
+
+DEFAULT_TERM = "default"
+
+
+def current_term():
+    return current_app.config["CURRENT_TERM"]
+
+
+def current_term_param():
+    # Evaluated when the statement runs, so cached statements and relationship loaders follow CURRENT_TERM
+    return bindparam("current_term", callable_=current_term)
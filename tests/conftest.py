@@ -0,0 +1,70 @@
+import os
+import tempfile
+
+import pytest
+
+# Set before any app is created, asgi.py creates its own at import
+_directory = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(_directory, "test.db")
+os.environ["ARCHIVE_DATABASE_URL"] = "sqlite:///" + os.path.join(_directory, "archive.db")
+os.environ["EXPORT_DIR"] = os.path.join(_directory, "exports")
+os.environ["JWT_SECRET_KEY"] = "test-secret-key-long-enough-for-hs256"
+os.environ["PASSWORD_HASH_ROUNDS"] = "1000"
+os.environ["TRANSCRIPT_REFRESH_ASYNC"] = "false"
+os.environ["GRADE_HISTORY_ASYNC"] = "false"
+# One process, the per-process cache sees every invalidation
+os.environ["CACHE_BACKEND"] = "lru"
+
+from app import create_app
+from db import db
+
+
+def prepare(app):
+    # Identities are student ids, which PyJWT only accepts as "sub" without this
+    app.config["JWT_VERIFY_SUB"] = False
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+    return app
+
+
+@pytest.fixture
+def app():
+    return prepare(create_app())
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def register(client, name, email, password="secret"):
+    client.post("/register", json={"name": name, "email": email, "password": password, "course": "CS"})
+    token = client.post("/login", json={"email": email, "password": password}).get_json()["access_token"]
+    return {"Authorization": "Bearer " + token}
+
+
+@pytest.fixture
+def admin(client):
+    # Student 1 is the admin
+    return register(client, "Admin", "admin@example.com")
+
+
+@pytest.fixture
+def student(client, admin):
+    return register(client, "Student", "student@example.com")
+
+
+def enrol_in_subjects(client, admin, student, count=5):
+    ids = []
+    for number in range(1, count + 1):
+        response = client.post("/subject", json={"name": f"Subject {number}", "description": f"Description {number}", "units": 3}, headers=admin)
+        ids.append(response.get_json()["id"])
+        client.post(f"/student/subject/{ids[-1]}", headers=student)
+        client.put(f"/student/subject/{ids[-1]}/grades", json={"prelims_grade": 80 + number}, headers=student)
+    return ids
+
+
+@pytest.fixture
+def subjects(client, admin, student):
+    return enrol_in_subjects(client, admin, student)
@@ -0,0 +1,50 @@
+import pytest
+
+from archive import archive_term, term_counts
+from db import db
+from models import ArchivedEnrolmentModel, ArchivedGradeHistoryModel, GradeHistoryModel, SubjectStudent
+from tests.conftest import enrol_in_subjects
+from transcripts import refresh_transcript
+
+
+class Interrupted(Exception):
+    pass
+
+
+def interrupt(archived):
+    raise Interrupted
+
+
+def test_interrupted_archive_resumes(app, client, admin, student):
+    app.config["CURRENT_TERM"] = "2025-1"
+    subject_ids = enrol_in_subjects(client, admin, student)
+    app.config["CURRENT_TERM"] = "2025-2"
+
+    with app.app_context():
+        enrolment_ids = sorted(db.session.scalars(db.select(SubjectStudent.id)))
+        history_ids = sorted(db.session.scalars(db.select(GradeHistoryModel.id)))
+        student_id = db.session.scalar(db.select(SubjectStudent.student_id))
+
+        with pytest.raises(Interrupted):
+            archive_term("2025-1", chunk_size=2, progress=interrupt)
+        assert term_counts()["2025-1"] == {"enrolments": 3, "archived": 2}
+
+        assert archive_term("2025-1", chunk_size=2)["enrolments"] == 3
+        assert term_counts()["2025-1"] == {"enrolments": 0, "archived": 5}
+        assert sorted(db.session.scalars(db.select(ArchivedEnrolmentModel.id))) == enrolment_ids
+        assert sorted(db.session.scalars(db.select(ArchivedGradeHistoryModel.id))) == history_ids
+
+        # Built from the archive alone now
+        refresh_transcript(student_id)
+        db.session.commit()
+
+        with pytest.raises(ValueError):
+            archive_term("2025-2")
+
+    transcript = client.get("/student/transcript", headers=student).get_json()
+    assert [(entry["subject"]["id"], entry["term"]) for entry in transcript["subjects"]] == [(subject_id, "2025-1") for subject_id in subject_ids]
+
+    for subject_id in subject_ids:
+        response = client.get(f"/student/subject/{subject_id}/grades/history?term=2025-1", headers=student)
+        assert response.status_code == 200
+        assert [change["field"] for change in response.get_json()] == ["prelims_grade"]
@@ -0,0 +1,132 @@
+import asyncio
+import contextvars
+
+import pytest
+
+from tests.conftest import prepare, register
+
+# Path and the status the enrolled student gets: enrolled, subject not enrolled in, no such subject
+PATHS = [
+    ("/student/subjects/grades", 200),
+    ("/student/subjects", 200),
+    ("/student/subject/1/grades", 200),
+    ("/student/subject/2/grades", 400),
+    ("/student/subject/9/grades", 404),
+    ("/student/subject/1", 200),
+    ("/student/subject/2", 400),
+    ("/student/subject/6", 404),
+]
+# Set by the server or different on every response
+VOLATILE_HEADERS = {"date", "server", "server-timing"}
+
+
+@pytest.fixture
+def asgi():
+    import asgi
+
+    prepare(asgi.flask_app)
+    return asgi
+
+
+async def asgi_request(application, method, path, headers, body=b""):
+    scope = {
+        "type": "http", "http_version": "1.1", "method": method, "scheme": "http", "path": path, "root_path": "",
+        "query_string": b"", "server": ("localhost", 80), "client": ("127.0.0.1", 1024),
+        "headers": [(name.lower().encode(), value.encode()) for name, value in headers.items()],
+    }
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    await application(scope, receive, send)
+    start = messages[0]
+    body = b"".join(message.get("body", b"") for message in messages[1:])
+    return start["status"], {name.decode(): value.decode() for name, value in start["headers"]}, body
+
+
+def asgi_get(application, path, headers):
+    return asyncio.run(asgi_request(application, "GET", path, headers))
+
+
+def wsgi_get(client, path, headers):
+    response = client.get(path, headers=headers)
+    return response.status_code, {name.lower(): value for name, value in response.headers.items()}, response.get_data()
+
+
+def without_volatile(headers):
+    return {name: value for name, value in headers.items() if name not in VOLATILE_HEADERS}
+
+
+def test_native_routes_answer_like_flask(asgi):
+    client = asgi.flask_app.test_client()
+    admin = register(client, "Admin", "admin@example.com")
+    student = register(client, "Student", "student@example.com")
+    for number in range(1, 6):
+        client.post("/subject", json={"name": f"Subject {number}", "description": f"Description {number}", "units": 3}, headers=admin)
+    client.post("/student/subject/1", headers=student)
+    client.put("/student/subject/1/grades", json={"prelims_grade": 90}, headers=student)
+
+    for path, status in PATHS:
+        assert wsgi_get(client, path, student)[0] == status, path
+
+    for headers in (student, {**student, "Origin": "https://example.com"}, {}, {"Authorization": "Bearer nope"}):
+        for path, _ in PATHS:
+            # Both orders, so a cached entry stored by either entry point is served by the other
+            for first, second in ((wsgi_get, asgi_get), (asgi_get, wsgi_get)):
+                status, response_headers, body = first(client if first is wsgi_get else asgi.application, path, headers)
+                other_status, other_headers, other_body = second(client if second is wsgi_get else asgi.application, path, headers)
+                assert (other_status, without_volatile(other_headers), other_body) == (status, without_volatile(response_headers), body), path
+
+
+def test_native_routes_answer_if_none_match(asgi):
+    client = asgi.flask_app.test_client()
+    student = register(client, "Student", "student@example.com")
+    client.post("/subject", json={"name": "Subject", "description": "", "units": 3})
+    client.post("/student/subject/1", headers=student)
+
+    for path in ("/student/subjects/grades", "/student/subjects"):
+        status, headers, _ = asgi_get(asgi.application, path, student)
+        assert status == 200 and "etag" in headers
+
+        conditional = {**student, "If-None-Match": headers["etag"]}
+        assert asgi_get(asgi.application, path, conditional)[0] == 304
+        assert wsgi_get(client, path, conditional)[0] == 304
+
+
+def test_native_routes_follow_current_term(asgi):
+    client = asgi.flask_app.test_client()
+    student = register(client, "Student", "student@example.com")
+    client.post("/subject", json={"name": "Subject", "description": "", "units": 3})
+    client.post("/student/subject/1", headers=student)
+
+    asgi.flask_app.config["CURRENT_TERM"] = "next"
+    try:
+        assert asgi_get(asgi.application, "/student/subjects", student)[2] == b"[]\n"
+        assert asgi_get(asgi.application, "/student/subject/1", student)[0] == 400
+    finally:
+        asgi.flask_app.config["CURRENT_TERM"] = "default"
+
+
+def test_writes_leave_the_connection_context_alone(asgi):
+    client = asgi.flask_app.test_client()
+    admin = register(client, "Admin", "admin@example.com")
+    student = register(client, "Student", "student@example.com")
+    for number in range(1, 4):
+        client.post("/subject", json={"name": f"Subject {number}", "description": f"Description {number}", "units": 3}, headers=admin)
+
+    async def requests():
+        # uvicorn starts the next request of a keep-alive connection from the context the previous one left
+        before = dict(contextvars.copy_context())
+        statuses = []
+        for number in range(1, 4):
+            statuses.append((await asgi_request(asgi.application, "POST", f"/student/subject/{number}", student))[0])
+            body = b'{"prelims_grade": 90}'
+            grade = {**student, "Content-Type": "application/json", "Content-Length": str(len(body))}
+            statuses.append((await asgi_request(asgi.application, "PUT", f"/student/subject/{number}/grades", grade, body))[0])
+        return statuses, dict(contextvars.copy_context()) == before
+
+    assert asyncio.run(requests()) == ([201, 200] * 3, True)
@@ -0,0 +1,50 @@
+import pytest
+
+from cache import response_cache
+
+# The cached GET routes, primed before every write
+CACHED = ["/subjects", "/subject/1", "/student/subjects", "/student/subjects/grades"]
+
+# Write -> the cached routes whose answer it changes, subject 6 exists and nobody is enrolled in it
+WRITES = [
+    ("create subject", lambda client, admin, student: client.post("/subject", json={"name": "Subject 7", "description": "Description 7", "units": 3}, headers=admin), {"/subjects"}),
+    ("delete subject", lambda client, admin, student: client.delete("/subject/1"), set(CACHED)),
+    ("set capacity", lambda client, admin, student: client.put("/subject/1/capacity", json={"capacity": 10}, headers=admin), {"/subjects", "/subject/1"}),
+    ("update grade", lambda client, admin, student: client.put("/student/subject/1/grades", json={"finals_grade": 75}, headers=student), {"/student/subjects/grades"}),
+    ("bulk grades", lambda client, admin, student: client.post("/subject/1/grades/bulk", json=[{"student_id": 2, "finals_grade": 75}], headers=admin), {"/student/subjects/grades"}),
+    ("enrol", lambda client, admin, student: client.post("/student/subject/6", headers=student), {"/subjects", "/student/subjects", "/student/subjects/grades"}),
+    ("unenrol", lambda client, admin, student: client.delete("/student/subject/1", headers=student), set(CACHED)),
+    ("delete account", lambda client, admin, student: client.delete("/student", headers=student), set(CACHED)),
+]
+
+
+def answer(response):
+    return response.status_code, response.get_data()
+
+
+def uncached(client, path, headers, monkeypatch):
+    with monkeypatch.context() as patch:
+        patch.setattr(response_cache, "backend", None)
+        return answer(client.get(path, headers=headers))
+
+
+@pytest.mark.parametrize("name, write, changed", WRITES, ids=[name for name, _, _ in WRITES])
+def test_writes_invalidate_cached_reads(client, admin, student, subjects, monkeypatch, name, write, changed):
+    client.post("/subject", json={"name": "Subject 6", "description": "Description 6", "units": 3}, headers=admin)
+
+    primed = {}
+    for path in CACHED:
+        response = client.get(path, headers=student)
+        assert client.get(path, headers=student).headers["ETag"] == response.headers["ETag"]
+        primed[path] = response
+
+    assert write(client, admin, student).status_code < 300
+
+    for path in CACHED:
+        response = client.get(path, headers=student)
+        assert answer(response) == uncached(client, path, student, monkeypatch), path
+        if path in changed:
+            assert answer(response) != answer(primed[path]), path
+            assert response.headers.get("ETag") != primed[path].headers["ETag"], path
+        else:
+            assert answer(response) == answer(primed[path]), path
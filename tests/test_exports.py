@@ -0,0 +1,84 @@
+import os
+import time
+from datetime import timedelta
+
+from db import db
+from exports import export_runner, utcnow
+from models import ExportJobModel
+
+
+def add_job(status, created_ago, finished_ago=None, path=None, heartbeat_ago=None):
+    now = utcnow()
+    job = ExportJobModel(
+        format="csv", status=status, rows=0, path=path, created_at=now - timedelta(seconds=created_ago),
+        heartbeat_at=None if heartbeat_ago is None else now - timedelta(seconds=heartbeat_ago),
+        finished_at=None if finished_ago is None else now - timedelta(seconds=finished_ago)
+    )
+    db.session.add(job)
+    db.session.commit()
+    return job.id
+
+
+def test_cleanup_fails_interrupted_jobs_and_deletes_expired_ones(app):
+    os.makedirs(export_runner.directory, exist_ok=True)
+    expired_file = os.path.join(export_runner.directory, "grades-old.csv")
+    kept_file = os.path.join(export_runner.directory, "grades-new.csv")
+    stale_part = os.path.join(export_runner.directory, "grades-stale.csv.part")
+    fresh_part = os.path.join(export_runner.directory, "grades-fresh.csv.part")
+    for path in (expired_file, kept_file, stale_part, fresh_part):
+        open(path, "w").close()
+    old = time.time() - export_runner.timeout - 60
+    os.utime(stale_part, (old, old))
+
+    with app.app_context():
+        interrupted = add_job("running", export_runner.timeout + 60)
+        running = add_job("running", 60)
+        long_running = add_job("running", export_runner.timeout * 3, heartbeat_ago=60)
+        expired = add_job("done", export_runner.retention + 120, export_runner.retention + 60, expired_file)
+        kept = add_job("done", 120, 60, kept_file)
+
+        assert export_runner.cleanup() == (1, 1)
+
+        assert db.session.get(ExportJobModel, interrupted).status == "failed"
+        assert db.session.get(ExportJobModel, running).status == "running"
+        assert db.session.get(ExportJobModel, long_running).status == "running"
+        assert db.session.get(ExportJobModel, expired) is None
+        assert db.session.get(ExportJobModel, kept).status == "done"
+
+    assert not os.path.exists(expired_file) and not os.path.exists(stale_part)
+    assert os.path.exists(kept_file) and os.path.exists(fresh_part)
+
+
+def test_cleanup_skips_jobs_this_process_runs(app, monkeypatch):
+    with app.app_context():
+        queued = add_job("queued", export_runner.timeout + 60, heartbeat_ago=export_runner.timeout + 60)
+        monkeypatch.setattr(export_runner, "_in_flight", {queued})
+
+        assert export_runner.cleanup() == (0, 0)
+        assert db.session.get(ExportJobModel, queued).status == "queued"
+
+
+def test_failed_job_is_not_started(app):
+    with app.app_context():
+        failed = add_job("failed", export_runner.timeout + 60, finished_ago=60)
+
+    export_runner.run(failed)
+
+    with app.app_context():
+        job = db.session.get(ExportJobModel, failed)
+        assert (job.status, job.path) == ("failed", None)
+
+
+def test_export_moves_its_heartbeat(app, subjects, monkeypatch):
+    monkeypatch.setattr(export_runner, "chunk_size", 1)
+    monkeypatch.setattr(export_runner, "heartbeat_interval", 0)
+    with app.app_context():
+        queued = add_job("queued", export_runner.timeout + 60, heartbeat_ago=export_runner.timeout + 60)
+
+    export_runner.run(queued)
+
+    with app.app_context():
+        job = db.session.get(ExportJobModel, queued)
+        assert (job.status, job.rows) == ("done", len(subjects))
+        assert job.heartbeat_at > utcnow() - timedelta(seconds=60)
+        os.remove(job.path)
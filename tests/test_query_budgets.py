@@ -0,0 +1,43 @@
+import pytest
+
+from app import create_app
+from cache import response_cache
+from profiler import query_budget
+from tests.conftest import enrol_in_subjects, prepare, register
+
+# Statements per request. Every budget is independent of the number of enrolments,
+# a route going over it is most likely loading rows one at a time again.
+BUDGETS = [
+    ("get", "/student/subjects/grades", None, 1),
+    ("get", "/student/subject/1/grades", None, 1),
+    ("put", "/student/subject/1/grades", {"finals_grade": 90}, 11),
+    ("get", "/student/subjects", None, 1),
+    ("get", "/student/subject/1", None, 1),
+    ("post", "/student/subject/{new}", None, 14),
+    ("delete", "/student/subject/1", None, 11),
+    ("get", "/student/average", None, 1),
+    ("get", "/student/transcript", None, 1),
+]
+
+
+def count_statements(enrolments, method, path, body, budget):
+    app = prepare(create_app())
+    client = app.test_client()
+    admin = register(client, "Admin", "admin@example.com")
+    student = register(client, "Student", "student@example.com")
+    enrol_in_subjects(client, admin, student, count=enrolments)
+    new = client.post("/subject", json={"name": "New subject", "description": "New description", "units": 3}, headers=admin)
+
+    with app.app_context(), query_budget(budget) as capture:
+        response = getattr(client, method)(path.format(new=new.get_json()["id"]), json=body, headers=student)
+    assert response.status_code < 300
+    return capture.count
+
+
+@pytest.mark.parametrize("method, path, body, budget", BUDGETS)
+def test_query_budget(monkeypatch, method, path, body, budget):
+    # Cache hits would make the counts vary
+    monkeypatch.setattr(response_cache, "backend", None)
+
+    counts = [count_statements(enrolments, method, path, body, budget) for enrolments in (1, 20)]
+    assert counts[0] == counts[1]
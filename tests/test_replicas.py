@@ -0,0 +1,82 @@
+import sqlite3
+import time
+
+import pytest
+from flask_jwt_extended import create_access_token
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from app import create_app
+from db import db
+from models import StudentModel, SubjectModel
+from replicas import SQLiteReplicator, replica_router
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATABASE_REPLICA_URLS", "sqlite:///" + str(tmp_path / "replica.db"))
+    monkeypatch.setenv("REPLICA_STICKY_SECONDS", "0.5")
+    app = create_app()
+    app.config["JWT_VERIFY_SUB"] = False
+
+    with app.app_context():
+        # The replica is query_only, only the primary is created, then copied over
+        db.drop_all(bind_key=None)
+        db.create_all(bind_key=None)
+        for number in (1, 2):
+            db.session.add(StudentModel(name=f"Primary {number}", email=f"student{number}@example.com", password=f"unused-{number}", course="CS"))
+        db.session.add(SubjectModel(name="Subject", description="Description", units=3))
+        db.session.commit()
+
+        SQLiteReplicator(db.engine.url.database, [db.engines["replica_1"].url.database]).sync()
+
+    # Lets the tests tell which database answered
+    with sqlite3.connect(tmp_path / "replica.db") as replica:
+        replica.execute("UPDATE students SET name = replace(name, 'Primary', 'Replica')")
+    yield app
+
+    # db keeps a metadata per bind key across apps, the next app's create_all would look for this bind
+    db.metadatas.pop("replica_1", None)
+
+
+def headers_for(app, student_id):
+    with app.app_context():
+        return {"Authorization": "Bearer " + create_access_token(identity=student_id)}
+
+
+def test_get_reads_the_replica(app):
+    response = app.test_client().get("/student", headers=headers_for(app, 1))
+    assert response.get_json()["name"] == "Replica 1"
+
+
+def test_write_inside_a_get_goes_to_the_primary(app):
+    with app.test_request_context("/student", method="GET"):
+        assert db.session.get(StudentModel, 1).name == "Replica 1"
+
+        db.session.add(SubjectModel(name="Written", description="Written during a GET", units=3))
+        db.session.commit()
+
+        # The rest of the request follows the write
+        db.session.expire_all()
+        assert db.session.get(StudentModel, 1).name == "Primary 1"
+
+    with app.app_context():
+        assert SubjectModel.query.filter_by(name="Written").count() == 1
+
+
+def test_reads_follow_the_primary_after_a_write(app):
+    client = app.test_client()
+    student, other = headers_for(app, 1), headers_for(app, 2)
+
+    assert client.post("/student/subject/1", headers=student).status_code == 201
+    assert client.get("/student", headers=student).get_json()["name"] == "Primary 1"
+    assert client.get("/student", headers=other).get_json()["name"] == "Replica 2"
+
+    time.sleep(replica_router.stickiness.window)
+    assert client.get("/student", headers=student).get_json()["name"] == "Replica 1"
+
+
+def test_write_reaching_the_replica_fails(app):
+    with app.app_context(), db.engines["replica_1"].connect() as connection:
+        with pytest.raises(OperationalError, match="readonly"):
+            connection.execute(text("UPDATE students SET name = 'Diverged'"))
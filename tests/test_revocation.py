@@ -0,0 +1,33 @@
+import uuid
+
+from db import db
+from models import BlocklistModel
+from revocation import revocation_cache
+
+
+def test_logged_out_token_is_rejected(client, student):
+    assert client.get("/student", headers=student).status_code == 200
+    assert client.post("/logout", headers=student).status_code == 200
+    assert client.get("/student", headers=student).status_code == 401
+
+
+def test_refresh_picks_up_revocations_from_other_workers(app, client, student):
+    assert client.get("/student", headers=student).status_code == 200
+
+    # Revoked by another process, the row is only in the table
+    jti = str(uuid.uuid4())
+    with app.app_context():
+        db.session.add(BlocklistModel(jti=jti))
+        db.session.commit()
+        revocation_cache.refresh()
+        assert revocation_cache.is_revoked(jti)
+
+
+def test_init_app_forgets_the_previous_database(app):
+    with app.app_context():
+        revocation_cache.revoke("stale-jti")
+    revocation_cache.init_app(app)
+    with app.app_context():
+        db.session.query(BlocklistModel).delete()
+        db.session.commit()
+        assert not revocation_cache.is_revoked("stale-jti")
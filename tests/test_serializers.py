@@ -0,0 +1,30 @@
+from flask import g, jsonify
+from marshmallow import Schema
+
+from models import SubjectStudent
+from profiler import RequestProfile, serialization_methods, time_schema_dumps
+from resources.student import grades_serializer
+from schemas import GradeSchema
+
+
+def test_compiled_response_matches_jsonify(app, subjects):
+    for debug in (False, True):
+        app.debug = debug
+        with app.test_request_context():
+            enrolments = SubjectStudent.query.order_by(SubjectStudent.id).all()
+            expected = jsonify(GradeSchema(many=True).dump(enrolments)).get_data()
+            assert grades_serializer.response(enrolments).get_data() == expected
+
+
+def test_compiled_dump_is_profiled(app, subjects, monkeypatch):
+    # Put back the unwrapped methods afterwards
+    for owner, name in serialization_methods():
+        monkeypatch.setattr(owner, name, getattr(owner, name))
+    time_schema_dumps()
+    with app.test_request_context():
+        enrolments = SubjectStudent.query.all()
+        g.query_profile = profile = RequestProfile()
+        grades_serializer.dumps(enrolments)
+
+    assert profile.serialize_time > 0
+    assert not getattr(Schema.dump, "profiled", False)
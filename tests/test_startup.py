@@ -0,0 +1,20 @@
+import json
+
+from tests.conftest import create_app
+
+
+def test_fast_startup_serves_the_written_spec(app, tmp_path, monkeypatch):
+    spec_file = tmp_path / "openapi.json"
+    result = app.test_cli_runner().invoke(args=["openapi", "write", str(spec_file)])
+    assert result.exit_code == 0, result.output
+
+    monkeypatch.setenv("FAST_STARTUP", "true")
+    monkeypatch.setenv("OPENAPI_SPEC_FILE", str(spec_file))
+    fast_app = create_app()
+    client = fast_app.test_client()
+
+    assert client.get("/openapi.json").get_json() == json.loads(spec_file.read_text())
+    assert client.get("/docs").status_code == 200
+    assert sorted(rule.endpoint for rule in fast_app.url_map.iter_rules()) == sorted(
+        rule.endpoint for rule in app.url_map.iter_rules()
+    )
@@ -0,0 +1,75 @@
+import pytest
+
+from db import db
+from models import SubjectModel, SubjectStudent, WaitlistModel
+from tests.conftest import register
+
+
+@pytest.fixture
+def full_subject(client, admin, student):
+    # One seat, taken by student
+    subject_id = client.post("/subject", json={"name": "Full", "description": "One seat", "units": 3, "capacity": 1}, headers=admin).get_json()["id"]
+    assert client.post(f"/student/subject/{subject_id}", headers=student).status_code == 201
+    return subject_id
+
+
+def queue(client, subject_id, count):
+    students = [register(client, f"Waiting {number}", f"waiting{number}@example.com") for number in range(1, count + 1)]
+    for position, headers in enumerate(students, 1):
+        response = client.post(f"/student/subject/{subject_id}", headers=headers)
+        assert response.status_code == 202
+        assert response.get_json()["position"] == position
+    return students
+
+
+def seats(app, subject_id):
+    # enrolled_count next to the enrolment rows it counts, and the queue in order
+    with app.app_context():
+        subject = db.session.get(SubjectModel, subject_id)
+        enrolled = SubjectStudent.query.filter_by(subject_id=subject_id).count()
+        waiting = [entry.student.email for entry in WaitlistModel.query.filter_by(subject_id=subject_id).order_by(WaitlistModel.id)]
+        return subject.enrolled_count, enrolled, waiting
+
+
+def test_full_subject_queues_students(app, client, full_subject):
+    queue(client, full_subject, 2)
+    assert seats(app, full_subject) == (1, 1, ["waiting1@example.com", "waiting2@example.com"])
+
+
+def test_duplicate_request_from_waiting_student(app, client, full_subject):
+    waiting, = queue(client, full_subject, 1)
+    response = client.post(f"/student/subject/{full_subject}", headers=waiting)
+    assert response.status_code == 400
+    assert seats(app, full_subject) == (1, 1, ["waiting1@example.com"])
+
+
+def test_unenrol_promotes_head_of_queue(app, client, student, full_subject):
+    first, second = queue(client, full_subject, 2)
+    assert client.delete(f"/student/subject/{full_subject}", headers=student).status_code == 200
+
+    assert seats(app, full_subject) == (1, 1, ["waiting2@example.com"])
+    assert client.get(f"/student/subject/{full_subject}", headers=first).status_code == 200
+    assert client.get(f"/student/subject/{full_subject}", headers=second).status_code == 400
+
+
+def test_leaving_the_queue_frees_no_seat(app, client, full_subject):
+    first, second = queue(client, full_subject, 2)
+    assert client.delete(f"/student/subject/{full_subject}", headers=first).status_code == 200
+    assert seats(app, full_subject) == (1, 1, ["waiting2@example.com"])
+
+
+def test_deleted_account_promotes_head_of_queue(app, client, student, full_subject):
+    queue(client, full_subject, 2)
+    assert client.delete("/student", headers=student).status_code == 200
+    assert seats(app, full_subject) == (1, 1, ["waiting2@example.com"])
+
+
+def test_raised_capacity_promotes_in_order(app, client, admin, full_subject):
+    queue(client, full_subject, 3)
+    response = client.put(f"/subject/{full_subject}/capacity", json={"capacity": 3}, headers=admin)
+    assert response.status_code == 200
+    assert seats(app, full_subject) == (3, 3, ["waiting3@example.com"])
+
+    response = client.put(f"/subject/{full_subject}/capacity", json={"capacity": None}, headers=admin)
+    assert response.status_code == 200
+    assert seats(app, full_subject) == (4, 4, [])
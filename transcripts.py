@@ -0,0 +1,179 @@
+import threading
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from sqlalchemy import delete, insert
+from sqlalchemy.orm import joinedload
+
+from archive import archived_enrolments
+from db import db
+from gwa import enrolments_gwa, students_gwa
+from models import StudentModel, SubjectStudent, TranscriptModel
+from replicas import replica_router
+from schemas import TranscriptSchema
+from serializers import compile_schema
+
+'''
+Transcript read model.
+
+Every student has one row in "transcripts" holding the finished JSON of
+their transcript (profile, subjects of every term with period grades and
+averages, cumulative GWA), so /student/transcript is a single primary key
+lookup. Archived terms are read from the archive when the row is built. Single student writes
+refresh the row inside their own transaction, writes touching many students
+(bulk grades, deleting a subject) queue them for the background refresher.
+`flask transcripts rebuild` recomputes every row from scratch.
+'''
+
+CHUNK_SIZE = 500
+
+transcript_serializer = compile_schema(TranscriptSchema())
+
+
+def build_documents(student_ids):
+    # Four queries per chunk whatever its size: students, enrolments with their subject, archived enrolments, GWAs
+    students = StudentModel.query.filter(StudentModel.id.in_(student_ids)).all()
+    enrolments = SubjectStudent.query.options(joinedload(SubjectStudent.subject)).filter(
+        SubjectStudent.student_id.in_(student_ids)
+    ).order_by(SubjectStudent.id).all()
+    archived = archived_enrolments(student_ids)
+    gwas = students_gwa(student_ids)
+
+    # Both keep the enrolment ids, a chunk an interrupted archive run left in both places is listed once
+    by_id = {enrolment.id: enrolment for enrolment in archived}
+    by_id.update((enrolment.id, enrolment) for enrolment in enrolments)
+
+    subjects = {}
+    for enrolment_id in sorted(by_id):
+        subjects.setdefault(by_id[enrolment_id].student_id, []).append(by_id[enrolment_id])
+    with_archive = {enrolment.student_id for enrolment in archived}
+
+    documents = {}
+    for student in students:
+        if student.id in with_archive:
+            gwa = enrolments_gwa(subjects[student.id])
+        else:
+            gwa = gwas.get(student.id, {"gwa": None, "units": 0})
+        transcript = SimpleNamespace(student=student, subjects=subjects.get(student.id, []), **gwa)
+        documents[student.id] = transcript_serializer.dumps(transcript)
+    return documents
+
+
+def refresh_transcripts(student_ids):
+    # Rewrites the rows of these students in the current transaction, deleted students lose theirs
+    student_ids = list(set(student_ids))
+    if not student_ids:
+        return
+
+    documents = build_documents(student_ids)
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+
+    db.session.execute(delete(TranscriptModel).where(TranscriptModel.student_id.in_(student_ids)))
+    if documents:
+        db.session.execute(insert(TranscriptModel), [
+            {"student_id": student_id, "document": document, "updated_at": now}
+            for student_id, document in documents.items()
+        ])
+
+
+def refresh_transcript(student_id):
+    refresh_transcripts([student_id])
+
+
+def get_transcript(student_id):
+    transcript = db.session.get(TranscriptModel, student_id)
+    if transcript is None:
+        # Students created before the read model existed, or by the bulk import.
+        # Built from the primary, a replica's copy of their grades may lag the row written here.
+        replica_router.use_primary()
+        refresh_transcript(student_id)
+        db.session.commit()
+        transcript = db.session.get(TranscriptModel, student_id)
+    return transcript
+
+
+def rebuild_transcripts(chunk_size=CHUNK_SIZE, progress=None):
+    rebuilt, after = 0, 0
+    while True:
+        student_ids = db.session.scalars(
+            db.select(StudentModel.id).where(StudentModel.id > after).order_by(StudentModel.id).limit(chunk_size)
+        ).all()
+        if not student_ids:
+            break
+
+        refresh_transcripts(student_ids)
+        db.session.commit()
+        db.session.expunge_all()
+
+        rebuilt += len(student_ids)
+        after = student_ids[-1]
+        if progress is not None:
+            progress(rebuilt)
+
+    # Rows left behind by students deleted outside the API
+    db.session.execute(delete(TranscriptModel).where(TranscriptModel.student_id.not_in(db.select(StudentModel.id))))
+    db.session.commit()
+    return rebuilt
+
+
+class TranscriptRefresher:
+    '''
+    Refreshes transcripts on a background thread.
+
+    Student ids queued while a refresh is running are merged, so a burst of
+    bulk writes on the same class costs one refresh per student. With
+    TRANSCRIPT_REFRESH_ASYNC off the refresh runs inline instead.
+    '''
+
+    def __init__(self):
+        self.app = None
+        self.run_async = True
+        self._pending = set()
+        self._busy = False
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def init_app(self, app):
+        self.app = app
+        self.run_async = app.config.setdefault("TRANSCRIPT_REFRESH_ASYNC", True)
+        app.extensions["transcript_refresher"] = self
+
+    def schedule(self, student_ids):
+        if not self.run_async:
+            refresh_transcripts(student_ids)
+            db.session.commit()
+            return
+
+        with self._condition:
+            self._pending.update(student_ids)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="transcript-refresher", daemon=True)
+                self._thread.start()
+            self._condition.notify()
+
+    def wait(self, timeout=None):
+        # Blocks until the queue is empty, for tests and the CLI
+        with self._condition:
+            return self._condition.wait_for(lambda: not self._pending and not self._busy, timeout)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._pending)
+                student_ids, self._pending = list(self._pending), set()
+                self._busy = True
+
+            try:
+                with self.app.app_context():
+                    for start in range(0, len(student_ids), CHUNK_SIZE):
+                        refresh_transcripts(student_ids[start:start + CHUNK_SIZE])
+                        db.session.commit()
+            except Exception:
+                self.app.logger.exception("Transcript refresh failed, run `flask transcripts rebuild` to repair")
+            finally:
+                with self._condition:
+                    self._busy = False
+                    self._condition.notify_all()
+
+
+transcript_refresher = TranscriptRefresher()